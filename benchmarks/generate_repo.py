@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""Generate a synthetic Mac admin repo for benchmarking the hooks.
+
+The repo contains a Munki repo (pkginfos in nested folders, with matching
+installer items and icons, and machine manifests that include shared
+manifests), AutoPkg recipes in plist, YAML and JSON formats
+with download/munki/pkg parent chains, recipe lists, deeply nested preference
+manifests, and the scripts, profiles and build-info files checked by the
+remaining hooks. Output is deterministic for a given scale and seed.
+"""
+
+import argparse
+import json
+import os
+import plistlib
+import random
+from datetime import datetime, timezone
+from io import StringIO
+
+from ruamel.yaml import YAML
+
+# Number of items generated at each scale.
+SCALES = {
+    "small": {
+        "products": 100,
+        "versions": 5,
+        "munki_manifests": 50,
+        "manifests": 20,
+        "scripts": 20,
+    },
+    "medium": {
+        "products": 1000,
+        "versions": 5,
+        "munki_manifests": 1000,
+        "manifests": 100,
+        "scripts": 100,
+    },
+    "large": {
+        "products": 5000,
+        "versions": 5,
+        "munki_manifests": 12000,
+        "manifests": 400,
+        "scripts": 400,
+    },
+}
+
+CATEGORIES = ("Browsers", "Communication", "Design", "Development", "Utilities")
+VENDORS = ("Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark", "Wayne")
+ARCHITECTURES = ("arm64", "x86_64")
+PFM_TYPES = ("string", "integer", "boolean", "real", "date", "data", "array")
+
+SCRIPT = """#!/bin/bash
+# Generated for benchmarking.
+if [[ -d "/Applications/{name}.app" ]]; then
+    echo "<result>Installed</result>"
+else
+    echo "<result>Not installed</result>"
+fi
+exit 0
+"""
+
+
+def _write(path: str, data: bytes | str) -> None:
+    """Write data to path, creating parent folders."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with open(path, mode) as f:
+        f.write(data)
+
+
+def _dump_yaml(data: dict) -> str:
+    """Return data as a YAML document."""
+    yaml = YAML()
+    yaml.default_flow_style = False
+    stream = StringIO()
+    yaml.dump(data, stream)
+    return stream.getvalue()
+
+
+def _product_name(index: int) -> str:
+    return f"{VENDORS[index % len(VENDORS)]}App{index:05d}"
+
+
+def generate_munki_repo(root: str, rng: random.Random, products: int, versions: int):
+    """Generate pkginfos, installer items and icons."""
+    repo = os.path.join(root, "munki")
+    for index in range(products):
+        name = _product_name(index)
+        vendor = VENDORS[index % len(VENDORS)]
+        category = CATEGORIES[index % len(CATEGORIES)]
+        _write(os.path.join(repo, "icons", f"{name}.png"), b"\x89PNG\r\n\x1a\n")
+        for minor in range(versions):
+            version = f"{1 + index % 9}.{minor}.{rng.randint(0, 20)}"
+            folder = f"{category}/{vendor}/{name}"
+            item = f"{folder}/{name}-{version}.dmg"
+            _write(os.path.join(repo, "pkgs", item), b"")
+            pkginfo = {
+                "_metadata": {"created_by": "bench", "munki_version": "6.6.0"},
+                "autoremove": False,
+                "catalogs": ["testing"] if minor == versions - 1 else ["production"],
+                "category": category,
+                "description": f"{name} makes benchmarks more realistic.",
+                "developer": vendor,
+                "display_name": name,
+                "installer_item_hash": f"{rng.getrandbits(256):064x}",
+                "installer_item_location": item,
+                "installer_item_size": rng.randint(1000, 500000),
+                "installer_type": "copy_from_dmg",
+                "installs": [
+                    {
+                        "CFBundleIdentifier": f"com.{vendor.lower()}.{name.lower()}",
+                        "CFBundleName": name,
+                        "CFBundleShortVersionString": version,
+                        "CFBundleVersion": version,
+                        "minosversion": "11.0",
+                        "path": f"/Applications/{name}.app",
+                        "type": "application",
+                        "version_comparison_key": "CFBundleShortVersionString",
+                    }
+                ],
+                "items_to_copy": [
+                    {
+                        "destination_path": "/Applications",
+                        "source_item": f"{name}.app",
+                    }
+                ],
+                "minimum_os_version": "11.0",
+                "name": name,
+                "postinstall_script": SCRIPT.format(name=name),
+                "supported_architectures": list(ARCHITECTURES),
+                "unattended_install": True,
+                "unattended_uninstall": True,
+                "uninstall_method": "remove_copied_items",
+                "uninstallable": True,
+                "version": version,
+            }
+            if index % 10 == 1:
+                pkginfo["requires"] = [_product_name(index - 1)]
+            if index % 10 == 2:
+                pkginfo["update_for"] = [_product_name(index - 2)]
+            _write(
+                os.path.join(repo, "pkgsinfo", folder, f"{name}-{version}.plist"),
+                plistlib.dumps(pkginfo),
+            )
+    for catalog in ("testing", "production"):
+        _write(os.path.join(repo, "catalogs", catalog), plistlib.dumps([]))
+
+
+def generate_munki_manifests(
+    root: str, rng: random.Random, count: int, products: int
+) -> None:
+    """Generate machine manifests, each including a site-wide manifest and a
+    per-vendor group manifest (which have no catalogs of their own)."""
+    repo = os.path.join(root, "munki")
+    _write(
+        os.path.join(repo, "manifests", "site_default"),
+        plistlib.dumps({"managed_installs": [_product_name(0), _product_name(1)]}),
+    )
+    for vendor in VENDORS:
+        group = {
+            "managed_installs": [
+                _product_name(i) for i in range(VENDORS.index(vendor), products, 97)
+            ],
+        }
+        _write(os.path.join(repo, "manifests", "groups", vendor), plistlib.dumps(group))
+    for index in range(count):
+        manifest = {
+            "catalogs": ["production"] if index % 4 else ["testing", "production"],
+            "display_name": f"Mac {index:05d}",
+            "included_manifests": [
+                "site_default",
+                f"groups/{VENDORS[index % len(VENDORS)]}",
+            ],
+            "managed_installs": [
+                _product_name(rng.randrange(products)) for _ in range(5)
+            ],
+            "optional_installs": [
+                _product_name(rng.randrange(products)) for _ in range(10)
+            ],
+            "conditional_items": [
+                {
+                    "condition": "machine_type == 'laptop'",
+                    "managed_installs": [_product_name(rng.randrange(products))],
+                }
+            ],
+        }
+        _write(
+            os.path.join(repo, "manifests", "machines", f"C02{index:07d}"),
+            plistlib.dumps(manifest),
+        )
+
+
+def generate_recipes(root: str, products: int) -> list[str]:
+    """Generate download, munki and pkg recipes for each product, rotating
+    between plist, YAML and JSON formats. Returns the recipe identifiers."""
+    identifiers = []
+    for index in range(products):
+        name = _product_name(index)
+        vendor = VENDORS[index % len(VENDORS)]
+        fmt = ("plist", "yaml", "json")[index % 3]
+        prefix = f"com.github.bench.{vendor.lower()}"
+        download = {
+            "Description": f"Downloads the latest version of {name}.",
+            "Identifier": f"{prefix}.download.{name}",
+            "Input": {
+                "NAME": name,
+                "DOWNLOAD_URL": f"https://example.com/{name}.dmg",
+            },
+            "MinimumVersion": "2.3",
+            "Process": [
+                {
+                    "Processor": "URLDownloader",
+                    "Arguments": {"url": "%DOWNLOAD_URL%", "filename": "%NAME%.dmg"},
+                },
+                {"Processor": "EndOfCheckPhase"},
+                {
+                    "Processor": "CodeSignatureVerifier",
+                    "Arguments": {
+                        "input_path": f"%pathname%/{name}.app",
+                        "requirement": f'identifier "com.{vendor.lower()}.{name}"',
+                    },
+                },
+            ],
+        }
+        munki = {
+            "Description": f"Imports {name} into Munki.",
+            "Identifier": f"{prefix}.munki.{name}",
+            "Input": {
+                "NAME": name,
+                "MUNKI_REPO_SUBDIR": f"apps/{vendor}",
+                "pkginfo": {
+                    "catalogs": ["testing"],
+                    "description": f"{name} makes benchmarks more realistic.",
+                    "display_name": name,
+                    "name": "%NAME%",
+                    "unattended_install": True,
+                },
+            },
+            "MinimumVersion": "2.3",
+            "ParentRecipe": download["Identifier"],
+            "Process": [
+                {
+                    "Processor": "MunkiImporter",
+                    "Arguments": {
+                        "pkg_path": "%pathname%",
+                        "repo_subdirectory": "%MUNKI_REPO_SUBDIR%",
+                    },
+                }
+            ],
+        }
+        pkg = {
+            "Description": f"Builds a package of {name}.",
+            "Identifier": f"{prefix}.pkg.{name}",
+            "Input": {"NAME": name},
+            "MinimumVersion": "2.3",
+            "ParentRecipe": download["Identifier"],
+            "Process": [
+                {
+                    "Processor": "AppPkgCreator",
+                    "Arguments": {"app_path": f"%pathname%/{name}.app"},
+                }
+            ],
+        }
+        for kind, recipe in (("download", download), ("munki", munki), ("pkg", pkg)):
+            path = os.path.join(root, "autopkg", vendor, name, f"{name}.{kind}.recipe")
+            if fmt == "plist":
+                _write(path, plistlib.dumps(recipe))
+            elif fmt == "yaml":
+                _write(f"{path}.yaml", _dump_yaml(recipe))
+            else:
+                _write(f"{path}.json", json.dumps(recipe, indent=2) + "\n")
+            identifiers.append(recipe["Identifier"])
+    return identifiers
+
+
+def _pfm_subkeys(rng: random.Random, depth: int, path: str) -> list[dict]:
+    """Return a list of manifest subkeys, nested depth levels deep."""
+    subkeys = []
+    for index in range(3 if depth else 4):
+        name = f"{path}Key{index}"
+        if depth:
+            subkeys.append(
+                {
+                    "pfm_name": name,
+                    "pfm_title": f"{name} settings",
+                    "pfm_description": f"Settings for {name}.",
+                    "pfm_type": "dictionary",
+                    "pfm_subkeys": _pfm_subkeys(rng, depth - 1, name),
+                }
+            )
+        else:
+            pfm_type = rng.choice(PFM_TYPES)
+            subkey = {
+                "pfm_name": name,
+                "pfm_title": name,
+                "pfm_description": f"Configures {name}.",
+                "pfm_type": pfm_type,
+            }
+            if pfm_type == "string":
+                subkey["pfm_range_list"] = ["one", "two", "three"]
+                subkey["pfm_default"] = "one"
+            elif pfm_type == "integer":
+                subkey["pfm_range_min"] = 0
+                subkey["pfm_range_max"] = 100
+                subkey["pfm_default"] = 10
+            elif pfm_type == "array":
+                subkey["pfm_subkeys"] = [
+                    {"pfm_name": f"{name}Item", "pfm_type": "string"}
+                ]
+            subkeys.append(subkey)
+    return subkeys
+
+
+def generate_manifests(root: str, rng: random.Random, count: int) -> None:
+    """Generate deeply nested preference manifests."""
+    for index in range(count):
+        domain = f"com.{VENDORS[index % len(VENDORS)].lower()}.app{index:04d}"
+        manifest = {
+            "pfm_description": f"Preferences for {domain}.",
+            "pfm_domain": domain,
+            "pfm_format_version": 1,
+            "pfm_last_modified": datetime(2026, 1, 1, tzinfo=timezone.utc),
+            "pfm_platforms": ["macOS"],
+            "pfm_title": domain,
+            "pfm_unique": True,
+            "pfm_version": 1,
+            "pfm_subkeys": _pfm_subkeys(rng, 4, ""),
+        }
+        _write(
+            os.path.join(
+                root,
+                "ProfileManifests",
+                "Manifests",
+                "ManagedPreferencesApplications",
+                f"{domain}.plist",
+            ),
+            plistlib.dumps(manifest),
+        )
+
+
+def generate_scripts(root: str, count: int) -> None:
+    """Generate the scripts, profiles and build-info files checked by the
+    Jamf, MunkiAdmin, Outset and MunkiPkg hooks."""
+    outset_folders = ("boot-once", "boot-every", "login-once", "login-every")
+    for index in range(count):
+        name = _product_name(index)
+        script = SCRIPT.format(name=name)
+        paths = (
+            f"jamf/scripts/{name}.sh",
+            f"jamf/extension_attributes/{name}.sh",
+            f"usr/local/outset/{outset_folders[index % 4]}/{name}.sh",
+        )
+        for relpath in paths:
+            _write(os.path.join(root, relpath), script)
+            os.chmod(os.path.join(root, relpath), 0o755)
+        profile = {
+            "PayloadContent": [
+                {
+                    "PayloadType": f"com.example.{name.lower()}",
+                    "PayloadIdentifier": f"com.example.{name.lower()}.settings",
+                    "PayloadUUID": f"00000000-0000-0000-0000-{index:012d}",
+                    "PayloadVersion": 1,
+                }
+            ],
+            "PayloadDisplayName": name,
+            "PayloadIdentifier": f"com.example.{name.lower()}",
+            "PayloadType": "Configuration",
+            "PayloadUUID": f"00000000-0000-0000-0001-{index:012d}",
+            "PayloadVersion": 1,
+        }
+        _write(
+            os.path.join(root, "jamf", "profiles", f"{name}.mobileconfig"),
+            plistlib.dumps(profile),
+        )
+        build_info = {
+            "distribution_style": True,
+            "identifier": f"com.example.pkg.{name.lower()}",
+            "install_location": "/",
+            "name": f"{name}-${{version}}.pkg",
+            "ownership": "recommended",
+            "postinstall_action": "none",
+            "suppress_bundle_relocation": True,
+            "version": "1.0",
+        }
+        _write(
+            os.path.join(root, "munkipkg", name, "build-info.plist"),
+            plistlib.dumps(build_info),
+        )
+    for script in ("repository-postsave", "pkginfo-presave"):
+        path = os.path.join(root, "MunkiAdmin", "scripts", script)
+        _write(path, SCRIPT.format(name="MunkiAdmin"))
+        os.chmod(path, 0o755)
+
+
+def generate_recipe_lists(root: str, identifiers: list[str]) -> None:
+    """Generate recipe lists in each supported format."""
+    munki = [i for i in identifiers if ".munki." in i] + ["MakeCatalogs.munki"]
+    lists = os.path.join(root, "recipe_lists")
+    _write(os.path.join(lists, "recipe_list.txt"), "\n".join(munki) + "\n")
+    _write(os.path.join(lists, "recipe_list.json"), json.dumps(munki, indent=2) + "\n")
+    _write(os.path.join(lists, "recipe_list.yaml"), _dump_yaml(munki))
+    _write(os.path.join(lists, "recipe_list.plist"), plistlib.dumps({"recipes": munki}))
+
+
+def generate_repo(root: str, scale: str, seed: int = 0) -> dict[str, int]:
+    """Generate a repo at root. Returns the number of items of each kind."""
+    counts = SCALES[scale]
+    rng = random.Random(seed)
+    generate_munki_repo(root, rng, counts["products"], counts["versions"])
+    generate_munki_manifests(root, rng, counts["munki_manifests"], counts["products"])
+    identifiers = generate_recipes(root, counts["products"])
+    generate_manifests(root, rng, counts["manifests"])
+    generate_scripts(root, counts["scripts"])
+    generate_recipe_lists(root, identifiers)
+    return {
+        "pkginfos": counts["products"] * counts["versions"],
+        "munki_manifests": counts["munki_manifests"] + len(VENDORS) + 1,
+        "recipes": len(identifiers),
+        "manifests": counts["manifests"],
+        "scripts": counts["scripts"],
+    }
+
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    """Build and return the argument parser."""
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("root", help="Folder to generate the repo in.")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Main process."""
+
+    args = build_argument_parser().parse_args(argv)
+    counts = generate_repo(args.root, args.scale, args.seed)
+    print(json.dumps(counts, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""Time every console script in setup.py against generated repos.
+
+For each scale, a synthetic repo is generated (see generate_repo.py) and each
+hook is run the way pre-commit would run it: from the repo root, with the
+files matching its pattern in .pre-commit-hooks.yaml, split into batches to
+keep command lines short. Hooks that cache results are timed both without the
+cache and with a warm cache. Results are written as JSON so that throughput
+and scaling can be compared between releases.
+
+Before any repo is generated, the time taken to import each console script's
+module is measured with `python -X importtime`. Pre-commit starts every hook
+afresh, so on small commits startup dominates; if any module takes longer
+than its budget in IMPORT_BUDGETS (relative to a bare interpreter's startup
+imports, measured in the same run), the benchmark exits with an error.
+"""
+
+import argparse
+import ast
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from generate_repo import SCALES, generate_repo
+from ruamel.yaml import YAML
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Maximum length of the filenames passed in one invocation, like pre-commit.
+MAX_BATCH_LENGTH = 64 * 1024
+
+# Arguments and file patterns needed to point hooks at the generated repo.
+HOOK_ARGS = {
+    "check-munki-pkgsinfo": ["--munki-repo", "munki"],
+    "macadmin-check": [
+        "--hooks",
+        "check-autopkg-recipes",
+        "check-munki-pkgsinfo",
+        "check-plists",
+        "forbid-autopkg-overrides",
+        "forbid-autopkg-trust-info",
+        "--hook-args",
+        "check-munki-pkgsinfo=--munki-repo munki",
+        "--",
+    ],
+    "munki-makecatalogs": ["--munki-repo", "munki"],
+}
+HOOK_FILES = {
+    "check-preference-manifests": r"^ProfileManifests/",
+}
+
+# Import time budgets, measured by -X importtime and excluding interpreter
+# startup, as multiples of the time `python -c pass` spends importing modules at
+# startup, so that they hold on faster and slower machines alike. Every entry
+# point gets DEFAULT_IMPORT_BUDGET unless listed here. The hook client is kept
+# thin so that it's worth using a server.
+DEFAULT_IMPORT_BUDGET = 8
+IMPORT_BUDGETS = {
+    "check-munki-manifests": 12,
+    "check-munki-pkgsinfo": 12,
+    "macadmin-hook": 5,
+    "macadmin-hook-server": 16,
+    "munki-makecatalogs": 12,
+}
+
+# Console scripts that aren't hooks; macadmin-hook is timed against a server
+# when --with-server is given.
+NOT_HOOKS = ("macadmin-hook", "macadmin-hook-server")
+
+# Hooks that modify files, which run after all other hooks.
+FORMATTERS = ("format-autopkg-yaml-recipes", "format-xml-plist")
+
+
+def get_console_scripts() -> dict[str, str]:
+    """Return the console scripts declared in setup.py, mapped to their module."""
+    with open(os.path.join(PROJECT_DIR, "setup.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    scripts = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Dict):
+            for key, value in zip(node.keys, node.values):
+                if isinstance(key, ast.Constant) and key.value == "console_scripts":
+                    for entry in ast.literal_eval(value):
+                        name, _, target = entry.partition("=")
+                        scripts[name.strip()] = target.split(":")[0].strip()
+    return scripts
+
+
+def get_hook_definitions() -> dict[str, dict]:
+    """Return the hooks in .pre-commit-hooks.yaml, keyed by entry."""
+    with open(os.path.join(PROJECT_DIR, ".pre-commit-hooks.yaml"), "rb") as f:
+        hooks = YAML(typ="safe").load(f)
+    return {hook["entry"].split()[0]: hook for hook in hooks}
+
+
+def list_files(root: str) -> list[str]:
+    """Return every file in root, relative to it, in a stable order."""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            files.append(os.path.relpath(os.path.join(dirpath, filename), root))
+    return files
+
+
+def select_files(name: str, hook: dict, files: list[str]) -> list[str]:
+    """Return the files pre-commit would pass to a hook."""
+    if not hook.get("pass_filenames", True):
+        return []
+    pattern = re.compile(HOOK_FILES.get(name, hook.get("files", "")))
+    return [f for f in files if pattern.search(f)]
+
+
+def batches(files: list[str]) -> list[list[str]]:
+    """Split files into batches whose combined length fits on a command line."""
+    result, batch, length = [], [], 0
+    for filename in files:
+        if batch and length + len(filename) + 1 > MAX_BATCH_LENGTH:
+            result.append(batch)
+            batch, length = [], 0
+        batch.append(filename)
+        length += len(filename) + 1
+    if batch or not result:
+        result.append(batch)
+    return result
+
+
+def run_hook(command: list[str], files: list[str], cwd: str, env: dict) -> dict:
+    """Run a hook over all files once. Returns the time taken, the highest
+    exit code, and the number of lines of output."""
+    exit_code, lines = 0, 0
+    start = time.perf_counter()
+    for batch in batches(files):
+        proc = subprocess.run(
+            command + batch,
+            cwd=cwd,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        exit_code = max(exit_code, proc.returncode)
+        lines += len(proc.stdout.splitlines())
+    return {
+        "seconds": time.perf_counter() - start,
+        "exit_code": exit_code,
+        "output_lines": lines,
+    }
+
+
+def time_hook(command, files, cwd, env, repeat) -> dict:
+    """Run a hook repeat times, returning the fastest and median times."""
+    runs = [run_hook(command, files, cwd, env) for _ in range(repeat)]
+    seconds = [run["seconds"] for run in runs]
+    best = min(seconds)
+    return {
+        "seconds": round(best, 4),
+        "median_seconds": round(statistics.median(seconds), 4),
+        "files_per_second": round(len(files) / best, 1) if files else None,
+        "exit_code": runs[-1]["exit_code"],
+        "output_lines": runs[-1]["output_lines"],
+    }
+
+
+def supports_option(module: str, option: str) -> bool:
+    """Return True if a hook's help mentions option."""
+    proc = subprocess.run(
+        [sys.executable, "-m", module, "--help"],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return option in proc.stdout
+
+
+def measure_import(module: str | None, repeat: int) -> float:
+    """Return the fastest of repeat measurements of the time (in milliseconds)
+    taken to import a module in a fresh interpreter. Without a module, returns
+    the time taken by the imports every interpreter makes at startup."""
+    timings = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-c",
+                f"import {module}" if module else "pass",
+            ],
+            cwd=PROJECT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        total = 0
+        for line in proc.stderr.splitlines():
+            # Lines look like: "import time:   self [us] | cumulative | name",
+            # with the names of nested imports indented.
+            fields = line.split("|")
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            if module is None and not fields[2][1:].startswith(" "):
+                total += int(fields[1])
+            elif fields[2].strip() == module:
+                total = int(fields[1])
+        timings.append(total / 1000)
+    return min(timings)
+
+
+def check_import_budgets(args: argparse.Namespace) -> tuple[dict, bool]:
+    """Measure the import time of every console script's module against its
+    budget. Returns the measurements and whether all were within budget."""
+    results, passed = {}, True
+    for name, module in sorted(get_console_scripts().items()):
+        if args.hooks and name not in args.hooks:
+            continue
+        # Measure the baseline alongside each module, so that both are taken
+        # under the same load.
+        baseline = measure_import(None, max(args.repeat, 5))
+        milliseconds = measure_import(module, max(args.repeat, 5))
+        budget = IMPORT_BUDGETS.get(name, DEFAULT_IMPORT_BUDGET) * baseline
+        budget *= args.import_budget_scale
+        results[name] = {
+            "module": module,
+            "milliseconds": round(milliseconds, 2),
+            "budget_milliseconds": round(budget, 2),
+            "baseline_milliseconds": round(baseline, 2),
+        }
+        status = "ok"
+        if milliseconds > budget:
+            status = "OVER BUDGET"
+            passed = False
+        print(
+            f"import: {name}: {milliseconds:.1f}ms of {budget:.0f}ms "
+            f"({IMPORT_BUDGETS.get(name, DEFAULT_IMPORT_BUDGET)} x {baseline:.1f}ms "
+            f"startup, {status})"
+        )
+    return results, passed
+
+
+def start_server(env: dict) -> subprocess.Popen:
+    """Start macadmin-hook-server and wait for it to listen."""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "pre_commit_macadmin_hooks.hook_server"],
+        env=env,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    server.stdout.readline()  # Printed once the socket is ready
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(env["PRE_COMMIT_MACADMIN_SOCKET"])
+    return server
+
+
+def benchmark_scale(scale: str, args: argparse.Namespace, workdir: str) -> dict:
+    """Generate a repo at one scale and time each hook against it."""
+    root = os.path.join(workdir, scale)
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    start = time.perf_counter()
+    counts = generate_repo(root, scale, args.seed)
+    generate_seconds = time.perf_counter() - start
+    files = list_files(root)
+    print(f"{scale}: generated {len(files)} files in {generate_seconds:.1f}s")
+
+    env = dict(os.environ)
+    env["PRE_COMMIT_MACADMIN_CACHE_DIR"] = os.path.join(workdir, "cache")
+    env["PRE_COMMIT_MACADMIN_SOCKET"] = os.path.join(workdir, "hooks.sock")
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [PROJECT_DIR, env.get("PYTHONPATH")])
+    )
+
+    scripts = get_console_scripts()
+    definitions = get_hook_definitions()
+    names = [n for n in scripts if n not in NOT_HOOKS and n in definitions]
+    if args.hooks:
+        names = [n for n in names if n in args.hooks]
+    names.sort(key=lambda n: (n in FORMATTERS, n))
+
+    server = start_server(env) if args.with_server else None
+    results = []
+    try:
+        for name in names:
+            module = scripts[name]
+            hook_files = select_files(name, definitions[name], files)
+            extra_args = HOOK_ARGS.get(name, [])
+            result = {"hook": name, "scale": scale, "files": len(hook_files)}
+            command = [sys.executable, "-m", module, *extra_args]
+            if supports_option(module, "--no-cache"):
+                result.update(
+                    time_hook(
+                        command + ["--no-cache"], hook_files, root, env, args.repeat
+                    )
+                )
+                run_hook(command, hook_files, root, env)  # Fill the cache
+                cached = time_hook(command, hook_files, root, env, args.repeat)
+                result["cached_seconds"] = cached["seconds"]
+            else:
+                result.update(time_hook(command, hook_files, root, env, args.repeat))
+            if server:
+                client = [
+                    sys.executable,
+                    "-m",
+                    "pre_commit_macadmin_hooks.hook_client",
+                    name,
+                    *extra_args,
+                ]
+                served = time_hook(client, hook_files, root, env, args.repeat)
+                result["server_seconds"] = served["seconds"]
+            print(
+                f"{scale}: {name}: {result['files']} files in {result['seconds']:.3f}s"
+                f" (exit code {result['exit_code']})"
+            )
+            results.append(result)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    return {
+        "counts": counts,
+        "files": len(files),
+        "generate_seconds": round(generate_seconds, 2),
+        "results": results,
+    }
+
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    """Build and return the argument parser."""
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--scales",
+        nargs="+",
+        choices=SCALES,
+        default=["small", "medium"],
+        help="Repo sizes to benchmark (default: small medium).",
+    )
+    parser.add_argument(
+        "--hooks", nargs="+", help="Only benchmark these hooks (default: all)."
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Times to run each hook; the fastest run is reported (default: 3).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generator.")
+    parser.add_argument(
+        "--import-budget-scale",
+        type=float,
+        default=1.0,
+        help="Multiply every import time budget by this, e.g. on slow machines "
+        "(default: %(default)s).",
+    )
+    parser.add_argument(
+        "--imports-only",
+        action="store_true",
+        help="Only check import times against their budgets.",
+    )
+    parser.add_argument(
+        "--with-server",
+        action="store_true",
+        help="Also time each hook through macadmin-hook with a running server.",
+    )
+    parser.add_argument(
+        "--workdir", help="Folder for generated repos (default: a temporary folder)."
+    )
+    parser.add_argument(
+        "--output",
+        default="benchmark-results.json",
+        help="Path of the JSON results file (default: %(default)s).",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Main process."""
+
+    args = build_argument_parser().parse_args(argv)
+    imports, within_budget = check_import_budgets(args)
+    if args.imports_only:
+        return 0 if within_budget else 1
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="macadmin-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        report = {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "git_revision": subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                cwd=PROJECT_DIR,
+                capture_output=True,
+                text=True,
+                check=False,
+            ).stdout.strip(),
+            "imports": imports,
+            "scales": {
+                scale: benchmark_scale(scale, args, workdir) for scale in args.scales
+            },
+        }
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"Results written to {args.output}")
+    if not within_budget:
+        print("Some modules took longer to import than their budget.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
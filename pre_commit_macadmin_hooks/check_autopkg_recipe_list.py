@@ -10,9 +10,7 @@ import json
 import plistlib
 from xml.parsers.expat import ExpatError
 
-import ruamel.yaml
-
-yaml = ruamel.yaml.YAML(typ="safe")
+from pre_commit_macadmin_hooks.util import load_yaml
 
 
 def build_argument_parser() -> argparse.ArgumentParser:
@@ -54,7 +52,7 @@ def main(argv: list[str] | None = None) -> int:
             # may have developed custom tooling for this.
             try:
                 with open(filename, encoding="utf-8") as openfile:
-                    recipe_list = yaml.load(openfile)
+                    recipe_list = load_yaml(openfile)
             except Exception as err:
                 print(f"{filename}: yaml parsing error: {err}")
                 retval = 1
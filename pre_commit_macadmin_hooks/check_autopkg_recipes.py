@@ -4,25 +4,25 @@ requirements."""
 
 import argparse
 import os
+import plistlib
 import sys
+from collections.abc import Callable
 from contextlib import contextmanager
+from functools import lru_cache, partial
 from typing import Any
 
-from packaging.version import Version
-
 from pre_commit_macadmin_hooks.util import (
-    detect_deprecated_keys,
-    detect_typoed_keys,
+    add_performance_arguments,
     load_autopkg_recipe,
-    validate_pkginfo_key_types,
+    run_checks,
+    validate_pkginfo_keys,
     validate_required_keys,
-    validate_restart_action_key,
-    validate_supported_architectures,
-    validate_uninstall_method,
 )
 
+# Folder where AutoPkg installs its libraries.
+AUTOPKG_DIR = "/Library/AutoPkg"
+
 
-# Import AutoPkg libraries, but ignore any warnings generated by the import.
 @contextmanager
 def suppress_stdout() -> Any:
     with open(os.devnull, "w", encoding="utf-8") as devnull:
@@ -34,18 +34,30 @@ def suppress_stdout() -> Any:
             sys.stdout = old_stdout
 
 
-sys.path.append("/Library/AutoPkg")
-try:
-    with suppress_stdout():
-        from autopkglib import (  # type: ignore[import-not-found]
-            get_processor,
-            processor_names,
-        )
+@lru_cache(maxsize=None)
+def load_autopkglib() -> Any:
+    """Import AutoPkg libraries on first use, ignoring any warnings generated
+    by the import. Returns None if they can't be imported, in which case checks
+    that require autopkglib are silently skipped. Importing autopkglib also
+    loads PyObjC, so it's deferred until a recipe actually needs checking."""
+    if AUTOPKG_DIR not in sys.path:
+        sys.path.append(AUTOPKG_DIR)
+    try:
+        with suppress_stdout():
+            import autopkglib  # type: ignore[import-not-found]
+    except ImportError:
+        return None
+    return autopkglib
+
+
+def processor_names() -> list[str]:
+    """Return the names of AutoPkg's core processors."""
+    return load_autopkglib().processor_names()
 
-    HAS_AUTOPKGLIB = True
-except ImportError:
-    # Silently skip checks that require autopkglib.
-    HAS_AUTOPKGLIB = False
+
+def get_processor(name: str) -> Any:
+    """Return the class of an AutoPkg core processor."""
+    return load_autopkglib().get_processor(name)
 
 
 def build_argument_parser() -> argparse.ArgumentParser:
@@ -84,6 +96,7 @@ def build_argument_parser() -> argparse.ArgumentParser:
         "mismatches, and forbidding <!-- --> comments. Very opinionated.",
     )
     parser.add_argument("filenames", nargs="*", help="Filenames to check.")
+    add_performance_arguments(parser)
     return parser
 
 
@@ -247,6 +260,8 @@ def validate_minimumversion(process, min_vers, ignore_min_vers_before, filename)
         passed = False
 
     # Validate that the MinimumVersion value fits the processors used
+    from packaging.version import Version  # Slow to import, so done on first use
+
     for proc in [
         x
         for x in proc_min_versions
@@ -576,145 +591,169 @@ def validate_proc_args(process, filename):
     return passed
 
 
-def main(argv=None):
-    """Main process."""
-
-    # Parse command line arguments.
-    argparser = build_argument_parser()
-    args = argparser.parse_args(argv)
-    if args.strict:
-        args.ignore_min_vers_before = "0.1.0"
-
-    # Track identifiers we've seen.
-    seen_identifiers = []
+def check_recipe(filename: str, args: argparse.Namespace) -> tuple[int, str | None]:
+    """Check a single recipe. Returns 1 if any problems were found, along with
+    the recipe identifier (if any) for checks that span multiple recipes."""
 
     retval = 0
-    for filename in args.filenames:
-        recipe = load_autopkg_recipe(filename)
-        if not recipe:
+    recipe = load_autopkg_recipe(filename)
+    if not recipe:
+        return 1, None  # No need to continue checking this file
+
+    # For future implementation of validate_unused_input_vars()
+    # with open(filename, "r", encoding='utf-8') as openfile:
+    #     recipe_text = openfile.read()
+
+    # Top level keys that all AutoPkg recipes should contain.
+    # TODO: Make required recipe keys configurable.
+    required_keys = ["Identifier"]
+    if not validate_required_keys(recipe, filename, required_keys):
+        return 1, None  # No need to continue checking this file
+
+    # Validate identifiers.
+    if args.override_prefix and "Process" not in recipe:
+        if not validate_recipe_prefix(recipe, filename, args.override_prefix):
+            retval = 1
+    if args.recipe_prefix and "Process" in recipe:
+        if not validate_recipe_prefix(recipe, filename, args.recipe_prefix):
+            retval = 1
+    if recipe["Identifier"] == recipe.get("ParentRecipe"):
+        print(f"{filename}: Identifier and ParentRecipe should not be the same.")
+        retval = 1
+
+    # Validate that all input variables are used.
+    # (Disabled for now because it's a little too opinionated, and doesn't take into account
+    # whether environmental variables are used in custom processors.)
+    # if args.strict:
+    #     if not validate_unused_input_vars(recipe, recipe_text, filename):
+    #         retval = 1
+
+    # If the Input key contains a pkginfo dict, make a best effort to validate its contents.
+    input_key = recipe.get("Input", recipe.get("input", recipe.get("INPUT")))
+    if input_key and "pkginfo" in input_key:
+
+        # Check for presence of required pkginfo keys.
+        # TODO: Make required pkginfo keys within a recipe configurable.
+        req_keys = ["name", "description"]
+        if not validate_required_keys(input_key["pkginfo"], filename, req_keys):
+            retval = 1
+
+        # Check key types, RestartAction, uninstall method and supported
+        # architectures, and look for deprecated or mistyped keys.
+        if not validate_pkginfo_keys(input_key["pkginfo"], filename, recipe_mode=True):
             retval = 1
-            break  # No need to continue checking this file
 
-        # For future implementation of validate_unused_input_vars()
-        # with open(filename, "r", encoding='utf-8') as openfile:
-        #     recipe_text = openfile.read()
+        # TODO: Additional pkginfo checks here.
 
-        # Top level keys that all AutoPkg recipes should contain.
-        # TODO: Make required recipe keys configurable.
-        required_keys = ["Identifier"]
-        if not validate_required_keys(recipe, filename, required_keys):
+    # Warn about comments that would be lost during `plutil -convert xml1`
+    if not validate_comments(filename, args.strict):
+        retval = 1
+
+    # Processor checks.
+    if "Process" in recipe:
+        process = recipe["Process"]
+
+        if not validate_processor_keys(process, filename):
             retval = 1
-            break  # No need to continue checking this file
 
-        # Ensure the recipe identifier isn't duplicated.
-        if recipe["Identifier"] in seen_identifiers:
-            print(
-                f'{filename}: Identifier "{recipe["Identifier"]}" is shared by another recipe in this repo.'
-            )
+        if not validate_endofcheckphase(process, filename):
             retval = 1
-        else:
-            seen_identifiers.append(recipe["Identifier"])
 
-        # Validate identifiers.
-        if args.override_prefix and "Process" not in recipe:
-            if not validate_recipe_prefix(recipe, filename, args.override_prefix):
-                retval = 1
-        if args.recipe_prefix and "Process" in recipe:
-            if not validate_recipe_prefix(recipe, filename, args.recipe_prefix):
-                retval = 1
-        if recipe["Identifier"] == recipe.get("ParentRecipe"):
-            print(f"{filename}: Identifier and ParentRecipe should not be the same.")
+        if not validate_no_var_in_app_path(process, filename):
             retval = 1
 
-        # Validate that all input variables are used.
-        # (Disabled for now because it's a little too opinionated, and doesn't take into account
-        # whether environmental variables are used in custom processors.)
-        # if args.strict:
-        #     if not validate_unused_input_vars(recipe, recipe_text, filename):
-        #         retval = 1
-
-        # If the Input key contains a pkginfo dict, make a best effort to validate its contents.
-        input_key = recipe.get("Input", recipe.get("input", recipe.get("INPUT")))
-        if input_key and "pkginfo" in input_key:
-
-            # Check for presence of required pkginfo keys.
-            # TODO: Make required pkginfo keys within a recipe configurable.
-            req_keys = ["name", "description"]
-            if not validate_required_keys(input_key["pkginfo"], filename, req_keys):
-                retval = 1
+        min_vers = recipe.get("MinimumVersion")
+        if min_vers and not validate_minimumversion(
+            process, min_vers, args.ignore_min_vers_before, filename
+        ):
+            retval = 1
 
-            # Ensure pkginfo keys have expected types.
-            if not validate_pkginfo_key_types(input_key["pkginfo"], filename):
-                retval = 1
+        if not validate_no_deprecated_procs(process, filename):
+            retval = 1
 
-            # Validate RestartAction key.
-            if not validate_restart_action_key(input_key["pkginfo"], filename):
-                retval = 1
+        if not validate_no_superclass_procs(process, filename):
+            retval = 1
 
-            # Validate uninstall method.
-            if not validate_uninstall_method(input_key["pkginfo"], filename):
-                retval = 1
+        if not validate_jamf_processor_order(process, filename):
+            retval = 1
 
-            # Validate supported architectures.
-            if not validate_supported_architectures(
-                input_key["pkginfo"], filename, recipe_mode=True
-            ):
+        if load_autopkglib() is not None:
+            if not validate_proc_args(process, filename):
                 retval = 1
 
-            # Check for deprecated pkginfo keys.
-            if not detect_deprecated_keys(input_key["pkginfo"], filename):
+        if args.strict:
+            if not validate_proc_type_conventions(process, filename):
                 retval = 1
 
-            # Check for common mistakes in key names.
-            if not detect_typoed_keys(input_key["pkginfo"], filename):
+            if not validate_required_proc_for_types(process, filename):
                 retval = 1
 
-            # TODO: Additional pkginfo checks here.
+    return retval, recipe["Identifier"]
 
-        # Warn about comments that would be lost during `plutil -convert xml1`
-        if not validate_comments(filename, args.strict):
-            retval = 1
 
-        # Processor checks.
-        if "Process" in recipe:
-            process = recipe["Process"]
+def get_file_checker(
+    args: argparse.Namespace,
+) -> Callable[[str], tuple[int, str | None]]:
+    """Return the function that checks a single recipe."""
+    if args.strict:
+        args.ignore_min_vers_before = "0.1.0"
+    return partial(check_recipe, args=args)
 
-            if not validate_processor_keys(process, filename):
-                retval = 1
 
-            if not validate_endofcheckphase(process, filename):
-                retval = 1
+def cache_salt(args: argparse.Namespace) -> str:
+    """Processor argument checks depend on the installed version of AutoPkg,
+    and on whether this Python can import it. The version is read from the
+    file autopkglib itself reads it from, so that results can be reused
+    without importing autopkglib."""
+    version_plist = os.path.join(AUTOPKG_DIR, "autopkglib", "version.plist")
+    try:
+        with open(version_plist, "rb") as openfile:
+            version = plistlib.load(openfile).get("Version", "unknown")
+    except (OSError, ValueError):
+        return ""
+    return f"{version}:{sys.executable}"
 
-            if not validate_no_var_in_app_path(process, filename):
-                retval = 1
 
-            min_vers = recipe.get("MinimumVersion")
-            if min_vers and not validate_minimumversion(
-                process, min_vers, args.ignore_min_vers_before, filename
-            ):
-                retval = 1
+def summarize_results(
+    args: argparse.Namespace, results: list[tuple[int, str | None]]
+) -> int:
+    """Combine the results of check_recipe, and ensure that no recipe
+    identifier is duplicated. Returns the exit code for the hook."""
 
-            if not validate_no_deprecated_procs(process, filename):
-                retval = 1
+    # Track identifiers we've seen.
+    seen_identifiers = set()
 
-            if not validate_no_superclass_procs(process, filename):
-                retval = 1
+    retval = 0
+    for filename, (file_retval, identifier) in zip(args.filenames, results):
+        if file_retval:
+            retval = 1
 
-            if not validate_jamf_processor_order(process, filename):
-                retval = 1
+        # Ensure the recipe identifier isn't duplicated.
+        if identifier is None:
+            continue
+        if identifier in seen_identifiers:
+            print(
+                f'{filename}: Identifier "{identifier}" is shared by another recipe in this repo.'
+            )
+            retval = 1
+        else:
+            seen_identifiers.add(identifier)
+
+    return retval
 
-            if HAS_AUTOPKGLIB:
-                if not validate_proc_args(process, filename):
-                    retval = 1
 
-            if args.strict:
-                if not validate_proc_type_conventions(process, filename):
-                    retval = 1
+def main(argv=None):
+    """Main process."""
 
-                if not validate_required_proc_for_types(process, filename):
-                    retval = 1
+    # Parse command line arguments.
+    argparser = build_argument_parser()
+    args = argparser.parse_args(argv)
 
-    return retval
+    check_recipe_file = get_file_checker(args)
+    results = run_checks(
+        "check-autopkg-recipes", args, check_recipe_file, salt=cache_salt(args)
+    )
+    return summarize_results(args, results)
 
 
 if __name__ == "__main__":
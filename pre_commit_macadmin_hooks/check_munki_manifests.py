@@ -0,0 +1,407 @@
+#!/usr/bin/python
+"""This hook checks Munki manifests to ensure they are valid, and that each
+item they install, remove, update or offer (directly, or through included
+manifests) is in one of their catalogs."""
+
+import argparse
+import os
+from collections.abc import Callable, Iterator
+from functools import partial
+from typing import Any
+from xml.parsers.expat import ExpatError
+
+from pre_commit_macadmin_hooks.munki_predicates import validate_condition
+from pre_commit_macadmin_hooks.munki_repo import (
+    CatalogIndex,
+    list_repo_items,
+    load_catalog_index,
+)
+from pre_commit_macadmin_hooks.util import (
+    add_performance_arguments,
+    load_plist,
+    record_dependency,
+    run_checks,
+)
+
+# Manifest keys that list items, which must be in the manifest's catalogs.
+ITEM_KEYS = (
+    "managed_installs",
+    "managed_uninstalls",
+    "managed_updates",
+    "optional_installs",
+    "featured_items",
+    "default_installs",
+)
+
+# Manifest keys whose values must be arrays.
+ARRAY_KEYS = ("catalogs", "included_manifests", "conditional_items", *ITEM_KEYS)
+
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    """Build and return the argument parser."""
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("filenames", nargs="*", help="Filenames to check.")
+    parser.add_argument(
+        "--munki-repo", default=".", help="path to local munki repo. Defaults to '.'"
+    )
+    parser.add_argument(
+        "--fail-on-unknown-conditions",
+        help="If added, fail (instead of only warning) if a conditional_items "
+        "condition uses an attribute that isn't built into Munki or listed in "
+        "--valid-conditions.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--valid-conditions",
+        nargs="+",
+        default=[],
+        help="Add the names of admin-provided conditions used in your environment",
+    )
+    add_performance_arguments(parser)
+    return parser
+
+
+def _list_value(manifest: dict[str, Any], key: str) -> list[Any]:
+    """Return the value of a manifest key that should be an array, or an
+    empty list if it's missing or not an array."""
+    value = manifest.get(key)
+    return value if isinstance(value, list) else []
+
+
+def iter_items(manifest: dict[str, Any]) -> Iterator[tuple[str, Any]]:
+    """Yield the key and value of each item listed in a manifest, including
+    those in conditional_items (which may be nested)."""
+    pending = [manifest]
+    while pending:
+        section = pending.pop(0)
+        for key in ITEM_KEYS:
+            for item in _list_value(section, key):
+                yield key, item
+        pending.extend(
+            c for c in _list_value(section, "conditional_items") if isinstance(c, dict)
+        )
+
+
+def iter_conditions(manifest: dict[str, Any]) -> Iterator[Any]:
+    """Yield the condition of each item in a manifest's conditional_items,
+    including nested ones."""
+    pending = [manifest]
+    while pending:
+        section = pending.pop(0)
+        for conditional in _list_value(section, "conditional_items"):
+            if isinstance(conditional, dict):
+                if "condition" in conditional:
+                    yield conditional["condition"]
+                pending.append(conditional)
+
+
+def describe_cycle(cycle: tuple[str, ...]) -> str:
+    """Describe a cycle of included manifests, starting from the first name
+    alphabetically so that the description doesn't depend on which of the
+    manifests was resolved first."""
+    start = cycle.index(min(cycle))
+    cycle = cycle[start:] + cycle[:start]
+    return f"included manifests form a cycle: {' -> '.join(cycle + cycle[:1])}"
+
+
+class ManifestResolver:
+    """Resolves the included manifests of a repo's manifests. Each manifest is
+    parsed at most once per run, and the items each included manifest
+    contributes (through its own includes, flattened) are memoized, as is
+    the check of those items against a set of catalogs. Site manifests
+    shared by thousands of machine manifests are therefore resolved once,
+    rather than once per manifest that includes them."""
+
+    def __init__(self, repo: str) -> None:
+        self.repo = repo
+        # Paths of the manifests, relative to the manifests folder.
+        self.names = frozenset(list_repo_items(repo, "manifests"))
+        self._parsed: dict[str, tuple[Any, Exception | None]] = {}
+        self._resolved: dict[str, tuple[tuple, tuple[str, ...]]] = {}
+        self._unresolved: dict[tuple[str, tuple[str, ...]], list] = {}
+
+    def name_of(self, filename: str) -> str | None:
+        """Return the name of the manifest at filename, or None if it isn't in
+        the repo's manifests folder."""
+        manifests_dir = os.path.abspath(os.path.join(self.repo, "manifests"))
+        name = os.path.relpath(os.path.abspath(filename), manifests_dir)
+        name = name.replace(os.sep, "/")
+        return name if name in self.names else None
+
+    def parse(self, name: str) -> tuple[Any, Exception | None]:
+        """Return a manifest's contents, or the error raised reading it."""
+        if name not in self._parsed:
+            try:
+                self._parsed[name] = (
+                    load_plist(os.path.join(self.repo, "manifests", name)),
+                    None,
+                )
+            except (ExpatError, ValueError, OSError) as err:
+                self._parsed[name] = (None, err)
+        return self._parsed[name]
+
+    def resolve(
+        self, name: str, stack: tuple[str, ...] = ()
+    ) -> tuple[tuple, tuple[str, ...]]:
+        """Return the items an included manifest adds to the manifest that
+        includes it, and any problems with its includes (missing manifests,
+        and include cycles). Items are (key, item, manifest name) tuples. A
+        manifest with its own catalogs adds no items to check against the
+        includer's catalogs, since its items are resolved in its own. stack
+        holds the names of the manifests that led here, to detect cycles."""
+        if name in self._resolved:
+            return self._resolved[name]
+        manifest, _ = self.parse(name)
+        if not isinstance(manifest, dict):
+            manifest = {}
+
+        items = []
+        if not _list_value(manifest, "catalogs"):
+            items = [(key, item, name) for key, item in iter_items(manifest)]
+        problems = []
+        path = (*stack, name)
+        for include in _list_value(manifest, "included_manifests"):
+            if not isinstance(include, str):
+                continue
+            if include in path:
+                problems.append(describe_cycle(path[path.index(include) :]))
+            elif include not in self.names:
+                problems.append(
+                    f'included manifest "{include}" (included by "{name}") does '
+                    "not exist"
+                )
+            else:
+                include_items, include_problems = self.resolve(include, path)
+                if not _list_value(manifest, "catalogs"):
+                    items.extend(include_items)
+                problems.extend(include_problems)
+
+        self._resolved[name] = (tuple(items), tuple(dict.fromkeys(problems)))
+        return self._resolved[name]
+
+    def unresolved(
+        self, name: str, catalogs: tuple[str, ...], catalog_index: CatalogIndex
+    ) -> list[tuple[str, str, str]]:
+        """Return the items an included manifest adds that aren't in any of
+        the given catalogs."""
+        key = (name, catalogs)
+        if key not in self._unresolved:
+            self._unresolved[key] = [
+                (item_key, item, source)
+                for item_key, item, source in self.resolve(name)[0]
+                if isinstance(item, str) and not catalog_index.resolve(item, catalogs)
+            ]
+        return self._unresolved[key]
+
+
+# ManifestResolver objects, keyed by absolute repo path.
+_manifest_resolvers: dict[str, ManifestResolver] = {}
+
+
+def load_manifest_resolver(repo: str, refresh: bool = False) -> ManifestResolver:
+    """Return the ManifestResolver for a repo, creating it on first use (or
+    again, with refresh, so that a long-running process sees changes)."""
+    path = os.path.abspath(repo)
+    if refresh or path not in _manifest_resolvers:
+        _manifest_resolvers[path] = ManifestResolver(repo)
+    return _manifest_resolvers[path]
+
+
+def find_missing_catalogs(repo: str, catalogs: list[str]) -> list[str]:
+    """Return the catalogs that don't contain any pkginfo."""
+    catalog_index = load_catalog_index(repo)
+    return [catalog for catalog in catalogs if catalog not in catalog_index.catalogs]
+
+
+def find_missing_items(repo: str, query: list) -> list[str]:
+    """Return the items that aren't in any of the catalogs, given an [items,
+    catalogs] query."""
+    items, catalogs = query
+    catalog_index = load_catalog_index(repo)
+    return [item for item in items if not catalog_index.resolve(item, catalogs)]
+
+
+def check_include(repo: str, query: list) -> list[list[str]]:
+    """Return the problems with one of a manifest's included manifests, given
+    an [include, name of the includer, catalogs] query: those to report for
+    the include itself (missing manifests, and items missing from the
+    catalogs), and those with the includes further down."""
+    include, name, catalogs = query
+    resolver = load_manifest_resolver(repo)
+    if include not in resolver.names:
+        return [[f'included manifest "{include}" does not exist'], []]
+    if include == name:
+        return [[], [describe_cycle((name,))]]
+    problems = list(resolver.resolve(include, (name,) if name else ())[1])
+    if not catalogs:
+        return [[], problems]
+    findings = [
+        f'{key} item "{item}" in included manifest "{source}" was not found in '
+        f'catalogs: {", ".join(catalogs)}'
+        for key, item, source in resolver.unresolved(
+            include, tuple(catalogs), load_catalog_index(repo)
+        )
+    ]
+    return [findings, problems]
+
+
+def check_manifest(filename: str, args: argparse.Namespace) -> int:
+    """Check a single manifest. Returns 1 if any problems were found."""
+
+    resolver = load_manifest_resolver(args.munki_repo)
+
+    name = resolver.name_of(filename)
+    if name is not None:
+        manifest, err = resolver.parse(name)
+    else:
+        try:
+            manifest, err = load_plist(filename), None
+        except (ExpatError, ValueError) as error:
+            manifest, err = None, error
+    if err is not None:
+        print(f"{filename}: plist parsing error: {err}")
+        return 1
+    if not isinstance(manifest, dict):
+        print(f"{filename}: manifest should be a dictionary")
+        return 1
+
+    retval = 0
+    for key in ARRAY_KEYS:
+        if key in manifest and not isinstance(manifest[key], list):
+            print(f"{filename}: {key} should be an array")
+            retval = 1
+
+    # Check that each catalog exists. The catalogs, items and included
+    # manifests a manifest uses are recorded as dependencies of its cached
+    # result, so that changes elsewhere in the repo don't invalidate it.
+    catalogs = []
+    for catalog in _list_value(manifest, "catalogs"):
+        if not isinstance(catalog, str):
+            print(f"{filename}: catalogs contains a non-string item: {catalog!r}")
+            retval = 1
+        else:
+            catalogs.append(catalog)
+    missing_catalogs = record_dependency(
+        "munki_missing_catalogs",
+        catalogs,
+        find_missing_catalogs(args.munki_repo, catalogs),
+    )
+    for catalog in missing_catalogs:
+        print(f'{filename}: catalog "{catalog}" does not contain any pkginfo')
+        retval = 1
+    catalogs = [catalog for catalog in catalogs if catalog not in missing_catalogs]
+
+    # Check that each included manifest exists, and that the items it adds
+    # (and those of the manifests it includes, and so on) are in this
+    # manifest's catalogs. Problems further down are reported here too, since
+    # they affect clients using this manifest.
+    problems = []
+    for include in _list_value(manifest, "included_manifests"):
+        if not isinstance(include, str):
+            print(
+                f"{filename}: included_manifests contains a non-string item: "
+                f"{include!r}"
+            )
+            retval = 1
+            continue
+        query = [include, name, catalogs]
+        findings, include_problems = record_dependency(
+            "munki_included_manifest", query, check_include(args.munki_repo, query)
+        )
+        for finding in findings:
+            print(f"{filename}: {finding}")
+            retval = 1
+        problems.extend(include_problems)
+    for problem in dict.fromkeys(problems):
+        print(f"{filename}: {problem}")
+        retval = 1
+
+    # Check that each condition is a valid predicate.
+    for condition in iter_conditions(manifest):
+        if not isinstance(condition, str):
+            print(f"{filename}: conditional_items condition should be a string")
+            retval = 1
+        elif not validate_condition(
+            condition,
+            filename,
+            "conditional_items condition",
+            args.valid_conditions,
+            args.fail_on_unknown_conditions,
+        ):
+            retval = 1
+
+    # Check that each item is in one of the catalogs. Manifests without
+    # catalogs use those of the manifest that includes them.
+    missing_items = set()
+    if catalogs:
+        items = [item for _, item in iter_items(manifest) if isinstance(item, str)]
+        query = [list(dict.fromkeys(items)), catalogs]
+        missing_items.update(
+            record_dependency(
+                "munki_missing_items",
+                query,
+                find_missing_items(args.munki_repo, query),
+            )
+        )
+    for key, item in iter_items(manifest):
+        if not isinstance(item, str):
+            print(f"{filename}: {key} contains a non-string item: {item!r}")
+            retval = 1
+        elif item in missing_items:
+            print(
+                f'{filename}: {key} item "{item}" was not found in catalogs: '
+                f"{', '.join(catalogs)}"
+            )
+            retval = 1
+
+    return retval
+
+
+def get_file_checker(args: argparse.Namespace) -> Callable[[str], int]:
+    """Return the function that checks a single manifest."""
+
+    # Index the repo's catalogs and manifests once, up front, so that worker
+    # processes inherit them instead of rebuilding them.
+    load_catalog_index(
+        args.munki_repo,
+        jobs=args.jobs,
+        use_cache=not (args.no_cache or args.profile),
+        refresh=True,
+    )
+    load_manifest_resolver(args.munki_repo, refresh=True)
+    return partial(check_manifest, args=args)
+
+
+def cache_dependencies(args: argparse.Namespace) -> dict[str, Callable[[Any], Any]]:
+    """Cached results are only valid while the catalogs, catalog items and
+    included manifests each manifest uses are unchanged."""
+    return {
+        "munki_missing_catalogs": partial(find_missing_catalogs, args.munki_repo),
+        "munki_missing_items": partial(find_missing_items, args.munki_repo),
+        "munki_included_manifest": partial(check_include, args.munki_repo),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Main process."""
+
+    # Parse command line arguments.
+    argparser = build_argument_parser()
+    args = argparser.parse_args(argv)
+
+    check_manifest_file = get_file_checker(args)
+    results = run_checks(
+        "check-munki-manifests",
+        args,
+        check_manifest_file,
+        dependencies=cache_dependencies(args),
+    )
+    return 1 if any(results) else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,21 +1,41 @@
 #!/usr/bin/python
-"""This hook checks Munki pkginfo files to ensure they are valid."""
+"""This hook checks Munki pkginfo files to ensure they are valid, and that
+the requires and update_for references of every pkginfo in the repo can be
+resolved without forming a cycle, that no two pkginfos in the same catalog
+have the same name and version, that added pkginfos don't have a lower
+version than an item with the same name in the same catalog, and that
+items with different names don't claim the same receipts or installs, or
+copy items to the same or nested destinations."""
 
 import argparse
 import os
-import plistlib
-from pathlib import Path
+import stat
+from collections.abc import Callable
+from functools import partial
 from xml.parsers.expat import ExpatError
 
+from pre_commit_macadmin_hooks.munki_predicates import validate_condition
+from pre_commit_macadmin_hooks.munki_repo import (
+    PathTrie,
+    RepoEntry,
+    VersionIndex,
+    hash_files,
+    load_repo_entries,
+    load_repo_index,
+    read_lfs_pointer,
+    resolve_reference,
+    trim_version,
+)
 from pre_commit_macadmin_hooks.util import (
-    detect_deprecated_keys,
-    detect_typoed_keys,
-    validate_pkginfo_key_types,
+    add_performance_arguments,
+    find_cycles,
+    list_added_files,
+    load_plist,
+    record_dependency,
+    run_checks,
+    validate_pkginfo_keys,
     validate_required_keys,
-    validate_restart_action_key,
     validate_shebangs,
-    validate_supported_architectures,
-    validate_uninstall_method,
 )
 
 
@@ -57,39 +77,83 @@ def build_argument_parser() -> argparse.ArgumentParser:
     )
     parser.add_argument(
         "--warn-on-duplicate-imports",
-        help="If added, this will only warn if pkginfo/pkg files end with a __1 suffix.",
+        help="If added, this will only warn if pkginfo/pkg files end with a __1 "
+        "suffix, if pkginfos in the same catalog have the same name and version, or "
+        "(with --detect-duplicate-installers) if installer items are identical.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--detect-duplicate-installers",
+        help="If added, report installer items in the pkgs folder that are identical "
+        "to another one, instead of checking for a __1 suffix. Only items of the "
+        "same size are hashed, and hashes are cached as for "
+        "--verify-installer-hashes.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--warn-on-missing-dependencies",
+        help="If added, this will only warn if a requires or update_for item "
+        "does not match any pkginfo in the repo.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--warn-on-downgrades",
+        help="If added, this will only warn if an added pkginfo has a lower version "
+        "than another pkginfo with the same name in one of its catalogs.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--warn-on-ownership-collisions",
+        help="If added, this will only warn if pkginfos with different names have "
+        "the same receipt package ID or installs path.",
         action="store_true",
         default=False,
     )
+    parser.add_argument(
+        "--warn-on-overlapping-copies",
+        help="If added, this will only warn if items with different names copy "
+        "items (items_to_copy) to the same or nested destinations.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--verify-installer-hashes",
+        help="If added, check that the installer_item_hash and installer_item_size "
+        "(and uninstaller equivalents) match the items in the pkgs folder. Hashes "
+        "are cached by file path, size, modification time and inode.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--fail-on-unknown-conditions",
+        help="If added, fail (instead of only warning) if an installable_condition "
+        "uses an attribute that isn't built into Munki or listed in "
+        "--valid-conditions.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--valid-conditions",
+        nargs="+",
+        default=[],
+        help="Add the names of admin-provided conditions used in your environment",
+    )
     parser.add_argument(
         "--valid-shebangs",
         nargs="+",
         default=[],
         help="Add other valid shebangs for your environment",
     )
+    add_performance_arguments(parser)
     return parser
 
 
-def _check_case_sensitive_path(path: str) -> bool:
-    """Check whether a path exists, and on case-sensitive filesystems check
-    that there is no case conflict."""
-    # Return immediately if the file does not exist
-    if not os.path.exists(path):
-        return False
-
-    p = Path(path)
-    while True:
-        # At root, p == p.parent --> break loop and return True
-        if p == p.parent:
-            return True
-        # If string representation of path is not in parent directory, return False
-        if str(p) not in list(map(str, p.parent.iterdir())):
-            return False
-        p = p.parent
-
-
-def main(argv: list[str] | None = None) -> int:
-    """Main process."""
+def check_pkginfo(filename: str, args: argparse.Namespace) -> int:
+    """Check a single pkginfo file. Returns 1 if any problems were found."""
 
     # Typical extensions for installer packages.
     pkg_exts = ("pkg", "dmg")
@@ -98,190 +162,643 @@ def main(argv: list[str] | None = None) -> int:
     # RestartAction values that obviate the need to check blocking applications.
     blocking_actions = ("RequireRestart", "RequireShutdown", "RequireLogout")
 
-    # Parse command line arguments.
-    argparser = build_argument_parser()
-    args = argparser.parse_args(argv)
+    repo_index = load_repo_index(args.munki_repo)
 
     retval = 0
-    for filename in args.filenames:
-        pkginfo = {}
-        try:
-            with open(filename, "rb") as openfile:
-                pkginfo = plistlib.load(openfile)
-        except (ExpatError, ValueError) as err:
-            print(f"{filename}: plist parsing error: {err}")
-            retval = 1
+    pkginfo = {}
+    try:
+        pkginfo = load_plist(filename)
+    except (ExpatError, ValueError) as err:
+        print(f"{filename}: plist parsing error: {err}")
+        retval = 1
+
+    # Check for presence of required pkginfo keys.
+    if args.required_keys:
+        if not validate_required_keys(pkginfo, filename, args.required_keys):
+            return 1  # No need to continue checking this file
+
+    # Check key types, RestartAction, uninstall method and supported
+    # architectures, and look for deprecated or mistyped keys.
+    if not validate_pkginfo_keys(pkginfo, filename):
+        retval = 1
+
+    # Check for deprecated installer_type values.
+    depr_installer_types = (
+        "AdobeAcrobatUpdater",
+        "AdobeCCPInstaller",
+        "AdobeCS5AAMEEPackage",
+        "AdobeCS5PatchInstaller",
+        "AdobeSetup",
+        "AdobeUberInstaller",
+        "appdmg",
+        "apple_update_metadata",
+        "profile",
+        "startosinstall",
+    )
+    if pkginfo.get("installer_type") in depr_installer_types:
+        print(
+            f"{filename}: WARNING: installer_type '{pkginfo.get('installer_type')}' is deprecated"
+        )
+
+    # Check for deprecated uninstall_method values.
+    depr_uninstall_methods = (
+        "AdobeCCPUninstaller",
+        "AdobeCS5AAMEEPackage",
+        "AdobeSetup",
+        "AdobeUberUninstaller",
+    )
+    if pkginfo.get("uninstall_method") in depr_uninstall_methods:
+        print(
+            f"{filename}: WARNING: uninstall_method '{pkginfo.get('uninstall_method')}' is deprecated"
+        )
 
-        # Check for presence of required pkginfo keys.
-        if args.required_keys:
-            if not validate_required_keys(pkginfo, filename, args.required_keys):
+    # Check for rogue categories.
+    if args.categories and pkginfo.get("category") not in args.categories:
+        print(
+            f'{filename}: category "{pkginfo.get("category")}" is not in list of approved categories'
+        )
+        retval = 1
+
+    # Check for rogue catalogs.
+    if args.catalogs:
+        for catalog in pkginfo.get("catalogs", []):
+            if catalog not in args.catalogs:
+                print(f'{filename}: catalog "{catalog}" is not in approved list')
                 retval = 1
-                break  # No need to continue checking this file
 
-        # Ensure pkginfo keys have expected types.
-        if not validate_pkginfo_key_types(pkginfo, filename):
-            retval = 1
+    # Checking for the absence of blocking_applications for pkg installers.
+    # If a pkg doesn't require blocking_applications, use empty "<array/>" in pkginfo.
+    if args.require_pkg_blocking_apps and all(
+        (
+            "blocking_applications" not in pkginfo,
+            pkginfo.get("installer_item_location", "").endswith(".pkg"),
+            pkginfo.get("RestartAction") not in blocking_actions,
+            not pkginfo["name"].startswith("munkitools"),
+        )
+    ):
+        print(
+            f"{filename}: contains a pkg installer but missing a blocking applications array"
+        )
+        retval = 1
+
+    # Begin checks that apply to both installers and uninstallers
+    for i_type in ("installer", "uninstaller"):
+        # Check for missing or case-conflicted installer or uninstaller items
+        location = pkginfo.get(f"{i_type}_item_location", "")
+        if not record_dependency(
+            "munki_pkgs_item", location, repo_index.has_pkgs_item(location)
+        ):
+            if i_type == "installer" and "PackageCompleteURL" in pkginfo:
+                # PackageCompleteURL allows download from a URL outside of the Munki repo,
+                # so the installer need not exist in the repo.
+                continue
 
-        # Validate RestartAction key.
-        if not validate_restart_action_key(pkginfo, filename):
-            retval = 1
+            msg = f"{i_type} item does not exist or path is not case sensitive"
+            if args.warn_on_missing_installer_items:
+                print(f"{filename}: WARNING: {msg}")
+            else:
+                print(f"{filename}: {msg}")
+                retval = 1
 
-        # Validate uninstall method.
-        if not validate_uninstall_method(pkginfo, filename):
-            retval = 1
+        # Check for pkg filenames showing signs of duplicate imports (unless
+        # duplicates are found by comparing contents instead).
+        if not args.detect_duplicate_installers and pkginfo.get(
+            f"{i_type}_item_location", ""
+        ).endswith(tuple(dupe_suffixes)):
+            item_loc = pkginfo[f"{i_type}_item_location"]
+            msg = f"{i_type} item '{item_loc}' may be a duplicate import"
+            if args.warn_on_duplicate_imports:
+                print(f"{filename}: WARNING: {msg}")
+            else:
+                print(f"{filename}: {msg}")
+                retval = 1
 
-        # Validate supported architectures.
-        if not validate_supported_architectures(pkginfo, filename, recipe_mode=False):
+    # Ensure an icon exists for the item.
+    if not any(
+        (
+            pkginfo.get("icon_name"),
+            record_dependency(
+                "munki_icon", pkginfo["name"], repo_index.has_icon(pkginfo["name"])
+            ),
+            pkginfo.get("installer_type") == "apple_update_metadata",
+        )
+    ):
+        msg = "missing icon"
+        if args.warn_on_missing_icons:
+            print(f"{filename}: WARNING: {msg}")
+        else:
+            print(f"{filename}: {msg}")
             retval = 1
 
-        # Check for deprecated pkginfo keys.
-        if not detect_deprecated_keys(pkginfo, filename):
-            retval = 1
+    # Ensure all pkginfo scripts have a proper shebang.
+    script_types = (
+        "installcheck_script",
+        "uninstallcheck_script",
+        "postinstall_script",
+        "postuninstall_script",
+        "preinstall_script",
+        "preuninstall_script",
+        "uninstall_script",
+        "version_script",
+    )
+    for s_type in script_types:
+        if s_type in pkginfo:
+            if not validate_shebangs(pkginfo[s_type], filename, args.valid_shebangs):
+                print(f"{filename}: {s_type} does not start with a valid shebang")
+                retval = 1
 
-        # Check for common mistakes in key names.
-        if not detect_typoed_keys(pkginfo, filename):
+    # Ensure the installable_condition is a valid predicate.
+    if isinstance(pkginfo.get("installable_condition"), str):
+        if not validate_condition(
+            pkginfo["installable_condition"],
+            filename,
+            "installable_condition",
+            args.valid_conditions,
+            args.fail_on_unknown_conditions,
+        ):
             retval = 1
 
-        # Check for deprecated installer_type values.
-        depr_installer_types = (
-            "AdobeAcrobatUpdater",
-            "AdobeCCPInstaller",
-            "AdobeCS5AAMEEPackage",
-            "AdobeCS5PatchInstaller",
-            "AdobeSetup",
-            "AdobeUberInstaller",
-            "appdmg",
-            "apple_update_metadata",
-            "profile",
-            "startosinstall",
-        )
-        if pkginfo.get("installer_type") in depr_installer_types:
-            print(
-                f"{filename}: WARNING: installer_type '{pkginfo.get('installer_type')}' is deprecated"
-            )
+    # Ensure the items_to_copy list does not include trailing slashes.
+    # Credit to @bruienne for this idea.
+    # https://gist.github.com/bruienne/9baa958ec6dbe8f09d94#file-munki_fuzzinator-py-L211-L219
+    if "items_to_copy" in pkginfo:
+        for item_to_copy in pkginfo.get("items_to_copy", []):
+            if item_to_copy.get("destination_path").endswith("/"):
+                print(
+                    f'{filename}: has an items_to_copy with a trailing slash: "{item_to_copy["destination_path"]}"'
+                )
+                retval = 1
 
-        # Check for deprecated uninstall_method values.
-        depr_uninstall_methods = (
-            "AdobeCCPUninstaller",
-            "AdobeCS5AAMEEPackage",
-            "AdobeSetup",
-            "AdobeUberUninstaller",
-        )
-        if pkginfo.get("uninstall_method") in depr_uninstall_methods:
-            print(
-                f"{filename}: WARNING: uninstall_method '{pkginfo.get('uninstall_method')}' is deprecated"
-            )
+    return retval
+
+
+def get_checked_paths(args: argparse.Namespace) -> set[str]:
+    """Return the absolute paths of the pkginfo files being checked. The
+    checks across the repo only report problems involving one of these, so
+    that problems already in the repo don't fail commits that don't touch
+    them."""
+    return {os.path.abspath(filename) for filename in args.filenames}
 
-        # Check for rogue categories.
-        if args.categories and pkginfo.get("category") not in args.categories:
-            print(
-                f'{filename}: category "{pkginfo.get("category")}" is not in list of approved categories'
-            )
-            retval = 1
 
-        # Check for rogue catalogs.
-        if args.catalogs:
-            for catalog in pkginfo.get("catalogs", []):
-                if catalog not in args.catalogs:
-                    print(f'{filename}: catalog "{catalog}" is not in approved list')
+def check_dependencies(entries: list[RepoEntry], args: argparse.Namespace) -> int:
+    """Check that the requires and update_for references of the pkginfos being
+    checked match a pkginfo in the repo, and don't form a cycle. Takes time
+    linear in the size of the repo. Returns 1 if any problems were found."""
+
+    # Index the version(s) of each item name in the repo.
+    versions: dict[str, set[str]] = {}
+    for entry in entries:
+        item_versions = versions.setdefault(entry.name, set())
+        if entry.version is not None:
+            item_versions.add(trim_version(entry.version))
+
+    checked_paths = get_checked_paths(args)
+    retval = 0
+    graphs: dict[str, dict[str, list[str]]] = {"requires": {}, "update_for": {}}
+    for entry in entries:
+        checked = os.path.abspath(entry.path) in checked_paths
+        for key, graph in graphs.items():
+            edges = graph.setdefault(entry.name, [])
+            for ref in getattr(entry, key):
+                target = resolve_reference(ref, versions)
+                if target is not None:
+                    edges.append(target)
+                    continue
+                if not checked:
+                    continue
+                msg = f'{key} item "{ref}" does not match any pkginfo in the repo'
+                if args.warn_on_missing_dependencies:
+                    print(f"{entry.path}: WARNING: {msg}")
+                else:
+                    print(f"{entry.path}: {msg}")
                     retval = 1
 
-        # Checking for the absence of blocking_applications for pkg installers.
-        # If a pkg doesn't require blocking_applications, use empty "<array/>" in pkginfo.
-        if args.require_pkg_blocking_apps and all(
-            (
-                "blocking_applications" not in pkginfo,
-                pkginfo.get("installer_item_location", "").endswith(".pkg"),
-                pkginfo.get("RestartAction") not in blocking_actions,
-                not pkginfo["name"].startswith("munkitools"),
+    # Report each cycle once, for the first pkginfo being checked with a
+    # reference in it.
+    for key, graph in graphs.items():
+        cycle_of = {}
+        for cycle in find_cycles(graph):
+            for name in cycle:
+                cycle_of[name] = cycle
+        for entry in entries:
+            cycle = cycle_of.get(entry.name)
+            if cycle is None or os.path.abspath(entry.path) not in checked_paths:
+                continue
+            refs = getattr(entry, key)
+            if any(resolve_reference(ref, versions) in cycle for ref in refs):
+                print(f"{entry.path}: {key} items form a cycle: {', '.join(cycle)}")
+                retval = 1
+                for name in cycle:
+                    del cycle_of[name]
+
+    return retval
+
+
+def check_duplicates(entries: list[RepoEntry], args: argparse.Namespace) -> int:
+    """Check that no two pkginfos in the repo have the same name and version
+    and share a catalog, which leaves clients to pick one of them
+    arbitrarily. Versions are compared with trailing ".0"s trimmed, as Munki
+    does. Only pairs including a pkginfo being checked are reported, for
+    that pkginfo. Returns 1 if any problems were found."""
+
+    checked_paths = get_checked_paths(args)
+    retval = 0
+    seen: dict[tuple[str, str], list[tuple[str, set[str], bool]]] = {}
+    for entry in entries:
+        if entry.version is None:
+            continue
+        catalogs = set(entry.catalogs)
+        checked = os.path.abspath(entry.path) in checked_paths
+        same_version = seen.setdefault((entry.name, trim_version(entry.version)), [])
+        for other_path, other_catalogs, other_checked in same_version:
+            shared = catalogs & other_catalogs
+            if not shared or not (checked or other_checked):
+                continue
+            path, other_path = (
+                (entry.path, other_path) if checked else (other_path, entry.path)
             )
-        ):
-            print(
-                f"{filename}: contains a pkg installer but missing a blocking applications array"
+            msg = (
+                f"has the same name and version as {other_path}, and both are in "
+                f"catalogs: {', '.join(sorted(shared))}"
             )
-            retval = 1
+            if args.warn_on_duplicate_imports:
+                print(f"{path}: WARNING: {msg}")
+            else:
+                print(f"{path}: {msg}")
+                retval = 1
+            break
+        same_version.append((entry.path, catalogs, checked))
+    return retval
 
-        # Begin checks that apply to both installers and uninstallers
-        for i_type in ("installer", "uninstaller"):
-            # Check for missing or case-conflicted installer or uninstaller items
-            if not _check_case_sensitive_path(
-                os.path.join(
-                    args.munki_repo, "pkgs", pkginfo.get(f"{i_type}_item_location", "")
-                )
-            ):
-                if i_type == "installer" and "PackageCompleteURL" in pkginfo:
-                    # PackageCompleteURL allows download from a URL outside of the Munki repo,
-                    # so the installer need not exist in the repo.
-                    continue
 
-                msg = f"{i_type} item does not exist or path is not case sensitive"
-                if args.warn_on_missing_installer_items:
-                    print(f"{filename}: WARNING: {msg}")
-                else:
-                    print(f"{filename}: {msg}")
-                    retval = 1
+def check_downgrades(entries: list[RepoEntry], args: argparse.Namespace) -> int:
+    """Check that each pkginfo being added to the repo has the highest version
+    of its name in each of its catalogs, since clients ignore a lower
+    version. Versions are ordered as Munki orders them. Pkginfos that are
+    already in the repo aren't checked, as older versions are normally kept.
+    Returns 1 if any problems were found."""
 
-            # Check for pkg filenames showing signs of duplicate imports.
-            if pkginfo.get(f"{i_type}_item_location", "").endswith(
-                tuple(dupe_suffixes)
-            ):
-                item_loc = pkginfo[f"{i_type}_item_location"]
-                msg = f"{i_type} item '{item_loc}' may be a duplicate import"
-                if args.warn_on_duplicate_imports:
-                    print(f"{filename}: WARNING: {msg}")
-                else:
-                    print(f"{filename}: {msg}")
-                    retval = 1
+    added = list_added_files(args.munki_repo) & get_checked_paths(args)
+    if not added:
+        return 0
 
-        # Ensure an icon exists for the item.
-        if not any(
-            (
-                pkginfo.get("icon_name"),
-                os.path.isfile(
-                    os.path.join(args.munki_repo, f"icons/{pkginfo['name']}.png")
-                ),
-                pkginfo.get("installer_type") == "apple_update_metadata",
+    version_index = VersionIndex(entries)
+    retval = 0
+    for entry in entries:
+        if entry.version is None or os.path.abspath(entry.path) not in added:
+            continue
+        for catalog in sorted(set(entry.catalogs)):
+            higher = version_index.highest_above(entry.name, catalog, entry.version)
+            if higher is None:
+                continue
+            msg = (
+                f"version {entry.version} is lower than version {higher[0]} "
+                f'({higher[1]}) in catalog "{catalog}", so clients will ignore it'
             )
-        ):
-            msg = "missing icon"
-            if args.warn_on_missing_icons:
-                print(f"{filename}: WARNING: {msg}")
+            if args.warn_on_downgrades:
+                print(f"{entry.path}: WARNING: {msg}")
             else:
-                print(f"{filename}: {msg}")
+                print(f"{entry.path}: {msg}")
                 retval = 1
+    return retval
+
+
+def check_ownership(entries: list[RepoEntry], args: argparse.Namespace) -> int:
+    """Check that no receipt package ID or installs path is claimed by
+    pkginfos with different names, which makes clients alternate between
+    the items. Versions of the same item may share them. Installs paths are
+    compared ignoring case, as on macOS. Only collisions including a pkginfo
+    being checked are reported, for that pkginfo. Takes time linear in the
+    size of the repo. Returns 1 if any problems were found."""
+
+    checked_paths = get_checked_paths(args)
+    retval = 0
+    for key, kind in (("receipts", "receipt"), ("installs", "installs path")):
+        # Package IDs or paths mapped to the names claiming them, mapped to
+        # the first claim of each name, and its first claim by a pkginfo being
+        # checked (if any). Claims are (index, position, path, value) tuples.
+        owners: dict[str, dict[str, list]] = {}
+        for index, entry in enumerate(entries):
+            checked = os.path.abspath(entry.path) in checked_paths
+            for position, value in enumerate(dict.fromkeys(getattr(entry, key))):
+                if key == "installs":
+                    claimants = owners.setdefault(value.casefold().rstrip("/"), {})
+                else:
+                    claimants = owners.setdefault(value, {})
+                claim = (index, position, entry.path, value)
+                claims = claimants.setdefault(entry.name, [claim, None])
+                if checked and claims[1] is None:
+                    claims[1] = claim
+
+        # Each other name collides with the first name to claim the value.
+        findings = []
+        for claimants in owners.values():
+            (first_name, (first, first_checked)), *others = claimants.items()
+            for name, (claim, checked_claim) in others:
+                if checked_claim:
+                    findings.append((checked_claim, first_name, first[2]))
+                elif first_checked:
+                    findings.append((first_checked, name, claim[2]))
+
+        # Report in the order of the pkginfos, rather than of the values.
+        findings.sort(key=lambda finding: finding[0][:2])
+        for (_, _, path, value), other_name, other_path in findings:
+            msg = f'{kind} "{value}" is also claimed by "{other_name}" ({other_path})'
+            if args.warn_on_ownership_collisions:
+                print(f"{path}: WARNING: {msg}")
+            else:
+                print(f"{path}: {msg}")
+                retval = 1
+    return retval
+
+
+def check_copy_destinations(entries: list[RepoEntry], args: argparse.Namespace) -> int:
+    """Check that no two items with different names copy items (with
+    items_to_copy) to the same destination, or to a destination inside
+    another's, where they would overwrite each other. Versions of the same
+    item may share destinations. Only overlaps including a pkginfo being
+    checked are reported, for that pkginfo. Returns 1 if any problems were
+    found."""
+
+    checked_paths = get_checked_paths(args)
+    trie = PathTrie()
+    for index, entry in enumerate(entries):
+        checked = os.path.abspath(entry.path) in checked_paths
+        for destination in entry.items_to_copy:
+            # Each name's first claim of a destination, and its first claim by
+            # a pkginfo being checked (if any).
+            claim = (index, entry.path, destination)
+            _, claims = trie.insert(destination, entry.name, [claim, None])
+            if checked and claims[1] is None:
+                claims[1] = claim
+
+    findings = []
+    for (name, _, claims), (other_name, _, other_claims), same in trie.overlaps():
+        (_, path, destination), checked_claim = claims
+        (_, other_path, other_destination), other_checked_claim = other_claims
+        if checked_claim:
+            index, path, destination = checked_claim
+            if same:
+                msg = (
+                    f'items_to_copy destination "{destination}" is also copied to '
+                    f'by "{other_name}" ({other_path})'
+                )
+            else:
+                msg = (
+                    f'items_to_copy destination "{destination}" is inside '
+                    f'"{other_destination}", which is copied by "{other_name}" '
+                    f"({other_path})"
+                )
+        elif other_checked_claim:
+            index, other_path, other_destination = other_checked_claim
+            if same:
+                msg = (
+                    f'items_to_copy destination "{other_destination}" is also '
+                    f'copied to by "{name}" ({path})'
+                )
+            else:
+                msg = (
+                    f'items_to_copy destination "{other_destination}" contains '
+                    f'"{destination}", which is copied by "{name}" ({path})'
+                )
+            path = other_path
+        else:
+            continue
+        findings.append((index, path, msg))
+
+    # Report in the order of the pkginfos, rather than of the destinations.
+    retval = 0
+    for _, path, msg in sorted(findings):
+        if args.warn_on_overlapping_copies:
+            print(f"{path}: WARNING: {msg}")
+        else:
+            print(f"{path}: {msg}")
+            retval = 1
+    return retval
+
+
+def check_duplicate_installers(
+    entries: list[RepoEntry], args: argparse.Namespace
+) -> int:
+    """Check that no installer or uninstaller item used by the pkginfos in the
+    repo is identical to another one. Items are grouped by size, and only
+    items with the same size as another are hashed. Git LFS pointer files
+    are compared by the hash recorded in the pointer. Empty files and
+    folders are skipped. Only groups of identical items including an item
+    used by a pkginfo being checked are reported (and hashed). Returns 1 if
+    any problems were found."""
+
+    checked_paths = get_checked_paths(args)
+    repo_index = load_repo_index(args.munki_repo)
+    pkgs_dir = os.path.join(args.munki_repo, "pkgs")
+
+    # Installer items mapped to the position and path of the first pkginfo
+    # that uses each, and the items used by a pkginfo being checked.
+    users: dict[str, tuple[int, str]] = {}
+    checked_locations = set()
+    for index, entry in enumerate(entries):
+        checked = os.path.abspath(entry.path) in checked_paths
+        for location in entry.installer_items:
+            if not os.path.isabs(location) and repo_index.has_pkgs_item(location):
+                users.setdefault(location, (index, entry.path))
+                if checked:
+                    checked_locations.add(location)
+
+    sizes: dict[int, list[str]] = {}
+    lfs_hashes = {}
+    for location in users:
+        path = os.path.join(pkgs_dir, location)
+        pointer = read_lfs_pointer(path)
+        if pointer:
+            lfs_hashes[location], size = pointer
+        else:
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            if not stat.S_ISREG(stat_result.st_mode):
+                continue
+            size = stat_result.st_size
+        if size:
+            sizes.setdefault(size, []).append(location)
+
+    candidates = [
+        location
+        for same_size in sizes.values()
+        if len(same_size) > 1 and checked_locations.intersection(same_size)
+        for location in same_size
+    ]
+    hashes = hash_files(
+        [
+            os.path.join(pkgs_dir, location)
+            for location in candidates
+            if location not in lfs_hashes
+        ],
+        jobs=args.jobs,
+        use_cache=not args.no_cache,
+    )
+    identical: dict[str, list[str]] = {}
+    for location in candidates:
+        digest = lfs_hashes.get(location) or hashes[os.path.join(pkgs_dir, location)]
+        if digest is not None:
+            identical.setdefault(digest, []).append(location)
+
+    # Report each duplicate for the first pkginfo using it, in the order of
+    # the pkginfos.
+    findings = []
+    for locations in identical.values():
+        if not checked_locations.intersection(locations):
+            continue
+        original, *duplicates = sorted(locations, key=users.__getitem__)
+        for location in duplicates:
+            msg = (
+                f'installer item "{location}" is identical to "{original}" '
+                f"(used by {users[original][1]})"
+            )
+            findings.append((*users[location], msg))
+    retval = 0
+    for _, path, msg in sorted(findings):
+        if args.warn_on_duplicate_imports:
+            print(f"{path}: WARNING: {msg}")
+        else:
+            print(f"{path}: {msg}")
+            retval = 1
+    return retval
 
-        # Ensure all pkginfo scripts have a proper shebang.
-        script_types = (
-            "installcheck_script",
-            "uninstallcheck_script",
-            "postinstall_script",
-            "postuninstall_script",
-            "preinstall_script",
-            "preuninstall_script",
-            "uninstall_script",
-            "version_script",
-        )
-        for s_type in script_types:
-            if s_type in pkginfo:
-                if not validate_shebangs(
-                    pkginfo[s_type], filename, args.valid_shebangs
-                ):
-                    print(f"{filename}: {s_type} does not start with a valid shebang")
-                    retval = 1
 
-        # Ensure the items_to_copy list does not include trailing slashes.
-        # Credit to @bruienne for this idea.
-        # https://gist.github.com/bruienne/9baa958ec6dbe8f09d94#file-munki_fuzzinator-py-L211-L219
-        if "items_to_copy" in pkginfo:
-            for item_to_copy in pkginfo.get("items_to_copy", []):
-                if item_to_copy.get("destination_path").endswith("/"):
+def check_installer_hashes(args: argparse.Namespace) -> int:
+    """Check that the recorded hash and size of each installer and uninstaller
+    item of the pkginfo files match the item in the pkgs folder. Sizes are
+    checked first, with a stat, so only items of the right size are hashed.
+    Items that are Git LFS pointer files are checked against the hash and
+    size recorded in the pointer, without fetching the object. Returns 1 if
+    any problems were found."""
+
+    repo_index = load_repo_index(args.munki_repo)
+    to_hash = []
+    retval = 0
+    for filename in args.filenames:
+        try:
+            pkginfo = load_plist(filename)
+        except (ExpatError, ValueError, OSError):
+            continue  # Already reported by check_pkginfo
+        if not isinstance(pkginfo, dict):
+            continue
+        for i_type in ("installer", "uninstaller"):
+            location = pkginfo.get(f"{i_type}_item_location")
+            if not isinstance(location, str) or not repo_index.has_pkgs_item(location):
+                continue  # Missing items are reported by check_pkginfo
+            path = os.path.join(args.munki_repo, "pkgs", location)
+            pointer = read_lfs_pointer(path)
+            size = pkginfo.get(f"{i_type}_item_size")
+            if isinstance(size, int) and not isinstance(size, bool):
+                if pointer:
+                    actual_size = pointer[1] // 1024
+                else:
+                    try:
+                        actual_size = os.stat(path).st_size // 1024
+                    except OSError:
+                        continue
+                if actual_size != size:
                     print(
-                        f'{filename}: has an items_to_copy with a trailing slash: "{item_to_copy["destination_path"]}"'
+                        f"{filename}: {i_type}_item_size is {size} KB, but "
+                        f"{location} is {actual_size} KB"
                     )
                     retval = 1
+                    continue
+            expected_hash = pkginfo.get(f"{i_type}_item_hash")
+            if not isinstance(expected_hash, str):
+                continue
+            if not pointer:
+                to_hash.append((filename, i_type, location, path, expected_hash))
+            elif pointer[0] != expected_hash.lower():
+                print(f"{filename}: {i_type}_item_hash does not match {location}")
+                retval = 1
 
+    hashes = hash_files(
+        [path for _, _, _, path, _ in to_hash],
+        jobs=args.jobs,
+        use_cache=not args.no_cache,
+    )
+    for filename, i_type, location, path, expected_hash in to_hash:
+        actual_hash = hashes[path]
+        if actual_hash is None:
+            print(f"{filename}: {i_type} item {location} could not be read")
+            retval = 1
+        elif actual_hash != expected_hash.lower():
+            print(f"{filename}: {i_type}_item_hash does not match {location}")
+            retval = 1
     return retval
 
 
+def get_file_checker(args: argparse.Namespace) -> Callable[[str], int]:
+    """Return the function that checks a single pkginfo file."""
+
+    # Read the repo's pkgs and icons folders once, up front (or reuse the index
+    # from an earlier run in this process if the repo hasn't changed).
+    load_repo_index(args.munki_repo, refresh=True)
+    return partial(check_pkginfo, args=args)
+
+
+def cache_dependencies(args: argparse.Namespace) -> dict[str, Callable[[str], bool]]:
+    """Cached results are only valid while the installer items and icon each
+    pkginfo refers to still exist (or are still missing)."""
+    repo_index = load_repo_index(args.munki_repo)
+    return {
+        "munki_pkgs_item": repo_index.has_pkgs_item,
+        "munki_icon": repo_index.has_icon,
+    }
+
+
+def summarize_results(args: argparse.Namespace, results: list[int]) -> int:
+    """Combine the results of check_pkginfo, and check the dependencies
+    between all pkginfos in the repo, for duplicates among them, for added
+    pkginfos with lower versions, for receipts and installs claimed by
+    different items, and for overlapping items_to_copy destinations (and, if
+    requested, for identical installer items and installer item hashes).
+    Returns the exit code for the hook."""
+    retval = 1 if any(results) else 0
+    if args.filenames:
+        entries = load_repo_entries(
+            args.munki_repo,
+            jobs=args.jobs,
+            use_cache=not (args.no_cache or args.profile),
+        )
+        if check_dependencies(entries, args):
+            retval = 1
+        if check_duplicates(entries, args):
+            retval = 1
+        if check_downgrades(entries, args):
+            retval = 1
+        if check_ownership(entries, args):
+            retval = 1
+        if check_copy_destinations(entries, args):
+            retval = 1
+        if args.detect_duplicate_installers and check_duplicate_installers(
+            entries, args
+        ):
+            retval = 1
+    if args.verify_installer_hashes and check_installer_hashes(args):
+        retval = 1
+    return retval
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Main process."""
+
+    # Parse command line arguments.
+    argparser = build_argument_parser()
+    args = argparser.parse_args(argv)
+
+    check_pkginfo_file = get_file_checker(args)
+    results = run_checks(
+        "check-munki-pkgsinfo",
+        args,
+        check_pkginfo_file,
+        dependencies=cache_dependencies(args),
+    )
+    return summarize_results(args, results)
+
+
 if __name__ == "__main__":
     exit(main())
@@ -7,11 +7,7 @@ import plistlib
 from typing import Any
 from xml.parsers.expat import ExpatError
 
-import ruamel.yaml
-
-from pre_commit_macadmin_hooks.util import validate_required_keys
-
-yaml = ruamel.yaml.YAML(typ="safe")
+from pre_commit_macadmin_hooks.util import load_yaml, validate_required_keys
 
 
 def build_argument_parser() -> argparse.ArgumentParser:
@@ -83,7 +79,7 @@ def main(argv: list[str] | None = None) -> int:
         elif filename.endswith((".yaml", ".yml")):
             try:
                 with open(filename, encoding="utf-8") as openfile:
-                    buildinfo = yaml.load(openfile)
+                    buildinfo = load_yaml(openfile)
             except Exception as err:
                 print(f"{filename}: yaml parsing error: {err}")
                 retval = 1
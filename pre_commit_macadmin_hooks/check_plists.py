@@ -2,9 +2,15 @@
 """This hook checks XML property list (plist) files for basic syntax errors."""
 
 import argparse
-import plistlib
+from collections.abc import Callable
 from xml.parsers.expat import ExpatError
 
+from pre_commit_macadmin_hooks.util import (
+    add_performance_arguments,
+    load_plist,
+    run_checks,
+)
+
 
 def build_argument_parser() -> argparse.ArgumentParser:
     """Build and return the argument parser."""
@@ -13,9 +19,32 @@ def build_argument_parser() -> argparse.ArgumentParser:
         description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
     )
     parser.add_argument("filenames", nargs="*", help="Filenames to check.")
+    add_performance_arguments(parser)
     return parser
 
 
+def check_plist(filename: str) -> int:
+    """Check a single plist. Returns 1 if it could not be parsed."""
+
+    retval = 0
+    try:
+        _ = load_plist(filename)
+        # Possible future addition, but disabled for now.
+        # if not isinstance(plist, dict):
+        #     print(f"{filename}: top level of plist should be type dict")
+        #     retval = 1
+    except (ExpatError, ValueError) as err:
+        print(f"{filename}: plist parsing error: {err}")
+        retval = 1
+
+    return retval
+
+
+def get_file_checker(args: argparse.Namespace) -> Callable[[str], int]:
+    """Return the function that checks a single plist."""
+    return check_plist
+
+
 def main(argv: list[str] | None = None) -> int:
     """Main process."""
 
@@ -23,20 +52,8 @@ def main(argv: list[str] | None = None) -> int:
     argparser = build_argument_parser()
     args = argparser.parse_args(argv)
 
-    retval = 0
-    for filename in args.filenames:
-        try:
-            with open(filename, "rb") as openfile:
-                _ = plistlib.load(openfile)
-            # Possible future addition, but disabled for now.
-            # if not isinstance(plist, dict):
-            #     print(f"{filename}: top level of plist should be type dict")
-            #     retval = 1
-        except (ExpatError, ValueError) as err:
-            print(f"{filename}: plist parsing error: {err}")
-            retval = 1
-
-    return retval
+    results = run_checks("check-plists", args, get_file_checker(args))
+    return 1 if any(results) else 0
 
 
 if __name__ == "__main__":
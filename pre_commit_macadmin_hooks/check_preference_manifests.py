@@ -7,12 +7,17 @@
 # - https://mosen.github.io/profiledocs/manifest.html
 
 import argparse
-import plistlib
+from collections.abc import Callable
 from datetime import datetime
 from typing import Any
 from xml.parsers.expat import ExpatError
 
-from pre_commit_macadmin_hooks.util import PLIST_TYPES
+from pre_commit_macadmin_hooks.util import (
+    PLIST_TYPES,
+    add_performance_arguments,
+    load_plist,
+    run_checks,
+)
 
 # List keys and their expected item types
 PFM_LIST_TYPES = {
@@ -36,6 +41,7 @@ def build_argument_parser() -> argparse.ArgumentParser:
         description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
     )
     parser.add_argument("filenames", nargs="*", help="Filenames to check.")
+    add_performance_arguments(parser)
     return parser
 
 
@@ -410,54 +416,62 @@ def validate_subkeys(subkeys, filename):
     return passed
 
 
-def main(argv: list[str] | None = None) -> int:
-    """Main process."""
-
-    # Parse command line arguments.
-    argparser = build_argument_parser()
-    args = argparser.parse_args(argv)
+def check_manifest(filename: str) -> int:
+    """Check a single preference manifest. Returns 1 if any problems were found."""
 
     retval = 0
-    for filename in args.filenames:
-        try:
-            with open(filename, "rb") as openfile:
-                manifest = plistlib.load(openfile)
-        except (ExpatError, ValueError) as err:
-            print(f"{filename}: plist parsing error: {err}")
-            retval = 1
-            continue  # No need to continue checking this file
+    try:
+        manifest = load_plist(filename)
+    except (ExpatError, ValueError) as err:
+        print(f"{filename}: plist parsing error: {err}")
+        return 1  # No need to continue checking this file
+
+    # Check for presence of required keys.
+    required_keys = ("pfm_title", "pfm_domain", "pfm_description")
+    if not validate_required_keys(manifest, required_keys, "<root dict>", filename):
+        return 1  # No need to continue checking this file
+
+    # Ensure pfm_format_version has expected value
+    if manifest.get("pfm_format_version", 1) != 1:
+        print(
+            f"{filename}: pfm_format_version should be 1, not {manifest.get('pfm_format_version')} "
+            "(https://github.com/ProfileCreator/ProfileManifests"
+            "/wiki/Manifest-Format-Versions)"
+        )
+        retval = 1
 
-        # Check for presence of required keys.
-        required_keys = ("pfm_title", "pfm_domain", "pfm_description")
-        if not validate_required_keys(manifest, required_keys, "<root dict>", filename):
-            retval = 1
-            continue  # No need to continue checking this file
+    # Ensure platform values are valid
+    if not validate_platforms(manifest, filename):
+        retval = 1
 
-        # Ensure pfm_format_version has expected value
-        if manifest.get("pfm_format_version", 1) != 1:
-            print(
-                f"{filename}: pfm_format_version should be 1, not {manifest.get('pfm_format_version')} "
-                "(https://github.com/ProfileCreator/ProfileManifests"
-                "/wiki/Manifest-Format-Versions)"
-            )
-            retval = 1
+    # Ensure top level keys and their list items have expected types.
+    if not validate_manifest_key_types(manifest, filename):
+        retval = 1
+    if not validate_list_item_types(manifest, filename):
+        retval = 1
 
-        # Ensure platform values are valid
-        if not validate_platforms(manifest, filename):
+    # Run checks recursively for all subkeys
+    if "pfm_subkeys" in manifest:
+        if not validate_subkeys(manifest["pfm_subkeys"], filename):
             retval = 1
 
-        # Ensure top level keys and their list items have expected types.
-        if not validate_manifest_key_types(manifest, filename):
-            retval = 1
-        if not validate_list_item_types(manifest, filename):
-            retval = 1
+    return retval
 
-        # Run checks recursively for all subkeys
-        if "pfm_subkeys" in manifest:
-            if not validate_subkeys(manifest["pfm_subkeys"], filename):
-                retval = 1
 
-    return retval
+def get_file_checker(args: argparse.Namespace) -> Callable[[str], int]:
+    """Return the function that checks a single preference manifest."""
+    return check_manifest
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Main process."""
+
+    # Parse command line arguments.
+    argparser = build_argument_parser()
+    args = argparser.parse_args(argv)
+
+    results = run_checks("check-preference-manifests", args, get_file_checker(args))
+    return 1 if any(results) else 0
 
 
 if __name__ == "__main__":
@@ -2,8 +2,13 @@
 """This hook prevents AutoPkg overrides from being added to the repo."""
 
 import argparse
+from collections.abc import Callable
 
-from pre_commit_macadmin_hooks.util import load_autopkg_recipe
+from pre_commit_macadmin_hooks.util import (
+    add_performance_arguments,
+    load_autopkg_recipe,
+    run_checks,
+)
 
 
 def build_argument_parser() -> argparse.ArgumentParser:
@@ -13,32 +18,43 @@ def build_argument_parser() -> argparse.ArgumentParser:
         description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
     )
     parser.add_argument("filenames", nargs="*", help="Filenames to check.")
+    add_performance_arguments(parser)
     return parser
 
 
-def main(argv: list[str] | None = None) -> int:
-    """Main process."""
+def check_recipe(filename: str) -> int:
+    """Check a single recipe. Returns 1 if it looks like an override."""
 
     # Overrides should not contain top-level Process arrays.
     required_keys = ("Process",)
 
-    # Parse command line arguments.
-    argparser = build_argument_parser()
-    args = argparser.parse_args(argv)
-
     retval = 0
-    for filename in args.filenames:
-        recipe = load_autopkg_recipe(filename)
-        if not recipe:
+    recipe = load_autopkg_recipe(filename)
+    if not recipe:
+        return 1  # No need to continue checking this file.
+    for req_key in required_keys:
+        if req_key not in recipe:
+            print(f"{filename}: possible AutoPkg recipe override")
             retval = 1
-            break  # No need to continue checking this file.
-        for req_key in required_keys:
-            if req_key not in recipe:
-                print(f"{filename}: possible AutoPkg recipe override")
-                retval = 1
 
     return retval
 
 
+def get_file_checker(args: argparse.Namespace) -> Callable[[str], int]:
+    """Return the function that checks a single recipe."""
+    return check_recipe
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Main process."""
+
+    # Parse command line arguments.
+    argparser = build_argument_parser()
+    args = argparser.parse_args(argv)
+
+    results = run_checks("forbid-autopkg-overrides", args, get_file_checker(args))
+    return 1 if any(results) else 0
+
+
 if __name__ == "__main__":
     exit(main())
@@ -3,8 +3,13 @@
 repo."""
 
 import argparse
+from collections.abc import Callable
 
-from pre_commit_macadmin_hooks.util import load_autopkg_recipe
+from pre_commit_macadmin_hooks.util import (
+    add_performance_arguments,
+    load_autopkg_recipe,
+    run_checks,
+)
 
 
 def build_argument_parser() -> argparse.ArgumentParser:
@@ -14,9 +19,29 @@ def build_argument_parser() -> argparse.ArgumentParser:
         description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
     )
     parser.add_argument("filenames", nargs="*", help="Filenames to check.")
+    add_performance_arguments(parser)
     return parser
 
 
+def check_recipe(filename: str) -> int:
+    """Check a single recipe. Returns 1 if it contains trust info."""
+
+    retval = 0
+    recipe = load_autopkg_recipe(filename)
+    if not recipe:
+        retval = 1
+    elif "ParentRecipeTrustInfo" in recipe:
+        print(f"{filename}: trust info in recipe")
+        retval = 1
+
+    return retval
+
+
+def get_file_checker(args: argparse.Namespace) -> Callable[[str], int]:
+    """Return the function that checks a single recipe."""
+    return check_recipe
+
+
 def main(argv: list[str] | None = None) -> int:
     """Main process."""
 
@@ -24,16 +49,8 @@ def main(argv: list[str] | None = None) -> int:
     argparser = build_argument_parser()
     args = argparser.parse_args(argv)
 
-    retval = 0
-    for filename in args.filenames:
-        recipe = load_autopkg_recipe(filename)
-        if not recipe:
-            retval = 1
-        elif "ParentRecipeTrustInfo" in recipe:
-            print(f"{filename}: trust info in recipe")
-            retval = 1
-
-    return retval
+    results = run_checks("forbid-autopkg-trust-info", args, get_file_checker(args))
+    return 1 if any(results) else 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+"""Runs a hook through macadmin-hook-server, which keeps the hooks and their
+dependencies loaded, so that the hook doesn't pay for starting Python and
+importing them again. If no server is running, the hook runs in this process.
+
+This module only imports what it needs to talk to the server."""
+
+import argparse
+import importlib
+import json
+import os
+import socket
+import stat
+import sys
+
+# Sent to the server, which only runs hooks for clients with the same code.
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Environment variables used by the hooks and the commands they run. Only
+# these are sent to the server.
+ENV_NAMES = ("HOME", "LANG", "PATH", "TMPDIR", "XDG_CACHE_HOME", "XDG_CONFIG_HOME")
+ENV_PREFIXES = ("GIT_", "LC_", "PRE_COMMIT")
+
+
+def get_socket_path() -> str:
+    """Return the path of the server's socket, in a directory specific to the
+    current user."""
+    path = os.environ.get("PRE_COMMIT_MACADMIN_SOCKET")
+    if path:
+        return path
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR", "/tmp")
+    return os.path.join(runtime_dir, f"pre-commit-macadmin-{os.getuid()}", "hooks.sock")
+
+
+def is_private_dir(path: str) -> bool:
+    """Return True if path is a directory owned by the current user that no
+    one else can access, so that no other user can have put a socket in it."""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return (
+        stat.S_ISDIR(info.st_mode)
+        and info.st_uid == os.getuid()
+        and not info.st_mode & 0o077
+    )
+
+
+def is_hook_env(name: str) -> bool:
+    """Return True if the environment variable is one the hooks use."""
+    return name in ENV_NAMES or name.startswith(ENV_PREFIXES)
+
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    """Build and return the argument parser."""
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("hook", help="ID of the hook to run, e.g. check-plists.")
+    parser.add_argument(
+        "hook_args",
+        nargs=argparse.REMAINDER,
+        help="Arguments and filenames to pass to the hook.",
+    )
+    return parser
+
+
+def run_remote(hook: str, argv: list[str]) -> int | None:
+    """Run a hook on the server, printing its output as it arrives. Returns
+    the hook's exit code, or None if the server couldn't run it."""
+
+    stdout, stderr = sys.stdout, sys.stderr
+    path = get_socket_path()
+    if not is_private_dir(os.path.dirname(os.path.abspath(path))):
+        # Another user could be listening on the socket.
+        return None
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+    except OSError:
+        return None
+
+    request = {
+        "hook": hook,
+        "argv": argv,
+        "cwd": os.getcwd(),
+        "env": {name: value for name, value in os.environ.items() if is_hook_env(name)},
+        "package": PACKAGE_DIR,
+    }
+    received_output = False
+    with sock, sock.makefile("rwb") as stream:
+        try:
+            stream.write(json.dumps(request).encode("utf-8") + b"\n")
+            stream.flush()
+            for line in stream:
+                message = json.loads(line)
+                if "out" in message:
+                    stdout.write(message["out"])
+                    received_output = True
+                elif "err" in message:
+                    stderr.write(message["err"])
+                    received_output = True
+                elif "exit" in message:
+                    stdout.flush()
+                    return message["exit"]
+                else:
+                    # The server can't run this hook, e.g. because it's out
+                    # of date. Nothing has been printed yet.
+                    return None
+        except OSError:
+            pass
+
+    if not received_output:
+        return None
+    print(f"{hook}: lost connection to macadmin-hook-server", file=stderr)
+    return 1
+
+
+def run_local(hook: str, argv: list[str]) -> int | None:
+    """Run a hook in this process. Returns None if there is no such hook."""
+    module_name = f"pre_commit_macadmin_hooks.{hook.replace('-', '_')}"
+    try:
+        module = importlib.import_module(module_name)
+    except ModuleNotFoundError as err:
+        if err.name != module_name:
+            raise
+        return None
+    if module.__name__ in (__name__, f"{__package__}.hook_server"):
+        return None
+    hook_main = getattr(module, "main", None)
+    return hook_main(argv) if hook_main else None
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Main process."""
+
+    # Parse command line arguments.
+    argparser = build_argument_parser()
+    args = argparser.parse_args(argv)
+    if not args.hook.replace("-", "").isalpha():
+        argparser.error(f"unknown hook: {args.hook}")
+
+    retval = run_remote(args.hook, args.hook_args)
+    if retval is None:
+        retval = run_local(args.hook, args.hook_args)
+    if retval is None:
+        argparser.error(f"unknown hook: {args.hook}")
+    return retval
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,282 @@
+#!/usr/bin/python
+"""Keeps the hooks and their dependencies (including AutoPkg's libraries, if
+installed) loaded in a long-running process, and runs them on behalf of
+macadmin-hook. Each request runs in the caller's working directory and
+environment variables, and requests are handled one at a time. Munki repo indexes are
+kept between requests and reused until the repo changes.
+
+The server listens on a Unix socket in a directory that only the current user
+can access, and exits after a period without requests or if this package is updated."""
+
+import argparse
+import hashlib
+import importlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+from contextlib import redirect_stderr, redirect_stdout, suppress
+from functools import lru_cache
+from importlib.metadata import entry_points
+from typing import Any, BinaryIO
+
+from pre_commit_macadmin_hooks.hook_client import (
+    PACKAGE_DIR,
+    get_socket_path,
+    is_hook_env,
+    is_private_dir,
+)
+
+# Console scripts that are not hooks.
+NOT_HOOKS = ("macadmin-hook", "macadmin-hook-server")
+
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    """Build and return the argument parser."""
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--socket",
+        default=get_socket_path(),
+        help="Path of the socket to listen on (defaults to %(default)s, "
+        "or $PRE_COMMIT_MACADMIN_SOCKET if set).",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=3600,
+        help="Exit after this many seconds without a request (default: %(default)s).",
+    )
+    return parser
+
+
+def get_hooks() -> dict[str, str]:
+    """Return the IDs of the hooks installed with this package, mapped to the
+    name of their module."""
+    hooks = {}
+    for entry_point in entry_points(group="console_scripts"):
+        module_name, _, func = entry_point.value.partition(":")
+        if (
+            module_name.startswith(f"{__package__}.")
+            and func.strip() == "main"
+            and entry_point.name not in NOT_HOOKS
+        ):
+            hooks[entry_point.name] = module_name.strip()
+    return hooks
+
+
+@lru_cache(maxsize=16)
+def _digest_sources(sources: tuple[tuple[str, int, int], ...], package_dir: str) -> str:
+    """Hash the contents of the given source files."""
+    digest = hashlib.sha256()
+    for name, _, _ in sources:
+        with open(os.path.join(package_dir, name), "rb") as f:
+            digest.update(name.encode("utf-8") + b"\0" + f.read() + b"\0")
+    return digest.hexdigest()
+
+
+def source_digest(package_dir: str) -> str:
+    """Return a hash of the Python sources of an installation of this
+    package. Installs with the same code have the same digest."""
+    try:
+        with os.scandir(package_dir) as entries:
+            sources = tuple(
+                sorted(
+                    (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                    for entry in entries
+                    if entry.name.endswith(".py")
+                )
+            )
+        return _digest_sources(sources, package_dir)
+    except OSError:
+        return ""
+
+
+class _MessageWriter(io.TextIOBase):
+    """Text stream that sends everything written to it to the client, as
+    JSON messages with the given key."""
+
+    def __init__(self, wfile: BinaryIO, key: str) -> None:
+        self.wfile = wfile
+        self.key = key
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            send_message(self.wfile, {self.key: text})
+        return len(text)
+
+
+def send_message(wfile: BinaryIO, message: dict[str, Any]) -> None:
+    """Send one message to the client."""
+    wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+    wfile.flush()
+
+
+class HookServer(socketserver.UnixStreamServer):
+    """Server that runs hooks one request at a time."""
+
+    def __init__(self, path: str, hooks: dict[str, str]) -> None:
+        self.hooks = hooks
+        self.digest = source_digest(PACKAGE_DIR)
+        self.done = False
+        # Only the current user may connect to the socket.
+        umask = os.umask(0o077)
+        try:
+            super().__init__(path, HookRequestHandler)
+        finally:
+            os.umask(umask)
+
+    def handle_timeout(self) -> None:
+        self.done = True
+
+
+class HookRequestHandler(socketserver.StreamRequestHandler):
+    """Runs the hook named in a request, sending its output as it is
+    printed, followed by its exit code."""
+
+    server: HookServer
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            return  # Another server checking whether this one is running
+        request = json.loads(line)
+        hook = request.get("hook")
+        if source_digest(PACKAGE_DIR) != self.server.digest:
+            # Let the client run the updated hook itself, and exit so the
+            # next server that starts uses the new code.
+            send_message(self.wfile, {"error": "server is out of date"})
+            self.server.done = True
+            return
+        if source_digest(request.get("package", "")) != self.server.digest:
+            # The client belongs to an install of a different version.
+            send_message(self.wfile, {"error": "server runs different code"})
+            return
+        if hook not in self.server.hooks:
+            send_message(self.wfile, {"error": f"unknown hook: {hook}"})
+            return
+        retval = self.run_hook(hook, request["argv"], request["cwd"], request["env"])
+        send_message(self.wfile, {"exit": retval})
+
+    def run_hook(
+        self, hook: str, argv: list[str], cwd: str, env: dict[str, str]
+    ) -> int:
+        """Run a hook's main() as though it were started from cwd, with the
+        environment variables the client sent. Returns the exit code."""
+        module = importlib.import_module(self.server.hooks[hook])
+        saved_cwd, saved_env, saved_argv = os.getcwd(), dict(os.environ), sys.argv
+        stdout = _MessageWriter(self.wfile, "out")
+        stderr = _MessageWriter(self.wfile, "err")
+        try:
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(
+                {
+                    name: value
+                    for name, value in saved_env.items()
+                    if not is_hook_env(name)
+                }
+            )
+            os.environ.update(
+                {name: value for name, value in env.items() if is_hook_env(name)}
+            )
+            sys.argv = [hook, *argv]
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                try:
+                    return module.main(argv)
+                except SystemExit as err:
+                    if err.code is None or isinstance(err.code, int):
+                        return err.code or 0
+                    print(err.code, file=sys.stderr)
+                    return 1
+                except Exception:
+                    traceback.print_exc()
+                    return 1
+        finally:
+            os.chdir(saved_cwd)
+            os.environ.clear()
+            os.environ.update(saved_env)
+            sys.argv = saved_argv
+
+
+def preload_dependencies() -> None:
+    """Load the dependencies that hooks import on first use (AutoPkg's
+    libraries, ruamel.yaml and packaging), so that the first request doesn't
+    wait for them. Missing dependencies are skipped, as the hooks skip them."""
+    from pre_commit_macadmin_hooks.check_autopkg_recipes import load_autopkglib
+    from pre_commit_macadmin_hooks.util import load_yaml
+
+    load_autopkglib()
+    with suppress(ImportError):
+        load_yaml("")
+    with suppress(ImportError):
+        import packaging.version  # noqa: F401
+
+
+def _server_running(path: str) -> bool:
+    """Return True if another server is listening on the socket at path."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Main process."""
+
+    # Parse command line arguments.
+    argparser = build_argument_parser()
+    args = argparser.parse_args(argv)
+
+    # The socket goes in a directory that no other user can access, so that
+    # clients can trust that whatever is listening on it is this server.
+    socket_dir = os.path.dirname(os.path.abspath(args.socket))
+    with suppress(OSError):
+        os.makedirs(socket_dir, 0o700, exist_ok=True)
+    if not is_private_dir(socket_dir):
+        argparser.error(f"{socket_dir} must be a directory that only you can access")
+
+    if os.path.exists(args.socket):
+        if _server_running(args.socket):
+            argparser.error(f"a server is already listening on {args.socket}")
+        os.unlink(args.socket)
+
+    # Import every hook and its dependencies up front; this is the startup
+    # cost the server saves.
+    hooks = get_hooks()
+    for module_name in hooks.values():
+        importlib.import_module(module_name)
+    preload_dependencies()
+
+    # Exit cleanly, removing the socket, when asked to stop.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    server = HookServer(args.socket, hooks)
+    server.timeout = args.idle_timeout
+    print(f"Listening on {args.socket} with {len(hooks)} hooks loaded.")
+    sys.stdout.flush()
+    try:
+        with server:
+            while not server.done:
+                server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        with suppress(FileNotFoundError):
+            os.unlink(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
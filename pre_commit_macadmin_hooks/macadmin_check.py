@@ -0,0 +1,171 @@
+#!/usr/bin/python
+"""This hook runs several of the other hooks in a single process, parsing each
+file only once and checking it with every hook whose file pattern matches."""
+
+import argparse
+import importlib
+import re
+import shlex
+from collections.abc import Callable
+from functools import partial
+from typing import Any
+
+from pre_commit_macadmin_hooks.util import (
+    add_performance_arguments,
+    run_checks,
+    share_parsed_documents,
+)
+
+# Hooks that can be combined, mapped to their module and to the same file
+# pattern used in .pre-commit-hooks.yaml. Formatters such as format-xml-plist
+# aren't included: they rewrite files, which would leave the documents shared
+# with the other hooks out of date, and pre-commit needs them to run on their
+# own to report the files they changed.
+HOOKS = {
+    "check-autopkg-recipes": (
+        "check_autopkg_recipes",
+        r"\.recipe(\.plist|\.yaml|\.json)?$",
+    ),
+    "check-munki-manifests": ("check_munki_manifests", r"(^|/)manifests/"),
+    "check-munki-pkgsinfo": ("check_munki_pkgsinfo", r"pkgsinfo/"),
+    "check-plists": ("check_plists", r"\.(plist|recipe|mobileconfig|pkginfo)$"),
+    "check-preference-manifests": ("check_preference_manifests", r"\.plist$"),
+    "forbid-autopkg-overrides": (
+        "forbid_autopkg_overrides",
+        r"\.recipe(\.plist|\.yaml|\.json)?$",
+    ),
+    "forbid-autopkg-trust-info": (
+        "forbid_autopkg_trust_info",
+        r"\.recipe(\.plist|\.yaml|\.json)?$",
+    ),
+}
+
+
+def build_argument_parser() -> argparse.ArgumentParser:
+    """Build and return the argument parser."""
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--hooks",
+        nargs="+",
+        required=True,
+        choices=list(HOOKS),
+        metavar="HOOK",
+        help=f"IDs of the hooks to run. Supported: {', '.join(HOOKS)}.",
+    )
+    parser.add_argument(
+        "--hook-args",
+        action="append",
+        default=[],
+        metavar="HOOK=ARGS",
+        help=(
+            "Arguments for one of the hooks, in the same form as the `args` of "
+            "that hook in .pre-commit-config.yaml. May be given more than once."
+        ),
+    )
+    parser.add_argument("filenames", nargs="*", help="Filenames to check.")
+    add_performance_arguments(parser)
+    return parser
+
+
+def parse_hook_args(
+    argparser: argparse.ArgumentParser, args: argparse.Namespace
+) -> dict[str, argparse.Namespace]:
+    """Parse the arguments for each selected hook with that hook's own parser,
+    and assign each hook the files matching its pattern. The performance
+    arguments given to macadmin-check apply to each hook, unless its own
+    arguments override them."""
+
+    hook_argv = {hook_id: [] for hook_id in args.hooks}
+    for item in args.hook_args:
+        hook_id, sep, text = item.partition("=")
+        if not sep or hook_id not in hook_argv:
+            argparser.error(
+                f"--hook-args {item!r} should be HOOK=ARGS, where HOOK is one "
+                "of the hooks given with --hooks"
+            )
+        hook_argv[hook_id].extend(shlex.split(text))
+
+    hook_args = {}
+    for hook_id, argv in hook_argv.items():
+        module_name, pattern = HOOKS[hook_id]
+        module = importlib.import_module(f"pre_commit_macadmin_hooks.{module_name}")
+        hook_parser = module.build_argument_parser()
+        hook_parser.prog = hook_id
+        hook_parser.set_defaults(
+            jobs=args.jobs,
+            no_cache=args.no_cache,
+            profile=args.profile,
+            profile_top=args.profile_top,
+        )
+        hook_args[hook_id] = hook_parser.parse_args(argv)
+        hook_args[hook_id].filenames = [
+            f for f in args.filenames if re.search(pattern, f)
+        ]
+    return hook_args
+
+
+def check_file(
+    filename: str, checkers: list[tuple[str, str, Callable[[str], Any]]]
+) -> dict[str, Any]:
+    """Check a single file with each hook whose pattern matches it. Returns
+    the result of each of those hooks, keyed by hook ID."""
+
+    results = {}
+    with share_parsed_documents():
+        for hook_id, pattern, checker in checkers:
+            if re.search(pattern, filename):
+                results[hook_id] = checker(filename)
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Main process."""
+
+    # Parse command line arguments.
+    argparser = build_argument_parser()
+    args = argparser.parse_args(argv)
+    hook_args = parse_hook_args(argparser, args)
+
+    checkers = []
+    salts = []
+    dependencies = {}
+    summarizers = []
+    for hook_id, hook_ns in hook_args.items():
+        module_name, pattern = HOOKS[hook_id]
+        module = importlib.import_module(f"pre_commit_macadmin_hooks.{module_name}")
+        checkers.append((hook_id, pattern, module.get_file_checker(hook_ns)))
+        if hasattr(module, "cache_salt"):
+            salts.append(f"{hook_id}={module.cache_salt(hook_ns)}")
+        if hasattr(module, "cache_dependencies"):
+            dependencies.update(module.cache_dependencies(hook_ns))
+        summarizers.append((hook_id, getattr(module, "summarize_results", None)))
+
+    filenames = [
+        f for f in args.filenames if any(re.search(p, f) for _, p, _ in checkers)
+    ]
+    results = run_checks(
+        "macadmin-check",
+        args,
+        partial(check_file, checkers=checkers),
+        filenames=filenames,
+        salt="\0".join(salts),
+        dependencies=dependencies,
+    )
+
+    # Hand each hook its own results, in the order of its files.
+    retval = 0
+    for hook_id, summarize in summarizers:
+        hook_results = [r[hook_id] for r in results if hook_id in r]
+        if summarize:
+            hook_retval = summarize(hook_args[hook_id], hook_results)
+        else:
+            hook_retval = 1 if any(hook_results) else 0
+        retval = retval or hook_retval
+    return retval
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,10 +1,57 @@
 #!/usr/bin/python
-"""This hook runs the "makecatalogs" command to ensure all referenced packages
-are present and catalogs are up to date."""
+"""This hook builds the catalogs of a Munki repo from its pkginfo files, to
+ensure all referenced packages are present and catalogs are up to date. By
+default catalogs are built in-process, with the same contents as Munki's
+"makecatalogs" command; use --use-munki-makecatalogs to run that instead.
+With --verify, existing catalogs are checked against the pkginfo files
+without being rewritten."""
 
 import argparse
+import hashlib
 import os
+import pickle
+import plistlib
 import subprocess
+from collections import Counter
+from typing import Any
+from xml.parsers.expat import ExpatError
+
+from pre_commit_macadmin_hooks.munki_repo import (
+    RepoIndex,
+    list_repo_items,
+    load_repo_index,
+)
+from pre_commit_macadmin_hooks.util import add_jobs_argument, check_files, get_cache_dir
+
+# Path to Munki's makecatalogs.
+MAKECATALOGS = "/usr/local/munki/makecatalogs"
+
+# Installer types that have no installer item.
+NO_INSTALLER_ITEM_TYPES = ("nopkg", "apple_update_metadata")
+
+# Pkginfo keys used to check for installer items, which are kept with each
+# catalog entry.
+INSTALLER_ITEM_KEYS = (
+    "installer_type",
+    "PackageCompleteURL",
+    "PackageURL",
+    "installer_item_location",
+    "uninstall_method",
+    "uninstaller_item_location",
+)
+
+# Name of the file in the icons folder listing a hash of each icon.
+ICON_HASHES = "_icon_hashes.plist"
+
+# Version of the format of the catalog cache. Caches in other formats are
+# ignored. The cache is pickled, since it's several times faster to load and
+# save than a binary plist at the size of a large repo; it's only read from
+# the user's own cache folder.
+CACHE_VERSION = 2
+
+# The XML plistlib writes for a list, before and after its items. Catalog
+# entries are kept serialized, so that a catalog is built by joining them.
+_ARRAY_START, _, _ARRAY_END = plistlib.dumps([""]).partition(b"\t<string></string>\n")
 
 
 def build_argument_parser() -> argparse.ArgumentParser:
@@ -16,16 +63,495 @@ def build_argument_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--munki-repo", default=".", help="Path to local Munki repo. (Defaults to '.')"
     )
-    # TODO: Support makecatalogs options, ideally with kwargs for flexibility.
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Add pkginfo files to catalogs even if their installer or "
+        "uninstaller items are missing.",
+    )
+    parser.add_argument(
+        "--skip-pkg-check",
+        action="store_true",
+        help="Don't check that installer and uninstaller items exist.",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--use-munki-makecatalogs",
+        action="store_true",
+        help=f"Run Munki's {MAKECATALOGS} instead of building catalogs in-process.",
+    )
+    mode.add_argument(
+        "--verify",
+        action="store_true",
+        help="Don't write catalogs; instead report catalogs that don't match the "
+        "pkginfo files, and their stale, missing or extra items.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Read every pkginfo and write every catalog, instead of only those "
+        "changed since the last run.",
+    )
+    add_jobs_argument(parser)
     return parser
 
 
+def _stat(path: str) -> list[int]:
+    """Return the modification time and size of a file, or an empty list if
+    it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return []
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _hash_file(path: str) -> str:
+    """Return the SHA-256 hash of a file, or an empty string if it can't be
+    read."""
+    try:
+        with open(path, "rb") as openfile:
+            return hashlib.sha256(openfile.read()).hexdigest()
+    except OSError:
+        return ""
+
+
+def read_catalog_entry(path: str) -> dict[str, Any]:
+    """Read a pkginfo file and return its catalog entry: the pkginfo as
+    serialized in catalogs, its catalog names, and the keys needed to check
+    its installer items. If the pkginfo can't be used, the entry has only an
+    error."""
+    try:
+        with open(path, "rb") as openfile:
+            pkginfo = plistlib.load(openfile)
+    except (ExpatError, ValueError) as err:
+        return {"error": f"could not be read: {err}. Skipping."}
+    except OSError as err:
+        return {"error": f"could not be opened: {err}. Skipping."}
+    if not isinstance(pkginfo, dict) or "name" not in pkginfo:
+        return {"error": "is missing name"}
+
+    # Don't copy admin notes, or keys starting with "_" (e.g. _metadata), to
+    # catalogs.
+    if pkginfo.get("notes"):
+        del pkginfo["notes"]
+    for key in [k for k in pkginfo if k.startswith("_")]:
+        del pkginfo[key]
+
+    return {
+        "catalogs": pkginfo.get("catalogs", []),
+        "installer_items": {k: pkginfo[k] for k in INSTALLER_ITEM_KEYS if k in pkginfo},
+        "xml": _serialize_item(pkginfo),
+    }
+
+
+def _serialize_item(item: Any) -> bytes:
+    """Return an item as serialized in a catalog."""
+    return plistlib.dumps([item])[len(_ARRAY_START) : -len(_ARRAY_END)]
+
+
+def catalog_data(entries: list[dict[str, Any]]) -> bytes:
+    """Return the contents of a catalog file listing the given entries."""
+    if not entries:
+        return plistlib.dumps([])
+    return b"".join([_ARRAY_START, *(entry["xml"] for entry in entries), _ARRAY_END])
+
+
+def split_catalog(data: bytes) -> list[bytes]:
+    """Return the serialized items of a catalog file. A catalog written by
+    this hook is split at its top-level dicts without being parsed. Others
+    (e.g. written by Munki on macOS, with different formatting) are parsed
+    and each item serialized again. Raises ValueError if the catalog can't be
+    read."""
+    if data.startswith(_ARRAY_START) and data.endswith(_ARRAY_END):
+        body = data[len(_ARRAY_START) : len(data) - len(_ARRAY_END)]
+        # Text can't contain an unescaped "<", so a line that is exactly
+        # "\t</dict>" can only close a top-level item.
+        pieces = body.split(b"\n\t</dict>\n")
+        if not pieces[-1] and all(p.startswith(b"\t<dict>\n") for p in pieces[:-1]):
+            return [piece + b"\n\t</dict>\n" for piece in pieces[:-1]]
+    try:
+        catalog = plistlib.loads(data)
+    except ExpatError as err:
+        raise ValueError(err) from err
+    if not isinstance(catalog, list):
+        raise ValueError("not an array")
+    return [_serialize_item(item) for item in catalog]
+
+
+def _describe_item(xml: bytes) -> tuple[Any, Any]:
+    """Return the name and version of a serialized catalog item, or Nones if
+    it can't be read."""
+    try:
+        item = plistlib.loads(_ARRAY_START + xml + _ARRAY_END)[0]
+    except (ExpatError, ValueError, IndexError):
+        return None, None
+    if not isinstance(item, dict):
+        return None, None
+    return item.get("name"), item.get("version")
+
+
+def verify_catalog(
+    catalog_name: str, data: bytes, expected: list[tuple[str, bytes]]
+) -> list[str]:
+    """Compare the contents of a catalog file with the serialized entries of
+    the pkginfos it should list, in order. Returns a finding for each stale,
+    missing or extra item, or if the items are out of order. Only items that
+    don't match exactly are parsed."""
+    prefix = f"catalogs/{catalog_name}:"
+    try:
+        items = split_catalog(data)
+    except ValueError as err:
+        return [f"{prefix} could not be read: {err}"]
+
+    unmatched = Counter(items)
+    missing = []
+    for pkginfo_ref, xml in expected:
+        if unmatched[xml]:
+            unmatched[xml] -= 1
+        else:
+            missing.append((pkginfo_ref, xml))
+    extra = []
+    for xml in items:
+        if unmatched[xml]:
+            unmatched[xml] -= 1
+            extra.append(_describe_item(xml))
+    if not missing and not extra:
+        if items != [xml for _, xml in expected]:
+            return [f"{prefix} items are out of order"]
+        return []
+
+    # An item with the same name and version as a missing one is stale.
+    findings = []
+    for pkginfo_ref, xml in missing:
+        name_version = _describe_item(xml)
+        if name_version in extra:
+            extra.remove(name_version)
+            findings.append(f"{prefix} stale entry for pkgsinfo/{pkginfo_ref}")
+        else:
+            findings.append(f"{prefix} missing pkgsinfo/{pkginfo_ref}")
+    for name, version in extra:
+        if name is None:
+            findings.append(f"{prefix} extra item that could not be read")
+        else:
+            findings.append(
+                f"{prefix} extra item {name}-{version} isn't in any pkginfo"
+            )
+    return findings
+
+
+def verify_pkginfo(
+    pkginfo_ref: str, pkginfo: dict[str, Any], repo_index: RepoIndex
+) -> tuple[list[str], bool]:
+    """Check that the installer and uninstaller items referenced by a pkginfo
+    exist, as Munki's makecatalogs does. Returns a list of warnings, and
+    whether the pkginfo should be included in the catalogs. Items found
+    only with different case are included, with a warning."""
+    if pkginfo.get("installer_type") in NO_INSTALLER_ITEM_TYPES:
+        return [], True
+    if pkginfo.get("PackageCompleteURL") or pkginfo.get("PackageURL"):
+        return [], True
+
+    installer_item = pkginfo.get("installer_item_location")
+    if not installer_item:
+        return [
+            f"WARNING: file {pkginfo_ref} is missing installer_item_location"
+        ], False
+    uninstaller_item = pkginfo.get("uninstaller_item_location")
+    if (
+        pkginfo.get("uninstall_method") == "AdobeCCPUninstaller"
+        and not uninstaller_item
+    ):
+        return [
+            f"WARNING: file {pkginfo_ref} is missing uninstaller_item_location"
+        ], False
+
+    warnings = []
+    for i_type, location in (
+        ("installer", installer_item),
+        ("uninstaller", uninstaller_item),
+    ):
+        if i_type == "uninstaller" and not location:
+            continue
+        if isinstance(location, str) and repo_index.has_pkgs_item(location):
+            continue
+        match = (
+            repo_index.match_pkgs_item(location) if isinstance(location, str) else ""
+        )
+        if not match:
+            warnings.append(
+                f"WARNING: Info file {pkginfo_ref} refers to missing {i_type} "
+                f"item: {location}"
+            )
+            return warnings, False
+        if match != location:
+            warnings.append(
+                f"WARNING: {pkginfo_ref} refers to {i_type} item: {location}. "
+                "The pathname of the item in the repo has different case: "
+                f"pkgs/{match}. This may cause issues depending on the "
+                "case-sensitivity of the underlying filesystem."
+            )
+    return warnings, True
+
+
+def load_catalog_cache(path: str) -> dict[str, Any]:
+    """Return the cached fingerprints and entries of a repo's pkginfos, and
+    the contents of the catalogs written from them, or an empty cache."""
+    try:
+        with open(path, "rb") as openfile:
+            cache = pickle.load(openfile)
+    except Exception:
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache
+
+
+def save_catalog_cache(path: str, cache: dict[str, Any]) -> None:
+    """Write the catalog cache, replacing any previous cache atomically."""
+    cache = {"version": CACHE_VERSION, **cache}
+    try:
+        with open(f"{path}.{os.getpid()}", "wb") as openfile:
+            pickle.dump(cache, openfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.{os.getpid()}", path)
+    except OSError:
+        pass
+
+
+def get_catalog_cache_path(repo: str) -> str:
+    """Return the path of the catalog cache for a repo."""
+    repo_id = hashlib.sha256(os.path.abspath(repo).encode("utf-8")).hexdigest()
+    return os.path.join(get_cache_dir(), f"catalogs-{repo_id[:16]}.pickle")
+
+
+def read_pkgsinfo(
+    repo: str, args: argparse.Namespace, cached: dict[str, dict[str, Any]]
+) -> tuple[dict[str, dict[str, Any]], set[str]]:
+    """Return a record of each pkginfo in the repo, keyed by its path within
+    the pkgsinfo folder, and the set of pkginfos whose content is new or
+    changed. Each record holds the pkginfo's fingerprint (modification time,
+    size and hash) and catalog entry. Only pkginfos whose fingerprint differs
+    from the cached one are parsed, in parallel."""
+    records, changed = {}, set()
+    for pkginfo_ref in list_repo_items(repo, "pkgsinfo"):
+        path = os.path.join(repo, "pkgsinfo", pkginfo_ref)
+        stat = _stat(path)
+        record = cached.get(pkginfo_ref)
+        if record and record["stat"] == stat:
+            records[pkginfo_ref] = record
+            continue
+        sha256 = _hash_file(path)
+        if record and sha256 and record["sha256"] == sha256:
+            # Touched (e.g. by a checkout), but the same content.
+            records[pkginfo_ref] = {**record, "stat": stat}
+            continue
+        records[pkginfo_ref] = {"stat": stat, "sha256": sha256}
+        changed.add(pkginfo_ref)
+
+    pending = sorted(changed)
+    entries = check_files(
+        read_catalog_entry,
+        [os.path.join(repo, "pkgsinfo", ref) for ref in pending],
+        jobs=args.jobs,
+    )
+    for pkginfo_ref, entry in zip(pending, entries):
+        records[pkginfo_ref]["entry"] = entry
+    return records, changed
+
+
+def assemble_catalogs(
+    records: dict[str, dict[str, Any]],
+    repo_index: RepoIndex,
+    args: argparse.Namespace,
+) -> tuple[dict[str, list[str]], list[str]]:
+    """Assemble pkginfos into catalogs. Returns the paths of the pkginfos in
+    each catalog, keyed by catalog name, and a list of warnings."""
+    errors = []
+    catalogs: dict[str, list[str]] = {"all": []}
+
+    for pkginfo_ref, record in records.items():
+        entry = record["entry"]
+        if "error" in entry:
+            errors.append(f"WARNING: file {pkginfo_ref} {entry['error']}")
+            continue
+
+        if not args.skip_pkg_check:
+            warnings, ok = verify_pkginfo(
+                pkginfo_ref, entry["installer_items"], repo_index
+            )
+            errors.extend(warnings)
+            if not ok and not args.force:
+                # Skip this pkginfo unless running with --force.
+                continue
+
+        catalogs["all"].append(pkginfo_ref)
+        for catalog_name in entry["catalogs"]:
+            if not catalog_name or not isinstance(catalog_name, str):
+                errors.append(
+                    f"WARNING: Info file {pkginfo_ref} has an invalid catalog "
+                    f"name: {catalog_name!r}"
+                )
+                continue
+            catalogs.setdefault(catalog_name, []).append(pkginfo_ref)
+
+    # Look for catalog names that differ only in case.
+    folded: dict[str, list[str]] = {}
+    for catalog_name in catalogs:
+        folded.setdefault(catalog_name.lower(), []).append(catalog_name)
+    duplicates = sorted(n for names in folded.values() if len(names) > 1 for n in names)
+    if duplicates:
+        errors.append(
+            "WARNING: There are catalogs with names that differ only by case. "
+            f"This may cause issues with some clients: {', '.join(duplicates)}"
+        )
+
+    return catalogs, errors
+
+
+def hash_icons(
+    repo: str, cached: dict[str, dict[str, Any]]
+) -> tuple[dict[str, dict[str, Any]], list[str]]:
+    """Return a record of the SHA-256 hash and fingerprint of each icon, keyed
+    by its path within the icons folder, and a list of errors. Icons whose
+    modification time and size match the cached record aren't read again."""
+    records, errors = {}, []
+    for icon_ref in list_repo_items(repo, "icons"):
+        if icon_ref == ICON_HASHES:
+            continue
+        path = os.path.join(repo, "icons", icon_ref)
+        stat = _stat(path)
+        record = cached.get(icon_ref)
+        if record and record["stat"] == stat:
+            records[icon_ref] = record
+            continue
+        try:
+            with open(path, "rb") as openfile:
+                sha256 = hashlib.sha256(openfile.read()).hexdigest()
+        except OSError as err:
+            errors.append(f"Error reading icons/{icon_ref}: {err}")
+            continue
+        records[icon_ref] = {"stat": stat, "sha256": sha256}
+    return records, errors
+
+
+def write_if_changed(path: str, data: bytes) -> None:
+    """Write data to path, unless it already contains exactly that, so that
+    unchanged catalogs keep their modification times."""
+    try:
+        with open(path, "rb") as openfile:
+            if openfile.read() == data:
+                return
+    except OSError:
+        pass
+    with open(path, "wb") as openfile:
+        openfile.write(data)
+
+
+def make_catalogs(repo: str, args: argparse.Namespace) -> list[str]:
+    """Build and write the repo's catalogs, remove catalogs that no longer
+    have any items, and write the icon hashes. Returns a list of warnings.
+    If args.verify is set, nothing is written; instead the existing catalogs
+    and icon hashes are compared with what would be written, and each
+    difference is returned.
+
+    Unless args.no_cache is set, the catalog entry of each pkginfo is cached
+    between runs, so only new or changed pkginfos are parsed, and only the
+    catalogs that list them (or that have gained or lost items, or been
+    changed on disk) are written or verified.
+    """
+    cache_path = "" if args.no_cache else get_catalog_cache_path(repo)
+    cache = load_catalog_cache(cache_path) if cache_path else {}
+
+    records, changed = read_pkgsinfo(repo, args, cache.get("pkgsinfo", {}))
+    repo_index = load_repo_index(repo, refresh=True)
+    catalogs, errors = assemble_catalogs(records, repo_index, args)
+
+    catalogs_dir = os.path.join(repo, "catalogs")
+    if not args.verify:
+        os.makedirs(catalogs_dir, exist_ok=True)
+    findings = []
+    for catalog_ref in list_repo_items(repo, "catalogs"):
+        if catalog_ref not in catalogs:
+            if args.verify:
+                findings.append(
+                    f"catalogs/{catalog_ref}: no pkginfo lists this catalog"
+                )
+                continue
+            try:
+                os.remove(os.path.join(catalogs_dir, catalog_ref))
+            except OSError as err:
+                errors.append(f"Could not delete catalog {catalog_ref}: {err}")
+
+    cached_catalogs = cache.get("catalogs", {})
+    written = {}
+    for catalog_name, pkginfo_refs in catalogs.items():
+        path = os.path.join(catalogs_dir, catalog_name)
+        previous = cached_catalogs.get(catalog_name)
+        if (
+            previous
+            and previous["pkgsinfo"] == pkginfo_refs
+            and previous["stat"] == _stat(path)
+            and changed.isdisjoint(pkginfo_refs)
+        ):
+            written[catalog_name] = previous
+            continue
+        if args.verify:
+            try:
+                with open(path, "rb") as openfile:
+                    data = openfile.read()
+            except OSError:
+                findings.append(f"catalogs/{catalog_name}: catalog is missing")
+                continue
+            expected = [(ref, records[ref]["entry"]["xml"]) for ref in pkginfo_refs]
+            catalog_findings = verify_catalog(catalog_name, data, expected)
+            if catalog_findings:
+                findings.extend(catalog_findings)
+                continue
+            written[catalog_name] = {"stat": _stat(path), "pkgsinfo": pkginfo_refs}
+            continue
+        try:
+            write_if_changed(
+                path, catalog_data([records[ref]["entry"] for ref in pkginfo_refs])
+            )
+        except OSError as err:
+            errors.append(f"Failed to create catalog {catalog_name}: {err}")
+            continue
+        written[catalog_name] = {"stat": _stat(path), "pkgsinfo": pkginfo_refs}
+
+    icons, icon_errors = hash_icons(repo, cache.get("icons", {}))
+    errors.extend(icon_errors)
+    if icons:
+        icon_hashes = {icon_ref: record["sha256"] for icon_ref, record in icons.items()}
+        if args.verify:
+            try:
+                with open(os.path.join(repo, "icons", ICON_HASHES), "rb") as openfile:
+                    current = plistlib.load(openfile)
+            except (OSError, ExpatError, ValueError):
+                current = None
+            if current != icon_hashes:
+                findings.append(f"icons/{ICON_HASHES}: icon hashes are out of date")
+        else:
+            try:
+                write_if_changed(
+                    os.path.join(repo, "icons", ICON_HASHES),
+                    plistlib.dumps(icon_hashes),
+                )
+            except OSError as err:
+                errors.append(f"Failed to create icons/{ICON_HASHES}: {err}")
+
+    new_cache = {"pkgsinfo": records, "catalogs": written, "icons": icons}
+    if cache_path and any(cache.get(key) != new_cache[key] for key in new_cache):
+        save_catalog_cache(cache_path, new_cache)
+
+    if findings:
+        errors.extend(findings)
+        errors.append("Catalogs are out of date. Run makecatalogs to rebuild them.")
+    return errors
+
+
 def main(argv: list[str] | None = None) -> int:
     """Main process."""
 
-    # Path to makecatalogs.
-    makecatalogs = "/usr/local/munki/makecatalogs"
-
     # Parse command line arguments.
     argparser = build_argument_parser()
     args = argparser.parse_args(argv)
@@ -34,11 +560,21 @@ def main(argv: list[str] | None = None) -> int:
     if not os.path.isdir(os.path.join(args.munki_repo, "pkgsinfo")):
         print("Could not find pkgsinfo folder.")
         retval = 1
-    elif not os.path.isfile(makecatalogs):
-        print(f"{makecatalogs} does not exist.")
-        retval = 1
+    elif args.use_munki_makecatalogs:
+        if not os.path.isfile(MAKECATALOGS):
+            print(f"{MAKECATALOGS} does not exist.")
+            retval = 1
+        else:
+            command = [MAKECATALOGS, args.munki_repo]
+            if args.force:
+                command.append("--force")
+            if args.skip_pkg_check:
+                command.append("--skip-pkg-check")
+            retval = subprocess.call(command)
     else:
-        retval = subprocess.call([makecatalogs, args.munki_repo])
+        for error in make_catalogs(args.munki_repo, args):
+            print(error)
+            retval = 1
 
     return retval
 
@@ -0,0 +1,361 @@
+#!/usr/bin/python
+"""Parser for the subset of NSPredicate syntax used by Munki's
+installable_condition and conditional_items conditions, so that typos are
+caught before clients evaluate them."""
+
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+# Attributes Munki provides to every condition (see predicate_info_object in
+# munkilib/info.py). Admin-provided conditions (from /usr/local/munki/conditions)
+# add others.
+MUNKI_CONDITIONS = (
+    "applications",
+    "arch",
+    "board_id",
+    "catalogs",
+    "date",
+    "device_id",
+    "hostname",
+    "ibridge_model_name",
+    "ipv4_address",
+    "machine_model",
+    "machine_type",
+    "munki_version",
+    "os_build_last_component",
+    "os_build_number",
+    "os_vers",
+    "os_vers_major",
+    "os_vers_minor",
+    "os_vers_patch",
+    "physical_or_virtual",
+    "product_name",
+    "serial_number",
+    "x86_64_capable",
+)
+
+# Operators that compare two expressions, given as symbols.
+COMPARISON_SYMBOLS = ("==", "=", "!=", "<>", "<=", "=<", ">=", "=>", "<", ">")
+
+# Operators that compare two expressions, given as words.
+COMPARISON_WORDS = (
+    "BEGINSWITH",
+    "BETWEEN",
+    "CONTAINS",
+    "ENDSWITH",
+    "IN",
+    "LIKE",
+    "MATCHES",
+)
+
+# Words that can't be used as attribute names unless escaped with "#".
+RESERVED_WORDS = frozenset(
+    (
+        *COMPARISON_WORDS,
+        "ALL",
+        "AND",
+        "ANY",
+        "FALSE",
+        "FALSEPREDICATE",
+        "FIRST",
+        "LAST",
+        "NIL",
+        "NO",
+        "NONE",
+        "NOT",
+        "NULL",
+        "OR",
+        "SELF",
+        "SIZE",
+        "SOME",
+        "SUBQUERY",
+        "TRUE",
+        "TRUEPREDICATE",
+        "YES",
+    )
+)
+
+# Literal values given as words.
+LITERAL_WORDS = ("FALSE", "NIL", "NO", "NULL", "TRUE", "YES")
+
+# Number of parsed conditions cached. Bounded, since the hook server keeps the
+# cache for as long as it runs.
+PREDICATE_CACHE_SIZE = 4096
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    | (?P<number>0[xX][0-9a-fA-F]+|\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|\.\d+)
+    | (?P<variable>\$[A-Za-z_]\w*)
+    | (?P<name>\#?@?[A-Za-z_]\w*)
+    | (?P<symbol>==|!=|<>|<=|=<|>=|=>|&&|\|\||\*\*|[=<>!()\[\]{},.+\-*/])
+    """,
+    re.VERBOSE,
+)
+
+
+class PredicateError(ValueError):
+    """A condition that isn't valid predicate syntax."""
+
+
+class Predicate(NamedTuple):
+    """The result of parsing a condition: the attributes it refers to, and a
+    description of its syntax error, if it has one."""
+
+    attributes: frozenset[str]
+    error: str | None
+
+
+def _tokenize(text: str) -> list[tuple[str, str, int]]:
+    """Split a condition into (kind, value, position) tokens, ending with an
+    "end" token."""
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_PATTERN.match(text, pos)
+        if match is None:
+            if text[pos] in "\"'":
+                raise PredicateError(f"unterminated string at position {pos}")
+            raise PredicateError(
+                f"unexpected character {text[pos]!r} at position {pos}"
+            )
+        if match.lastgroup != "space":
+            tokens.append((match.lastgroup, match.group(), pos))
+        pos = match.end()
+    tokens.append(("end", "", pos))
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser for a single condition. Records the first
+    component of each key path, which is the attribute it refers to."""
+
+    def __init__(self, text: str) -> None:
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.attributes: set[str] = set()
+
+    def parse(self) -> None:
+        """Parse the whole condition."""
+        if self._peek()[0] == "end":
+            raise PredicateError("condition is empty")
+        self._or()
+        kind, value, pos = self._peek()
+        if kind != "end":
+            raise PredicateError(f"unexpected {value!r} at position {pos}")
+
+    def _peek(self) -> tuple[str, str, int]:
+        return self.tokens[self.pos]
+
+    def _word(self) -> str:
+        """Return the next token as an upper case keyword, or an empty string
+        if it isn't one."""
+        kind, value, _ = self._peek()
+        if kind == "name" and value.upper() in RESERVED_WORDS:
+            return value.upper()
+        return ""
+
+    def _accept(self, *options: str) -> bool:
+        """Consume the next token if it's one of the given symbols or
+        keywords."""
+        kind, value, _ = self._peek()
+        if (kind == "symbol" and value in options) or self._word() in options:
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, symbol: str) -> None:
+        if not self._accept(symbol):
+            _, value, pos = self._peek()
+            found = repr(value) if value else "end of condition"
+            raise PredicateError(
+                f"expected {symbol!r} but found {found} at position {pos}"
+            )
+
+    def _or(self) -> None:
+        self._and()
+        while self._accept("OR", "||"):
+            self._and()
+
+    def _and(self) -> None:
+        self._not()
+        while self._accept("AND", "&&"):
+            self._not()
+
+    def _not(self) -> None:
+        if self._accept("NOT", "!"):
+            self._not()
+        else:
+            self._primary()
+
+    def _primary(self) -> None:
+        if self._accept("TRUEPREDICATE", "FALSEPREDICATE"):
+            return
+        if self._peek()[1] == "(":
+            # Either a parenthesized predicate, or a comparison starting with a
+            # parenthesized expression, like "(a + b) > 3".
+            # If neither parses, the error from parsing it as a predicate is
+            # the more helpful one.
+            start = self.pos
+            try:
+                self.pos += 1
+                self._or()
+                self._expect(")")
+                return
+            except PredicateError as err:
+                self.pos = start
+                try:
+                    self._comparison()
+                except PredicateError:
+                    raise err from None
+                return
+        self._comparison()
+
+    def _comparison(self) -> None:
+        self._accept("ANY", "ALL", "NONE", "SOME")
+        self._expression()
+        kind, value, pos = self._peek()
+        if not (
+            (kind == "symbol" and value in COMPARISON_SYMBOLS)
+            or self._word() in COMPARISON_WORDS
+        ):
+            found = repr(value) if value else "end of condition"
+            raise PredicateError(
+                f"expected a comparison operator but found {found} at position {pos}"
+            )
+        self.pos += 1
+        if self._peek()[1] == "[":
+            # Options such as [c] (case insensitive) or [cd].
+            self.pos += 1
+            kind, value, pos = self._peek()
+            if kind != "name" or not set(value.lower()) <= set("cdnl"):
+                raise PredicateError(
+                    f"unknown comparison option {value!r} at position {pos}"
+                )
+            self.pos += 1
+            self._expect("]")
+        self._expression()
+
+    def _expression(self) -> None:
+        self._term()
+        while self._accept("+", "-"):
+            self._term()
+
+    def _term(self) -> None:
+        self._factor()
+        while self._accept("*", "/", "**"):
+            self._factor()
+
+    def _factor(self) -> None:
+        if self._accept("-"):
+            self._factor()
+            return
+        self._value()
+        while self._accept("["):
+            if not self._accept("FIRST", "LAST", "SIZE"):
+                self._expression()
+            self._expect("]")
+
+    def _value(self) -> None:
+        kind, value, pos = self.tokens[self.pos]
+        word = self._word()
+        if kind in ("string", "number", "variable") or word in LITERAL_WORDS:
+            self.pos += 1
+        elif value == "(":
+            self.pos += 1
+            self._expression()
+            self._expect(")")
+        elif value == "{":
+            self.pos += 1
+            if not self._accept("}"):
+                self._expression()
+                while self._accept(","):
+                    self._expression()
+                self._expect("}")
+        elif word == "SUBQUERY":
+            self.pos += 1
+            self._expect("(")
+            self._expression()
+            self._expect(",")
+            if self._peek()[0] != "variable":
+                raise PredicateError(
+                    f"expected a variable in SUBQUERY at position {self._peek()[2]}"
+                )
+            self.pos += 1
+            self._expect(",")
+            self._or()
+            self._expect(")")
+            self._key_path()
+        elif word == "SELF":
+            self.pos += 1
+            self._key_path()
+        elif kind == "name" and word:
+            raise PredicateError(f"unexpected {value!r} at position {pos}")
+        elif kind == "name":
+            self.pos += 1
+            if self._accept("("):
+                # A function such as CAST("2024-01-01T00:00:00Z", "NSDate").
+                if not self._accept(")"):
+                    self._expression()
+                    while self._accept(","):
+                        self._expression()
+                    self._expect(")")
+                return
+            self.attributes.add(value.lstrip("#"))
+            self._key_path()
+        else:
+            found = repr(value) if value else "end of condition"
+            raise PredicateError(
+                f"expected a value or attribute but found {found} at position {pos}"
+            )
+
+    def _key_path(self) -> None:
+        """Consume the remaining components of a key path, such as
+        ".@count"."""
+        while self._accept("."):
+            kind, value, pos = self._peek()
+            if kind != "name":
+                raise PredicateError(f"expected a key after '.' at position {pos}")
+            self.pos += 1
+
+
+@lru_cache(maxsize=PREDICATE_CACHE_SIZE)
+def parse_predicate(text: str) -> Predicate:
+    """Parse a condition, returning the attributes it refers to and its syntax
+    error, if any. Cached, since the same conditions are repeated across
+    many pkginfos and manifests."""
+    try:
+        parser = _Parser(text)
+        parser.parse()
+    except PredicateError as err:
+        return Predicate(frozenset(), str(err))
+    return Predicate(frozenset(parser.attributes), None)
+
+
+def validate_condition(
+    condition: str,
+    filename: str,
+    key: str,
+    valid_conditions: list[str] | None = None,
+    fail_on_unknown: bool = False,
+) -> bool:
+    """Verifies that a condition is valid predicate syntax, and warns about
+    attributes it refers to that aren't built into Munki or in
+    valid_conditions, since admins may provide their own conditions. Unknown
+    attributes are an error with fail_on_unknown."""
+    predicate = parse_predicate(condition)
+    if predicate.error:
+        print(f"{filename}: {key} is not a valid predicate: {predicate.error}")
+        return False
+    passed = True
+    known = set(MUNKI_CONDITIONS).union(valid_conditions or ())
+    for attribute in sorted(predicate.attributes - known):
+        msg = f'{key} uses unknown condition "{attribute}"'
+        if fail_on_unknown:
+            print(f"{filename}: {msg}")
+            passed = False
+        else:
+            print(f"{filename}: WARNING: {msg}")
+    return passed
@@ -0,0 +1,615 @@
+#!/usr/bin/python
+"""Shared helpers for reading the contents of a Munki repo."""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+from bisect import bisect_right
+from collections.abc import Iterator
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, NamedTuple
+from xml.parsers.expat import ExpatError
+
+from pre_commit_macadmin_hooks.util import (
+    get_cache_dir,
+    iter_check_files,
+    load_plist,
+    open_result_cache,
+)
+
+# Number of bytes read at a time when hashing installer items, so that large
+# disk images are never read into memory at once.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Git LFS pointer files are smaller than this, so larger files are never read
+# to check whether they are pointers.
+LFS_POINTER_MAX_SIZE = 1024
+
+# Components of a version string, as split by Munki's MunkiLooseVersion.
+VERSION_COMPONENT_PATTERN = re.compile(r"(\d+|[a-z]+|\.)")
+
+# Number of version keys cached. Bounded, since the hook server keeps the
+# cache for as long as it runs; large enough for every version in a big repo.
+VERSION_KEY_CACHE_SIZE = 65536
+
+# Spec versions that identify a Git LFS pointer file.
+LFS_POINTER_VERSIONS = (
+    "https://git-lfs.github.com/spec/v1",
+    "https://hawser.github.com/spec/v1",
+)
+
+
+@lru_cache(maxsize=None)
+def _list_dir(path: str) -> frozenset[str]:
+    """Return the names of the entries in a directory. Cached so that each
+    directory is only read once per run; cleared when a RepoIndex is built."""
+    with os.scandir(path) as entries:
+        return frozenset(entry.name for entry in entries)
+
+
+def list_repo_items(repo: str, kind: str) -> list[str]:
+    """Return the paths of the files in a folder of the repo, relative to that
+    folder. Hidden files and folders are skipped, as Munki does. The paths are
+    sorted so that catalogs list items in the same order on every filesystem."""
+    top = os.path.join(repo, kind)
+    items = []
+    for dirpath, dirnames, filenames in os.walk(top, followlinks=True):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        relpath = os.path.relpath(dirpath, top)
+        for filename in sorted(filenames):
+            if filename.startswith("."):
+                continue
+            if relpath == ".":
+                items.append(filename)
+            else:
+                items.append(f"{relpath}/{filename}".replace(os.sep, "/"))
+    return items
+
+
+def split_name_and_version(item: str) -> tuple[str, str]:
+    """Split a reference to a Munki item, such as "Firefox-120.0" or
+    "Firefox--120.0", into its name and version, the way Munki does. Returns
+    an empty version if the reference doesn't include one."""
+    for delimiter in ("--", "-"):
+        name, sep, version = item.rpartition(delimiter)
+        if sep and version[:1].isdigit():
+            return name, version
+    return item, ""
+
+
+def trim_version(version: str) -> str:
+    """Remove trailing ".0" components from a version, keeping at least two
+    components, as Munki's trim_version_string does when matching versions,
+    so that "1.0.0" matches "1.0"."""
+    parts = version.split(".")
+    while len(parts) > 2 and parts[-1] == "0":
+        parts.pop()
+    return ".".join(parts)
+
+
+@lru_cache(maxsize=VERSION_KEY_CACHE_SIZE)
+def version_key(version: str) -> tuple[tuple[int, int | str], ...]:
+    """Return a key that sorts versions the way Munki's MunkiLooseVersion
+    compares them: numeric components as numbers, numbers before other
+    components, and missing components treated as 0 (so "1.0" equals "1").
+    Cached, since the same versions recur across the repo."""
+    parts = []
+    for part in VERSION_COMPONENT_PATTERN.split(version):
+        if part and part != ".":
+            parts.append((0, int(part)) if part.isdigit() else (1, part))
+    while parts and parts[-1] == (0, 0):
+        parts.pop()
+    return tuple(parts)
+
+
+def read_repo_entry(path: str) -> dict[str, Any] | None:
+    """Return the fields of a pkginfo file that checks spanning the whole repo
+    need, or None if it can't be read or has no name: its name, version,
+    catalogs, requires and update_for references, the package IDs of its
+    receipts (except optional ones, which Munki doesn't use to decide
+    whether an item is installed), the paths of its installs items, the
+    destinations of its items_to_copy, and the locations of its installer
+    and uninstaller items."""
+    try:
+        pkginfo = load_plist(path)
+    except (ExpatError, ValueError, OSError):
+        return None
+    if not isinstance(pkginfo, dict) or not isinstance(pkginfo.get("name"), str):
+        return None
+    entry = {"name": pkginfo["name"], "version": pkginfo.get("version")}
+    for key in ("catalogs", "requires", "update_for"):
+        values = pkginfo.get(key)
+        if not isinstance(values, list):
+            values = []
+        entry[key] = [value for value in values if isinstance(value, str)]
+    for key, field in (("receipts", "packageid"), ("installs", "path")):
+        items = pkginfo.get(key)
+        if not isinstance(items, list):
+            items = []
+        entry[key] = [
+            item[field]
+            for item in items
+            if isinstance(item, dict)
+            and isinstance(item.get(field), str)
+            and not item.get("optional")
+        ]
+    items = pkginfo.get("items_to_copy")
+    if not isinstance(items, list):
+        items = []
+    entry["items_to_copy"] = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        # Munki copies to destination_item, or the source item's name.
+        destination_path = item.get("destination_path")
+        destination_item = item.get("destination_item", item.get("source_item"))
+        if isinstance(destination_path, str) and isinstance(destination_item, str):
+            entry["items_to_copy"].append(
+                f"{destination_path.rstrip('/')}/{os.path.basename(destination_item)}"
+            )
+    entry["installer_items"] = [
+        pkginfo[key]
+        for key in ("installer_item_location", "uninstaller_item_location")
+        if isinstance(pkginfo.get(key), str)
+    ]
+    return entry
+
+
+class RepoEntry(NamedTuple):
+    """The fields of a pkginfo kept for checks that span the whole repo (see
+    read_repo_entry). The version is None if it isn't a string."""
+
+    path: str
+    name: str
+    version: str | None
+    catalogs: tuple[str, ...]
+    requires: tuple[str, ...] = ()
+    update_for: tuple[str, ...] = ()
+    receipts: tuple[str, ...] = ()
+    installs: tuple[str, ...] = ()
+    items_to_copy: tuple[str, ...] = ()
+    installer_items: tuple[str, ...] = ()
+
+
+def load_repo_entries(
+    repo: str, jobs: int = 1, use_cache: bool = True
+) -> list[RepoEntry]:
+    """Read every pkginfo in the repo in one pass, on up to `jobs` processes,
+    and return an entry for each that could be read. Entries are cached
+    between runs by file content (and shared by all hooks), so unchanged
+    pkginfos aren't parsed again.
+
+    Each pkginfo is reduced to its entry as soon as it's read, and the
+    strings and tuples of strings shared by many entries (such as names and
+    lists of catalogs) are stored once, so that the entries of a large repo
+    take little memory."""
+    pkgsinfo_dir = os.path.join(repo, "pkgsinfo")
+    paths = [
+        os.path.normpath(os.path.join(pkgsinfo_dir, pkginfo_ref))
+        for pkginfo_ref in list_repo_items(repo, "pkgsinfo")
+    ]
+    cache = open_result_cache(
+        "munki-repo-entries", argparse.Namespace(no_cache=not use_cache)
+    )
+    # Tuples of strings, stored once however many entries have them.
+    shared: dict[tuple[str, ...], tuple[str, ...]] = {}
+    entries = []
+    results = iter_check_files(read_repo_entry, paths, jobs=jobs, cache=cache)
+    # strict, so that the results are exhausted and the cache is saved.
+    for path, fields in zip(paths, results, strict=True):
+        if not fields:
+            continue
+        lists = []
+        for key in RepoEntry._fields[3:]:
+            values = tuple(sys.intern(value) for value in fields[key])
+            lists.append(shared.setdefault(values, values))
+        version = fields["version"]
+        entries.append(
+            RepoEntry(
+                path,
+                sys.intern(fields["name"]),
+                version if isinstance(version, str) else None,
+                *lists,
+            )
+        )
+    return entries
+
+
+def resolve_reference(ref: str, versions: dict[str, set[str]]) -> str | None:
+    """Return the name of the item a requires or update_for reference refers
+    to, or None if no pkginfo matches it. A reference is either a name, or a
+    name and version such as "Firefox-120.0", as Munki accepts."""
+    if ref in versions:
+        return ref
+    name, version = split_name_and_version(ref)
+    if version and trim_version(version) in versions.get(name, ()):
+        return name
+    return None
+
+
+class CatalogIndex:
+    """Names and versions of the items in each catalog of a Munki repo, built
+    from its pkginfos, so that manifests can be checked against the catalogs
+    without reading the catalog files."""
+
+    def __init__(self, entries: list[RepoEntry]) -> None:
+        # Catalog names mapped to item names, mapped to trimmed versions.
+        self.catalogs: dict[str, dict[str, set[str]]] = {}
+        for entry in entries:
+            for catalog in entry.catalogs:
+                items = self.catalogs.setdefault(catalog, {})
+                versions = items.setdefault(entry.name, set())
+                if entry.version is not None:
+                    versions.add(trim_version(entry.version))
+
+    def resolve(self, item: str, catalogs: list[str]) -> bool:
+        """Return True if an item name (or name and version) matches an item
+        in any of the given catalogs."""
+        return any(
+            resolve_reference(item, self.catalogs.get(catalog, {})) is not None
+            for catalog in catalogs
+        )
+
+
+class VersionIndex:
+    """The versions of each item name in each catalog of a Munki repo, sorted
+    as Munki orders them, so that the highest version above a given one is
+    found with a binary search."""
+
+    def __init__(self, entries: list[RepoEntry]) -> None:
+        # (catalog, name) tuples mapped to sorted (version key, version, path)
+        # tuples.
+        self.versions: dict[tuple[str, str], list[tuple[tuple, str, str]]] = {}
+        for entry in entries:
+            if entry.version is None:
+                continue
+            for catalog in set(entry.catalogs):
+                self.versions.setdefault((catalog, entry.name), []).append(
+                    (version_key(entry.version), entry.version, entry.path)
+                )
+        for versions in self.versions.values():
+            versions.sort()
+        self._keys = {
+            key: [version[0] for version in versions]
+            for key, versions in self.versions.items()
+        }
+
+    def highest_above(
+        self, name: str, catalog: str, version: str
+    ) -> tuple[str, str] | None:
+        """Return the highest version of an item in a catalog, and the path of
+        its pkginfo, if it's higher than the given version. Otherwise return
+        None."""
+        keys = self._keys.get((catalog, name))
+        if not keys or bisect_right(keys, version_key(version)) == len(keys):
+            return None
+        _, highest, path = self.versions[(catalog, name)][-1]
+        return highest, path
+
+
+class _PathTrieNode:
+    """A path component in a PathTrie."""
+
+    __slots__ = ("children", "claims")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _PathTrieNode] = {}
+        # Owners mapped to the first (path, data) each claimed here with.
+        self.claims: dict[str, tuple[str, Any]] = {}
+
+
+class PathTrie:
+    """Paths claimed by owners (such as item names), stored by component so
+    that paths which are the same as or inside one another are found in
+    time linear in their total length. Components are compared ignoring
+    case, as on macOS."""
+
+    def __init__(self) -> None:
+        self.root = _PathTrieNode()
+
+    def insert(self, path: str, owner: str, data: Any = None) -> tuple[str, Any]:
+        """Record that owner claims path. Only an owner's first claim of a
+        path is kept, which is returned as a (path, data) tuple."""
+        node = self.root
+        for part in path.split("/"):
+            if part in ("", "."):
+                continue
+            key = part.casefold()
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = _PathTrieNode()
+            node = child
+        return node.claims.setdefault(owner, (path, data))
+
+    def overlaps(self) -> Iterator[tuple[tuple, tuple, bool]]:
+        """Yield an (owner, path, data) claim, another owner's claim that it
+        overlaps, and whether the paths are the same (rather than the first
+        being inside the second), for each claim that overlaps another. A
+        claim is compared with the first claim of the same path, or else the
+        claim of the nearest enclosing path by a different owner."""
+        pending: list[tuple[_PathTrieNode, tuple[tuple, ...]]] = [(self.root, ())]
+        while pending:
+            node, ancestors = pending.pop()
+            claims = tuple((owner, *claim) for owner, claim in node.claims.items())
+            for index, claim in enumerate(claims):
+                if index:
+                    yield claim, claims[0], True
+                    continue
+                for ancestor in reversed(ancestors):
+                    if ancestor[0] != claim[0]:
+                        yield claim, ancestor, False
+                        break
+            if claims:
+                ancestors = (*ancestors, *claims)
+            pending.extend((child, ancestors) for child in node.children.values())
+
+
+def _check_case_sensitive_path(path: str) -> bool:
+    """Check whether a path exists, and on case-sensitive filesystems check
+    that there is no case conflict."""
+    # Return immediately if the file does not exist
+    if not os.path.exists(path):
+        return False
+
+    p = Path(path)
+    while True:
+        # At root, p == p.parent --> break loop and return True
+        if p == p.parent:
+            return True
+        # If name of path is not listed in parent directory, return False
+        if p.name not in _list_dir(str(p.parent)):
+            return False
+        p = p.parent
+
+
+def _is_case_insensitive(path: str) -> bool:
+    """Return True if the filesystem containing path ignores case."""
+    swapped = os.path.join(os.path.dirname(path), os.path.basename(path).swapcase())
+    if swapped == path or not os.path.exists(path):
+        return False
+    return os.path.exists(swapped) and os.path.samefile(path, swapped)
+
+
+class RepoIndex:
+    """Listing of the pkgs and icons folders of a Munki repo, read with a
+    single walk so that existence checks for installer items and icons are
+    answered from memory instead of with a stat call per pkginfo."""
+
+    def __init__(self, repo: str) -> None:
+        self.repo = repo
+        # Paths relative to the repo (e.g. "pkgs/apps") mapped to entry names.
+        self.dirs: dict[str, frozenset[str]] = {}
+        _list_dir.cache_clear()
+        for top in ("pkgs", "icons"):
+            self._walk(top)
+        # Folded names of the folders searched ignoring case, built as needed.
+        self.folded_names: dict[str, dict[str, str]] = {}
+
+        # The repo and pkgs folder names are checked for case conflicts once.
+        self.pkgs_case_ok = _check_case_sensitive_path(os.path.join(repo, "pkgs"))
+
+        # Icons were previously found using os.path.isfile, which ignores case
+        # on case-insensitive filesystems, so the index does the same.
+        self.folded_dirs: dict[str, frozenset[str]] | None = None
+        if "icons" in self.dirs and _is_case_insensitive(os.path.join(repo, "icons")):
+            self.folded_dirs = {
+                path.casefold(): frozenset(name.casefold() for name in names)
+                for path, names in self.dirs.items()
+            }
+
+    def _walk(self, top: str) -> None:
+        """Record the entries of top and all folders below it."""
+        seen = set()
+        pending = [top]
+        while pending:
+            relpath = pending.pop()
+            path = os.path.join(self.repo, relpath)
+            try:
+                stat = os.stat(path)
+                if (stat.st_dev, stat.st_ino) in seen:
+                    continue  # Symlink loop
+                seen.add((stat.st_dev, stat.st_ino))
+                with os.scandir(path) as entries:
+                    names = set()
+                    for entry in entries:
+                        if entry.is_dir():
+                            pending.append(f"{relpath}/{entry.name}")
+                        elif entry.is_symlink() and not os.path.exists(entry.path):
+                            continue  # Broken symlinks do not exist
+                        names.add(entry.name)
+            except OSError:
+                continue
+            self.dirs[relpath] = frozenset(names)
+
+    def _lookup(self, top: str, relpath: str, dirs: dict[str, frozenset[str]]) -> str:
+        """Return the indexed path of relpath within top, or an empty string
+        if any component of it is not listed."""
+        path = top
+        for part in relpath.split("/"):
+            if part in ("", "."):
+                continue
+            names = dirs.get(path)
+            if names is None or part not in names:
+                return ""
+            path = f"{path}/{part}"
+        return path
+
+    def has_pkgs_item(self, location: str) -> bool:
+        """Return True if an item exists at location relative to the pkgs
+        folder, with the same case as the path on disk."""
+        if os.path.isabs(location):
+            # Outside of the repo; check the filesystem directly.
+            return _check_case_sensitive_path(os.path.join(self.repo, "pkgs", location))
+        if not self.pkgs_case_ok:
+            return False
+        path = self._lookup("pkgs", location, self.dirs)
+        if not path:
+            return False
+        if location.endswith(("/", "/.")) and path not in self.dirs:
+            # A trailing slash only resolves for folders.
+            return False
+        return True
+
+    def match_pkgs_item(self, location: str) -> str:
+        """Return the path relative to the pkgs folder of the item that
+        matches location ignoring case (with the case of the path on disk),
+        or an empty string if there is none."""
+        path = "pkgs"
+        for part in location.split("/"):
+            if part in ("", "."):
+                continue
+            names = self.dirs.get(path)
+            if names is None:
+                return ""
+            folded = self.folded_names.get(path)
+            if folded is None:
+                folded = self.folded_names[path] = {n.casefold(): n for n in names}
+            name = folded.get(part.casefold())
+            if name is None:
+                return ""
+            path = f"{path}/{name}"
+        return path.partition("/")[2]
+
+    def has_icon(self, name: str) -> bool:
+        """Return True if icons/<name>.png exists as a file."""
+        relpath = f"{name}.png"
+        if self.folded_dirs is not None:
+            path = self._lookup("icons", relpath.casefold(), self.folded_dirs)
+            return bool(path) and path not in self.folded_dirs
+        path = self._lookup("icons", relpath, self.dirs)
+        return bool(path) and path not in self.dirs
+
+
+# RepoIndex objects, keyed by absolute repo path.
+_repo_indexes: dict[str, RepoIndex] = {}
+
+
+def load_repo_index(repo: str, refresh: bool = False) -> RepoIndex:
+    """Return the RepoIndex for a repo, building it on first use (or again,
+    with refresh, so that a long-running process such as the hook server sees
+    changes). The index isn't validated against folder modification times,
+    which can miss changes on filesystems with coarse mtimes; rebuilding it
+    reads each folder once, about the same work as checking its mtime. Worker
+    processes build (or inherit) their own copy rather than receiving one."""
+    path = os.path.abspath(repo)
+    if refresh or path not in _repo_indexes:
+        _repo_indexes[path] = RepoIndex(path)
+    return _repo_indexes[path]
+
+
+def read_lfs_pointer(path: str) -> tuple[str, int] | None:
+    """If path is a Git LFS pointer file (as found in a checkout that hasn't
+    fetched LFS objects), return the SHA-256 hash and size in bytes of the
+    file it stands for. Otherwise return None. Files too large to be
+    pointers aren't read."""
+    try:
+        if os.stat(path).st_size >= LFS_POINTER_MAX_SIZE:
+            return None
+        with open(path, "rb") as openfile:
+            text = openfile.read().decode("utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
+    fields = dict(line.partition(" ")[::2] for line in text.splitlines())
+    if fields.get("version") not in LFS_POINTER_VERSIONS:
+        return None
+    algorithm, _, oid = fields.get("oid", "").partition(":")
+    size = fields.get("size", "")
+    if algorithm != "sha256" or len(oid) != 64 or not size.isdigit():
+        return None
+    return oid, int(size)
+
+
+def _hash_file(path: str) -> str | None:
+    """Return the SHA-256 hash of a file, read in chunks, or None if it can't
+    be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as openfile:
+            while chunk := openfile.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def hash_files(
+    paths: list[str], jobs: int = 1, use_cache: bool = True
+) -> dict[str, str | None]:
+    """Return the SHA-256 hash of each file, or None for files that can't be
+    read. Files are hashed on up to `jobs` threads (hashlib releases the GIL
+    while hashing). Hashes are cached between runs, keyed by each file's path,
+    size, modification time and inode, so unchanged files aren't read again.
+    """
+    stats = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stats[os.path.abspath(path)] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    hashes: dict[str, str | None] = {}
+    db = None
+    if use_cache:
+        try:
+            db = sqlite3.connect(
+                os.path.join(get_cache_dir(), "installer-hashes.sqlite3"), timeout=30
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, "
+                "size INTEGER, mtime INTEGER, inode INTEGER, sha256 TEXT)"
+            )
+            for path in stats:
+                row = db.execute(
+                    "SELECT size, mtime, inode, sha256 FROM hashes WHERE path = ?",
+                    (path,),
+                ).fetchone()
+                if row and tuple(row[:3]) == stats[path]:
+                    hashes[path] = row[3]
+        except (OSError, sqlite3.Error):
+            db = None
+
+    pending = [path for path in stats if path not in hashes]
+    if pending:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(pending)))) as pool:
+            hashes.update(zip(pending, pool.map(_hash_file, pending)))
+
+    if db is not None:
+        try:
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (path, *stats[path], hashes[path])
+                        for path in pending
+                        if hashes[path] is not None
+                    ],
+                )
+        except sqlite3.Error:
+            pass
+        db.close()
+
+    return {path: hashes.get(os.path.abspath(path)) for path in paths}
+
+
+# CatalogIndex objects, keyed by absolute repo path.
+_catalog_indexes: dict[str, CatalogIndex] = {}
+
+
+def load_catalog_index(
+    repo: str, jobs: int = 1, use_cache: bool = True, refresh: bool = False
+) -> CatalogIndex:
+    """Return the CatalogIndex for a repo, building it on first use (or again,
+    with refresh). Worker processes build (or inherit) their own copy rather
+    than receiving one."""
+    path = os.path.abspath(repo)
+    if refresh or path not in _catalog_indexes:
+        entries = load_repo_entries(repo, jobs=jobs, use_cache=use_cache)
+        _catalog_indexes[path] = CatalogIndex(entries)
+    return _catalog_indexes[path]
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+"""Timing of hook runs for the --profile option. Records wall time per file
+(split into parsing and checking) and per validator, and writes the slowest of
+each to a JSON report."""
+
+import json
+import sys
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any
+
+# Functions with these prefixes are timed as validators.
+VALIDATOR_PREFIXES = ("validate_", "detect_")
+
+
+class Profiler:
+    """Collects timings for one hook run."""
+
+    def __init__(self, hook: str) -> None:
+        self.hook = hook
+        self.started = time.perf_counter()
+        # Filename mapped to [total seconds, parse seconds].
+        self.files: dict[str, list[float]] = {}
+        # Validator name mapped to [calls, seconds, seconds excluding validators
+        # called from within it].
+        self.validators: dict[str, list[float]] = {}
+        self._current_file: str | None = None
+        # Time spent in nested validators, one entry per active validator.
+        self._nested: list[float] = []
+
+    def _time_validator(self, name: str, func: Callable) -> Callable:
+        """Return a wrapper for func that records its timing under name."""
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            self._nested.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = self._nested.pop()
+                if self._nested:
+                    self._nested[-1] += elapsed
+                stats = self.validators.setdefault(name, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] += elapsed - nested
+
+        return timed
+
+    def _time_parse(self, func: Callable) -> Callable:
+        """Return a wrapper for a parsing function that adds its time to the
+        file being checked."""
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if self._current_file is not None:
+                    self.files[self._current_file][1] += time.perf_counter() - start
+
+        return timed
+
+    @contextmanager
+    def instrument(self, package: str) -> Iterator[None]:
+        """Time validators and parsing in every loaded module of the package
+        while in this context."""
+        patched = []
+        for module_name, module in list(sys.modules.items()):
+            if module is None or not module_name.startswith(f"{package}."):
+                continue
+            short_name = module_name.rpartition(".")[2]
+            for attr, value in list(vars(module).items()):
+                if not callable(value) or getattr(value, "__module__", None) is None:
+                    continue
+                if attr.startswith(VALIDATOR_PREFIXES):
+                    source = value.__module__.rpartition(".")[2]
+                    wrapper = self._time_validator(f"{source}.{attr}", value)
+                elif attr == "_parse_document" and short_name == "util":
+                    wrapper = self._time_parse(value)
+                else:
+                    continue
+                patched.append((module, attr, value))
+                setattr(module, attr, wrapper)
+        try:
+            yield
+        finally:
+            for module, attr, value in patched:
+                setattr(module, attr, value)
+
+    def check_file(self, check_file: Callable[[str], Any], filename: str) -> Any:
+        """Run check_file on a file, recording how long it takes."""
+        self.files.setdefault(filename, [0.0, 0.0])
+        self._current_file = filename
+        start = time.perf_counter()
+        try:
+            return check_file(filename)
+        finally:
+            self.files[filename][0] += time.perf_counter() - start
+            self._current_file = None
+
+    def report(self, top: int) -> dict[str, Any]:
+        """Return the report, listing the top slowest files and validators."""
+        total = sum(seconds for seconds, _ in self.files.values())
+        parse = sum(parse for _, parse in self.files.values())
+        slowest_files = sorted(self.files.items(), key=lambda i: i[1][0], reverse=True)
+        slowest_validators = sorted(
+            self.validators.items(), key=lambda i: i[1][2], reverse=True
+        )
+        return {
+            "hook": self.hook,
+            "files_checked": len(self.files),
+            "wall_seconds": round(time.perf_counter() - self.started, 6),
+            "check_seconds": round(total - parse, 6),
+            "parse_seconds": round(parse, 6),
+            "slowest_files": [
+                {
+                    "filename": filename,
+                    "seconds": round(seconds, 6),
+                    "parse_seconds": round(parse, 6),
+                    "check_seconds": round(seconds - parse, 6),
+                }
+                for filename, (seconds, parse) in slowest_files[:top]
+            ],
+            "slowest_validators": [
+                {
+                    "name": name,
+                    "calls": calls,
+                    "seconds": round(seconds, 6),
+                    "self_seconds": round(self_seconds, 6),
+                }
+                for name, (calls, seconds, self_seconds) in slowest_validators[:top]
+            ],
+        }
+
+    def write(self, path: str, top: int) -> None:
+        """Write the report to a JSON file."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(top), f, indent=2)
+            f.write("\n")
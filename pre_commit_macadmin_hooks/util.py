@@ -1,13 +1,25 @@
 #!/usr/bin/python
 
+import argparse
+import io
 import json
+import os
 import plistlib
+import time
+from collections.abc import Callable, Iterator
+from contextlib import ExitStack, contextmanager, redirect_stdout
 from datetime import datetime
+from functools import partial
 from typing import Any
 
-import ruamel.yaml
+# YAML loader, created on first use by load_yaml. Importing ruamel.yaml takes
+# longer than most hooks spend checking a typical commit, and most hooks never
+# read YAML.
+_yaml = None
 
-yaml = ruamel.yaml.YAML(typ="safe")
+# Dependencies recorded by record_dependency for the file being checked, or
+# None if results aren't being cached.
+_dependencies: list[tuple[str, Any, Any]] | None = None
 
 # Plist data types and their Python equivalents
 PLIST_TYPES = {
@@ -22,6 +34,134 @@ PLIST_TYPES = {
     "date": datetime,
 }
 
+# Pkginfo keys and their known types. Omitted keys are left unvalidated.
+# Source: https://github.com/munki/munki/wiki/Supported-Pkginfo-Keys
+# Last updated 2019-03-13.
+PKGINFO_KEY_TYPES = {
+    "additional_startosinstall_options": list,
+    "apple_item": bool,
+    "autoremove": bool,
+    "blocking_applications": list,
+    "catalogs": list,
+    "category": str,
+    "copy_local": bool,
+    "description": str,
+    "developer": str,
+    "display_name": str,
+    "force_install_after_date": datetime,
+    "forced_install": bool,
+    "forced_uninstall": bool,
+    "icon_name": str,
+    "installable_condition": str,
+    "installcheck_script": str,
+    "installed_size": int,
+    "installer_choices_xml": list,
+    "installer_environment": dict,
+    "installer_item_hash": str,
+    "installer_item_location": str,
+    "installer_item_size": int,
+    "installer_type": str,
+    "installs": list,
+    "items_to_copy": list,
+    "localized_strings": dict,
+    "maximum_os_version": str,
+    "minimum_munki_version": str,
+    "minimum_os_version": str,
+    "name": str,
+    "notes": str,
+    "OnDemand": bool,
+    "package_path": str,
+    "PackageCompleteURL": str,
+    "PackageURL": str,
+    "postinstall_script": str,
+    "postuninstall_script": str,
+    "precache": bool,
+    "preinstall_alert": dict,
+    "preinstall_script": str,
+    "preuninstall_alert": dict,
+    "preuninstall_script": str,
+    "preupgrade_alert": dict,
+    "receipts": list,
+    "requires": list,
+    "RestartAction": str,
+    "supported_architectures": list,
+    "suppress_bundle_relocation": bool,
+    "unattended_install": bool,
+    "unattended_uninstall": bool,
+    "uninstall_method": str,
+    "uninstall_script": str,
+    "uninstallable": bool,
+    "uninstallcheck_script": str,
+    "uninstaller_item_location": str,
+    "update_for": list,
+    "version": str,
+    "version_script": str,
+}
+
+# Deprecated pkginfo keys.
+# List from: https://github.com/munki/munki/wiki/Supported-Pkginfo-Keys
+DEPRECATED_PKGINFO_KEYS = (
+    "suppress_bundle_relocation",
+    "forced_install",
+    "forced_uninstall",
+)
+
+# Common typos in pkginfo key names, and the keys that were probably meant.
+PKGINFO_KEY_CORRECTIONS = {
+    "appleitem": "apple_item",
+    "blocking_apps": "blocking_applications",
+    "blockingapplications": "blocking_applications",
+    "choices_xml": "installer_choices_xml",
+    "condition": "installable_condition",
+    "icon": "icon_name",
+    "install_check_script": "installcheck_script",
+    "installer_choices": "installer_choices_xml",
+    "max_os_vers": "maximum_os_version",
+    "max_os": "maximum_os_version",
+    "maximum_os_vers": "maximum_os_version",
+    "maximum_os": "maximum_os_version",
+    "min_munki_vers": "minimum_munki_version",
+    "min_munki": "minimum_munki_version",
+    "min_os_vers": "minimum_os_version",
+    "min_os": "minimum_os_version",
+    "minimum_munki_vers": "minimum_munki_version",
+    "minimum_munki": "minimum_munki_version",
+    "minimum_os_vers": "minimum_os_version",
+    "minimum_os": "minimum_os_version",
+    "on_demand": "OnDemand",
+    "post_install_script": "postinstall_script",
+    "post_uninstall_script": "postuninstall_script",
+    "pre_cache": "precache",
+    "pre_install_alert": "preinstall_alert",
+    "pre_install_script": "preinstall_script",
+    "pre_uninstall_alert": "preuninstall_alert",
+    "pre_uninstall_script": "preuninstall_script",
+    "pre_upgrade_alert": "preupgrade_alert",
+    "receipt": "receipts",
+    "require": "requires",
+    "supported_architecture": "supported_architectures",
+    "uninstall_check_script": "uninstallcheck_script",
+}
+
+# Allowed values for the RestartAction and supported_architectures keys.
+RESTART_ACTIONS = (
+    "RequireShutdown",
+    "RequireRestart",
+    "RecommendRestart",
+    "RequireLogout",
+    "None",
+)
+SUPPORTED_ARCHITECTURES = ("arm64", "x86_64")
+
+# Kinds of pkginfo key rules, in the order their messages are printed.
+_KEY_TYPES = 0
+_RESTART_ACTION = 1
+_UNINSTALL_METHOD = 2
+_ARCHITECTURES = 3
+_DEPRECATED_KEYS = 4
+_TYPOED_KEYS = 5
+_PKGINFO_KEY_KINDS = tuple(range(6))
+
 # List of common shebangs used by Mac admin scripts
 # (Can be augmented with --valid-shebangs parameter)
 BUILTIN_SHEBANGS = [
@@ -37,6 +177,525 @@ BUILTIN_SHEBANGS = [
     "#!/usr/local/munki/Python.framework/Versions/Current/bin/python3",
 ]
 
+# Starting a worker process costs far more than checking a single file, so
+# only spread work across processes when each one gets at least this many files.
+MIN_FILES_PER_JOB = 50
+
+# Files looked up in the result cache and checked together, so that cached
+# results for the whole run aren't held in memory at once.
+CHECK_BATCH_SIZE = 1000
+
+# Size limit (in bytes) for the cache of per-file check results.
+RESULT_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+
+def _positive_int(value: str) -> int:
+    """Argparse type for arguments that must be a positive integer."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def add_jobs_argument(parser: argparse.ArgumentParser) -> None:
+    """Add the --jobs argument, for hooks that read many files in parallel."""
+    parser.add_argument(
+        "--jobs",
+        type=_positive_int,
+        default=os.cpu_count() or 1,
+        help="Number of processes to use when checking many files. "
+        "Defaults to the number of CPUs.",
+    )
+
+
+def add_performance_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add arguments that control how hooks spread work across files."""
+    add_jobs_argument(parser)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Check every file, even if an unchanged copy was checked before.",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="REPORT",
+        help="Write a JSON report of the time spent on each file and validator "
+        "to this path. Files are checked in a single process, without the cache.",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=_positive_int,
+        default=10,
+        metavar="N",
+        help="Number of files and validators to list in the profile report "
+        "(default: %(default)s).",
+    )
+
+
+def get_cache_dir() -> str:
+    """Return the folder used for caches that persist between runs, creating
+    it if needed. Follows pre-commit's own convention of ~/.cache."""
+    path = os.environ.get("PRE_COMMIT_MACADMIN_CACHE_DIR")
+    if not path:
+        xdg_cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache"
+        )
+        path = os.path.join(xdg_cache, "pre-commit-macadmin")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _package_fingerprint() -> str:
+    """Identify the installed version of this package, including local edits,
+    so that cached results are discarded when the checks themselves change."""
+    import importlib.metadata  # Slow to import, and only needed with a cache
+
+    try:
+        version = importlib.metadata.version("pre-commit-macadmin")
+    except importlib.metadata.PackageNotFoundError:
+        version = "unknown"
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    with os.scandir(package_dir) as entries:
+        sources = sorted(
+            (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in entries
+            if entry.name.endswith(".py")
+        )
+    return f"{version}:{sources}"
+
+
+class ResultCache:
+    """On-disk cache of the output and result of checking individual files.
+
+    Entries are keyed by the file's content hash and path, along with the hook
+    name, its arguments, and the package version (the "namespace"), so an
+    unchanged file can be answered without parsing it. Each entry also holds
+    the dependencies recorded while checking the file (see record_dependency),
+    and is only used while the functions in `dependencies` give the same
+    answers. Least recently used entries are evicted once the cache grows
+    beyond max_size bytes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        max_size: int,
+        dependencies: dict[str, Callable[[Any], Any]] | None = None,
+    ) -> None:
+        import sqlite3  # Only needed with a cache, like hashlib below
+
+        self.namespace = namespace
+        self.max_size = max_size
+        self.dependencies = dependencies or {}
+        self.digests: dict[str, str] = {}
+        self.pending: list[tuple[str, str, str, int, float]] = []
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, "
+            "output TEXT, result TEXT, size INTEGER, used REAL)"
+        )
+
+    def _key(self, filename: str) -> str | None:
+        """Return the cache key for a file, or None if it can't be read."""
+        if filename not in self.digests:
+            import hashlib
+
+            try:
+                with open(filename, "rb") as openfile:
+                    content_hash = hashlib.sha256(openfile.read()).hexdigest()
+            except OSError:
+                return None
+            self.digests[filename] = hashlib.sha256(
+                "\0".join(
+                    (self.namespace, filename, os.path.abspath(filename), content_hash)
+                ).encode("utf-8")
+            ).hexdigest()
+        return self.digests[filename]
+
+    def lookup(self, filenames: list[str]) -> dict[str, tuple[str, Any]]:
+        """Return cached (output, result) pairs for any of the files."""
+        keys = {}
+        for filename in filenames:
+            key = self._key(filename)
+            if key is not None:
+                keys[key] = filename
+        found = {}
+        key_list = list(keys)
+        for idx in range(0, len(key_list), 500):
+            batch = key_list[idx : idx + 500]
+            rows = self.db.execute(
+                "SELECT key, output, result FROM results WHERE key IN "
+                f"({','.join('?' * len(batch))})",
+                batch,
+            )
+            for key, output, result in rows:
+                result, deps = json.loads(result)
+                if self._is_current(deps):
+                    found[keys[key]] = (output, result)
+        if found:
+            self.db.executemany(
+                "UPDATE results SET used = ? WHERE key = ?",
+                [(time.time(), self._key(filename)) for filename in found],
+            )
+        return found
+
+    def _is_current(self, deps: list[list[Any]]) -> bool:
+        """Return True if every recorded dependency still has the same
+        answer."""
+        for kind, arg, answer in deps:
+            check = self.dependencies.get(kind)
+            if check is None or check(arg) != answer:
+                return False
+        return True
+
+    def store(
+        self, filename: str, output: str, result: Any, deps: list | None = None
+    ) -> None:
+        """Queue the output and result of checking a file, along with the
+        dependencies recorded while checking it, to be saved."""
+        key = self._key(filename)
+        try:
+            encoded = json.dumps([result, deps or []])
+        except TypeError:
+            return
+        if key is not None:
+            size = len(key) + len(output) + len(encoded)
+            self.pending.append((key, output, encoded, size, time.time()))
+
+    def save(self) -> None:
+        """Write queued entries, then evict old entries if over max_size."""
+        self.db.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", self.pending
+        )
+        self.pending = []
+        total = self.db.execute("SELECT SUM(size) FROM results").fetchone()[0] or 0
+        if total > self.max_size:
+            # Evict down to 3/4 of the limit so this doesn't happen every run.
+            excess = total - self.max_size * 3 // 4
+            evict = []
+            for key, size in self.db.execute(
+                "SELECT key, size FROM results ORDER BY used"
+            ):
+                if excess <= 0:
+                    break
+                evict.append((key,))
+                excess -= size
+            self.db.executemany("DELETE FROM results WHERE key = ?", evict)
+        self.db.commit()
+        self.db.close()
+
+
+def open_result_cache(
+    hook: str,
+    args: argparse.Namespace,
+    salt: str = "",
+    dependencies: dict[str, Callable[[Any], Any]] | None = None,
+) -> ResultCache | None:
+    """Return the result cache for a hook run, or None if caching is disabled
+    or unavailable. The salt captures anything besides the file content and
+    arguments that all of the hook's findings depend on; dependencies answer
+    the queries recorded for individual files with record_dependency."""
+    if args.no_cache:
+        return None
+    import sqlite3
+
+    hook_args = {
+        k: v
+        for k, v in vars(args).items()
+        if k not in ("filenames", "jobs", "no_cache", "profile", "profile_top")
+    }
+    namespace = json.dumps(
+        [hook, hook_args, salt, _package_fingerprint()], sort_keys=True, default=str
+    )
+    try:
+        return ResultCache(
+            os.path.join(get_cache_dir(), "results.sqlite3"),
+            namespace,
+            RESULT_CACHE_MAX_SIZE,
+            dependencies,
+        )
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def record_dependency(kind: str, arg: Any, answer: Any) -> Any:
+    """Note that the result of the file being checked depends on answer, the
+    result of the query `kind` (one of the hook's cache dependencies) for arg,
+    so that a cached result is only used while the answer is the same.
+    Returns answer."""
+    if _dependencies is not None:
+        _dependencies.append((kind, arg, answer))
+    return answer
+
+
+def _run_captured(
+    check_file: Callable[[str], Any], filename: str
+) -> tuple[str, Any, list]:
+    """Run check_file on a single file, returning its printed output along
+    with its result and the dependencies it recorded."""
+    global _dependencies
+    output = io.StringIO()
+    _dependencies = []
+    try:
+        with redirect_stdout(output):
+            result = check_file(filename)
+        return output.getvalue(), result, _dependencies
+    finally:
+        _dependencies = None
+
+
+def check_files(
+    check_file: Callable[[str], Any],
+    filenames: list[str],
+    jobs: int = 1,
+    cache: ResultCache | None = None,
+) -> list[Any]:
+    """Run check_file on each file and return the results in the same order.
+
+    When there are enough files, the work is spread across up to `jobs`
+    processes. Output from each file is buffered and printed in the order of
+    filenames, so findings read the same as a single-process run. check_file
+    must be picklable (e.g. a module-level function, or a functools.partial of
+    one). If a cache is given, files it has seen before are not checked again,
+    and new results are added to it.
+    """
+    return list(iter_check_files(check_file, filenames, jobs=jobs, cache=cache))
+
+
+def iter_check_files(
+    check_file: Callable[[str], Any],
+    filenames: list[str],
+    jobs: int = 1,
+    cache: ResultCache | None = None,
+) -> Iterator[Any]:
+    """Like check_files, but yields each result as soon as it's available, so
+    that callers keeping only part of each result don't hold all of them at
+    once. Files are looked up in the cache and checked in batches of
+    CHECK_BATCH_SIZE, so only one or two batches of cached results are held at
+    a time. The cache is saved once every result has been yielded."""
+    if cache is None and (jobs < 2 or len(filenames) < 2 * MIN_FILES_PER_JOB):
+        for filename in filenames:
+            yield check_file(filename)
+        return
+    if cache is not None:
+        import sqlite3
+
+    with ExitStack() as stack:
+        executor = None
+
+        def start_batch(batch: list[str]) -> tuple[list[str], dict, Iterator]:
+            """Look up cached results for a batch of files, and start checking
+            the others."""
+            nonlocal cache, executor
+            cached = {}
+            if cache is not None:
+                try:
+                    cached = cache.lookup(batch)
+                except sqlite3.Error:
+                    cache = None
+            pending = [filename for filename in batch if filename not in cached]
+            workers = min(jobs, len(pending) // MIN_FILES_PER_JOB)
+            if workers > 1:
+                if executor is None:
+                    from concurrent.futures import ProcessPoolExecutor
+
+                    executor = stack.enter_context(
+                        ProcessPoolExecutor(max_workers=workers)
+                    )
+                checked = executor.map(
+                    partial(_run_captured, check_file),
+                    pending,
+                    chunksize=max(1, len(pending) // (workers * 4)),
+                )
+            else:
+                checked = (_run_captured(check_file, filename) for filename in pending)
+            return batch, cached, checked
+
+        upcoming = start_batch(filenames[:CHECK_BATCH_SIZE]) if filenames else None
+        for idx in range(0, len(filenames), CHECK_BATCH_SIZE):
+            batch, cached, checked = upcoming
+            # Start on the next batch, so that workers stay busy while this
+            # batch's results are yielded.
+            next_batch = filenames[idx + CHECK_BATCH_SIZE : idx + 2 * CHECK_BATCH_SIZE]
+            upcoming = start_batch(next_batch) if next_batch else None
+            for filename in batch:
+                if filename in cached:
+                    output, result = cached[filename]
+                else:
+                    output, result, deps = next(checked)
+                    if cache is not None:
+                        cache.store(filename, output, result, deps)
+                if output:
+                    print(output, end="")
+                yield result
+
+    if cache is not None:
+        try:
+            cache.save()
+        except sqlite3.Error:
+            pass
+
+
+def run_checks(
+    hook: str,
+    args: argparse.Namespace,
+    check_file: Callable[[str], Any],
+    filenames: list[str] | None = None,
+    salt: str = "",
+    dependencies: dict[str, Callable[[Any], Any]] | None = None,
+) -> list[Any]:
+    """Run check_file on each of the hook's files (args.filenames unless given),
+    honoring the arguments added by add_performance_arguments. Returns the
+    results in the same order as the files."""
+    if filenames is None:
+        filenames = args.filenames
+    if not args.profile:
+        cache = open_result_cache(hook, args, salt=salt, dependencies=dependencies)
+        return check_files(check_file, filenames, jobs=args.jobs, cache=cache)
+
+    from pre_commit_macadmin_hooks.profiling import Profiler
+
+    profiler = Profiler(hook)
+    with profiler.instrument(__package__):
+        results = [profiler.check_file(check_file, f) for f in filenames]
+    profiler.write(args.profile, args.profile_top)
+    return results
+
+
+def find_cycles(graph: dict[str, list[str]]) -> list[list[str]]:
+    """Return the groups of nodes in a directed graph that are joined by a
+    cycle, each sorted, in the order they are found. A node is only in a
+    group by itself if it has an edge to itself. Uses an iterative form of
+    Tarjan's strongly connected components algorithm, so it runs in time
+    linear in the size of the graph and isn't limited by recursion depth.
+    Nodes that are only edge targets are treated as having no edges."""
+    index: dict[str, int] = {}
+    lowlink: dict[str, int] = {}
+    stack: list[str] = []
+    on_stack: set[str] = set()
+    cycles = []
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+        while work:
+            node, edges = work[-1]
+            for target in edges:
+                if target not in index:
+                    index[target] = lowlink[target] = len(index)
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(graph.get(target, ()))))
+                    break
+                if target in on_stack:
+                    lowlink[node] = min(lowlink[node], index[target])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    group = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        group.append(member)
+                        if member == node:
+                            break
+                    if len(group) > 1 or node in graph.get(node, ()):
+                        cycles.append(sorted(group))
+    return cycles
+
+
+def list_added_files(path: str = ".") -> set[str]:
+    """Return the absolute paths of the files added by the changes being
+    checked in the Git repo containing path: those between
+    PRE_COMMIT_FROM_REF and PRE_COMMIT_TO_REF when pre-commit sets them (as
+    in CI), otherwise those staged for commit. Returns an empty set outside
+    of a Git repo."""
+    from_ref = os.environ.get("PRE_COMMIT_FROM_REF")
+    to_ref = os.environ.get("PRE_COMMIT_TO_REF")
+    diff = ["git", "diff", "--name-only", "--diff-filter=A", "-z"]
+    diff.append(f"{from_ref}...{to_ref}" if from_ref and to_ref else "--cached")
+    import subprocess
+
+    try:
+        top = subprocess.run(
+            ["git", "rev-parse", "--show-toplevel"],
+            cwd=path,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        added = subprocess.run(
+            diff, cwd=path, check=True, capture_output=True, text=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return set()
+    return {
+        os.path.normpath(os.path.join(top, path))
+        for path in added.stdout.split("\0")
+        if path
+    }
+
+
+# Parsed documents kept while share_parsed_documents() is active, so that
+# several checks of the same file only parse it once.
+_shared_documents: dict[tuple[str, str], tuple[Any, Exception | None]] | None = None
+
+
+@contextmanager
+def share_parsed_documents():
+    """Within this context, files loaded with load_plist() or
+    load_autopkg_recipe() are parsed once and the result is reused. Callers
+    must not modify the documents they receive."""
+    global _shared_documents
+    previous = _shared_documents
+    _shared_documents = {}
+    try:
+        yield
+    finally:
+        _shared_documents = previous
+
+
+def _parse_document(kind: str, path: str, parse: Callable[[Any], Any]) -> Any:
+    """Parse the file at path, reusing (or re-raising) an earlier result of
+    the same kind while share_parsed_documents() is active."""
+    if _shared_documents is None:
+        with open(path, "rb") as openfile:
+            return parse(openfile)
+    key = (kind, path)
+    if key not in _shared_documents:
+        try:
+            with open(path, "rb") as openfile:
+                _shared_documents[key] = (parse(openfile), None)
+        except Exception as err:
+            _shared_documents[key] = (None, err)
+    document, err = _shared_documents[key]
+    if err is not None:
+        raise err
+    return document
+
+
+def load_yaml(stream: Any) -> Any:
+    """Loads YAML from a file object using ruamel.yaml's safe loader."""
+    global _yaml
+    if _yaml is None:
+        import ruamel.yaml
+
+        _yaml = ruamel.yaml.YAML(typ="safe")
+    return _yaml.load(stream)
+
+
+def load_plist(path: str) -> Any:
+    """Loads a property list, raising the same errors as plistlib.load."""
+    return _parse_document("plist", path, plistlib.load)
+
 
 def load_autopkg_recipe(path: str) -> dict[str, Any] | None:
     """Loads an AutoPkg recipe in plist, yaml, or json format."""
@@ -45,22 +704,19 @@ def load_autopkg_recipe(path: str) -> dict[str, Any] | None:
     if path.endswith(".yaml"):
         try:
             # try to read it as yaml
-            with open(path, "rb") as f:
-                recipe = yaml.load(f)
+            recipe = _parse_document("yaml", path, load_yaml)
         except Exception as err:
             print(f"{path}: yaml parsing error: {err}")
     elif path.endswith(".json"):
         try:
             # try to read it as json
-            with open(path, "rb") as f:
-                recipe = json.load(f)
+            recipe = _parse_document("json", path, json.load)
         except Exception as err:
             print(f"{path}: json parsing error: {err}")
     else:
         try:
             # try to read it as a plist
-            with open(path, "rb") as f:
-                recipe = plistlib.load(f)
+            recipe = load_plist(path)
         except Exception as err:
             print(f"{path}: plist parsing error: {err}")
 
@@ -79,106 +735,163 @@ def validate_required_keys(
     return passed
 
 
+def _report_findings(filename: str, messages: list[str]) -> bool:
+    """Prints messages about a file. Returns True if there were none."""
+    for message in messages:
+        print(f"{filename}: {message}")
+    return not messages
+
+
+def _check_restart_action(key: str, value: Any, recipe_mode: bool) -> list[str]:
+    if value not in RESTART_ACTIONS:
+        return [f"RestartAction key set to unexpected value: {value}"]
+    return []
+
+
+def _check_architectures(key: str, value: Any, recipe_mode: bool) -> list[str]:
+    messages = []
+    for arch in value:
+        if recipe_mode and arch.startswith("%") and arch.endswith("%"):
+            # Skip values that are substituted during AutoPkg recipe runs
+            continue
+        if arch not in SUPPORTED_ARCHITECTURES:
+            messages.append(
+                f"supported_architectures contains unexpected value: {arch}"
+            )
+    return messages
+
+
+def _check_deprecated_key(key: str, value: Any, recipe_mode: bool) -> list[str]:
+    if value:
+        return [f"{key} key is deprecated"]
+    return []
+
+
+def _check_typoed_key(key: str, value: Any, recipe_mode: bool) -> list[str]:
+    return [f"You used {key} when you probably meant {PKGINFO_KEY_CORRECTIONS[key]}."]
+
+
+def _check_uninstall_method(pkginfo: dict[str, Any]) -> list[str]:
+    uninst_method = pkginfo.get("uninstall_method")
+    if pkginfo.get("uninstall_script") and uninst_method != "uninstall_script":
+        return [
+            "has an uninstall script, but the uninstall "
+            f'method is set to "{uninst_method}"'
+        ]
+    if not pkginfo.get("uninstall_script") and uninst_method == "uninstall_script":
+        return [
+            "uninstall_method is set to uninstall_script, "
+            'but no uninstall script is present"'
+        ]
+    return []
+
+
+def _compile_pkginfo_key_rules() -> dict[str, tuple]:
+    """Combines the pkginfo key tables into one, so that each key found in a
+    pkginfo needs only one lookup. Each key maps to a tuple of:
+
+    - its expected type (or None), and its position in PKGINFO_KEY_TYPES
+    - a function returning messages about its value (or None), the kind of
+      that check, and the key's position in that check's table
+
+    The positions keep messages in the order the tables list them, regardless
+    of the order of keys in a pkginfo.
+    """
+    checks: dict[str, tuple] = {
+        "RestartAction": (_check_restart_action, _RESTART_ACTION, 0),
+        "supported_architectures": (_check_architectures, _ARCHITECTURES, 0),
+    }
+    for rank, key in enumerate(DEPRECATED_PKGINFO_KEYS):
+        checks[key] = (_check_deprecated_key, _DEPRECATED_KEYS, rank)
+    for rank, key in enumerate(PKGINFO_KEY_CORRECTIONS):
+        checks[key] = (_check_typoed_key, _TYPOED_KEYS, rank)
+
+    types = {key: (t, rank) for rank, (key, t) in enumerate(PKGINFO_KEY_TYPES.items())}
+    return {
+        key: types.get(key, (None, 0)) + checks.get(key, (None, 0, 0))
+        for key in types.keys() | checks.keys()
+    }
+
+
+_PKGINFO_KEY_RULES = _compile_pkginfo_key_rules()
+
+
+def _scan_pkginfo_keys(
+    pkginfo: dict[str, Any], kinds: tuple[int, ...], recipe_mode: bool = False
+) -> list[str]:
+    """Applies the rules of the given kinds to the keys present in pkginfo,
+    visiting each key once. Returns the messages in the order of kinds, and
+    within each kind in the order of its table."""
+    if not isinstance(pkginfo, dict):
+        return []
+    check_types = _KEY_TYPES in kinds
+    findings = []
+    for key, value in pkginfo.items():
+        rule = _PKGINFO_KEY_RULES.get(key)
+        if rule is None:
+            continue
+        expected_type, type_rank, check, kind, rank = rule
+        if (
+            check_types
+            and expected_type is not None
+            and not isinstance(value, expected_type)
+        ):
+            findings.append(
+                (
+                    (_KEY_TYPES, type_rank),
+                    f"pkginfo key {key} should be type "
+                    f"{expected_type}, not type {type(value)}",
+                )
+            )
+        if check is not None and kind in kinds:
+            for message in check(key, value, recipe_mode):
+                findings.append(((kind, rank), message))
+    if _UNINSTALL_METHOD in kinds:
+        for message in _check_uninstall_method(pkginfo):
+            findings.append(((_UNINSTALL_METHOD, 0), message))
+    if not findings:
+        return []
+    findings.sort(key=lambda finding: finding[0])
+    return [message for _, message in findings]
+
+
+def validate_pkginfo_keys(
+    pkginfo: dict[str, Any], filename: str, recipe_mode: bool = False
+) -> bool:
+    """Verifies pkginfo key types, the RestartAction, uninstall_method and
+    supported_architectures values, and that no deprecated or typoed keys are
+    used, in a single pass over the pkginfo's keys.
+
+    Prints the same messages as validate_pkginfo_key_types,
+    validate_restart_action_key, validate_uninstall_method,
+    validate_supported_architectures, detect_deprecated_keys and
+    detect_typoed_keys called in that order.
+    """
+    return _report_findings(
+        filename, _scan_pkginfo_keys(pkginfo, _PKGINFO_KEY_KINDS, recipe_mode)
+    )
+
+
 def detect_deprecated_keys(input_dict: dict[str, Any], filename: str) -> bool:
     """Verifies that no deprecated keys are present in dictionary."""
-    # List from: https://github.com/munki/munki/wiki/Supported-Pkginfo-Keys
-    deprecated_keys = (
-        "suppress_bundle_relocation",
-        "forced_install",
-        "forced_uninstall",
+    return _report_findings(
+        filename, _scan_pkginfo_keys(input_dict, (_DEPRECATED_KEYS,))
     )
-    passed = True
-    for dep_key in deprecated_keys:
-        if input_dict.get(dep_key):
-            print(f"{filename}: {dep_key} key is deprecated")
-            passed = False
-    return passed
 
 
 def detect_typoed_keys(input_dict: dict[str, Any], filename: str) -> bool:
     """Verifies that specific key name typos are not present in dictionary."""
-    key_corrections = {
-        "appleitem": "apple_item",
-        "blocking_apps": "blocking_applications",
-        "blockingapplications": "blocking_applications",
-        "choices_xml": "installer_choices_xml",
-        "condition": "installable_condition",
-        "icon": "icon_name",
-        "install_check_script": "installcheck_script",
-        "installer_choices": "installer_choices_xml",
-        "max_os_vers": "maximum_os_version",
-        "max_os": "maximum_os_version",
-        "maximum_os_vers": "maximum_os_version",
-        "maximum_os": "maximum_os_version",
-        "min_munki_vers": "minimum_munki_version",
-        "min_munki": "minimum_munki_version",
-        "min_os_vers": "minimum_os_version",
-        "min_os": "minimum_os_version",
-        "minimum_munki_vers": "minimum_munki_version",
-        "minimum_munki": "minimum_munki_version",
-        "minimum_os_vers": "minimum_os_version",
-        "minimum_os": "minimum_os_version",
-        "on_demand": "OnDemand",
-        "post_install_script": "postinstall_script",
-        "post_uninstall_script": "postuninstall_script",
-        "pre_cache": "precache",
-        "pre_install_alert": "preinstall_alert",
-        "pre_install_script": "preinstall_script",
-        "pre_uninstall_alert": "preuninstall_alert",
-        "pre_uninstall_script": "preuninstall_script",
-        "pre_upgrade_alert": "preupgrade_alert",
-        "receipt": "receipts",
-        "require": "requires",
-        "supported_architecture": "supported_architectures",
-        "uninstall_check_script": "uninstallcheck_script",
-    }
-    passed = True
-    for found_key, expected_key in key_corrections.items():
-        if found_key in input_dict:
-            print(
-                f"{filename}: You used {found_key} when you "
-                f"probably meant {expected_key}."
-            )
-            passed = False
-    return passed
+    return _report_findings(filename, _scan_pkginfo_keys(input_dict, (_TYPOED_KEYS,)))
 
 
 def validate_restart_action_key(pkginfo: dict[str, Any], filename: str) -> bool:
     """Verifies that the RestartAction key is set correctly."""
-    passed = True
-    allowed_values = (
-        "RequireShutdown",
-        "RequireRestart",
-        "RecommendRestart",
-        "RequireLogout",
-        "None",
-    )
-    if "RestartAction" in pkginfo:
-        if pkginfo["RestartAction"] not in allowed_values:
-            print(
-                f"{filename}: RestartAction key set to unexpected value: {pkginfo['RestartAction']}"
-            )
-            passed = False
-    return passed
+    return _report_findings(filename, _scan_pkginfo_keys(pkginfo, (_RESTART_ACTION,)))
 
 
 def validate_uninstall_method(pkginfo: dict[str, Any], filename: str) -> bool:
     """Verifies that uninstall_method and uninstall_script is used appropriately."""
-    passed = True
-    uninst_method = pkginfo.get("uninstall_method")
-    if pkginfo.get("uninstall_script") and uninst_method != "uninstall_script":
-        print(
-            f"{filename}: has an uninstall script, but the uninstall "
-            f'method is set to "{uninst_method}"'
-        )
-        passed = False
-    elif not pkginfo.get("uninstall_script") and uninst_method == "uninstall_script":
-        print(
-            f"{filename}: uninstall_method is set to uninstall_script, "
-            'but no uninstall script is present"'
-        )
-        passed = False
-    return passed
+    return _report_findings(filename, _check_uninstall_method(pkginfo))
 
 
 def validate_supported_architectures(
@@ -189,19 +902,9 @@ def validate_supported_architectures(
     recipe_mode: Allow values wrapped in '%' which are typically substitution variables
     in AutoPkg recipes. Defaults to False.
     """
-    passed = True
-    allowed_values = ("arm64", "x86_64")
-    if "supported_architectures" in pkginfo:
-        for arch in pkginfo["supported_architectures"]:
-            if recipe_mode and arch.startswith("%") and arch.endswith("%"):
-                # Skip values that are substituted during AutoPkg recipe runs
-                continue
-            if arch not in allowed_values:
-                print(
-                    f"{filename}: supported_architectures contains unexpected value: {arch}"
-                )
-                passed = False
-    return passed
+    return _report_findings(
+        filename, _scan_pkginfo_keys(pkginfo, (_ARCHITECTURES,), recipe_mode)
+    )
 
 
 def validate_pkginfo_key_types(pkginfo: dict[str, Any], filename: str) -> bool:
@@ -209,82 +912,7 @@ def validate_pkginfo_key_types(pkginfo: dict[str, Any], filename: str) -> bool:
 
     Used for AutoPkg- and Munki-related hooks.
     """
-
-    # Pkginfo keys and their known types. Omitted keys are left unvalidated.
-    # Source: https://github.com/munki/munki/wiki/Supported-Pkginfo-Keys
-    # Last updated 2019-03-13.
-    pkginfo_types = {
-        "additional_startosinstall_options": list,
-        "apple_item": bool,
-        "autoremove": bool,
-        "blocking_applications": list,
-        "catalogs": list,
-        "category": str,
-        "copy_local": bool,
-        "description": str,
-        "developer": str,
-        "display_name": str,
-        "force_install_after_date": datetime,
-        "forced_install": bool,
-        "forced_uninstall": bool,
-        "icon_name": str,
-        "installable_condition": str,
-        "installcheck_script": str,
-        "installed_size": int,
-        "installer_choices_xml": list,
-        "installer_environment": dict,
-        "installer_item_hash": str,
-        "installer_item_location": str,
-        "installer_item_size": int,
-        "installer_type": str,
-        "installs": list,
-        "items_to_copy": list,
-        "localized_strings": dict,
-        "maximum_os_version": str,
-        "minimum_munki_version": str,
-        "minimum_os_version": str,
-        "name": str,
-        "notes": str,
-        "OnDemand": bool,
-        "package_path": str,
-        "PackageCompleteURL": str,
-        "PackageURL": str,
-        "postinstall_script": str,
-        "postuninstall_script": str,
-        "precache": bool,
-        "preinstall_alert": dict,
-        "preinstall_script": str,
-        "preuninstall_alert": dict,
-        "preuninstall_script": str,
-        "preupgrade_alert": dict,
-        "receipts": list,
-        "requires": list,
-        "RestartAction": str,
-        "supported_architectures": list,
-        "suppress_bundle_relocation": bool,
-        "unattended_install": bool,
-        "unattended_uninstall": bool,
-        "uninstall_method": str,
-        "uninstall_script": str,
-        "uninstallable": bool,
-        "uninstallcheck_script": str,
-        "uninstaller_item_location": str,
-        "update_for": list,
-        "version": str,
-        "version_script": str,
-    }
-
-    passed = True
-    for pkginfo_key, expected_type in pkginfo_types.items():
-        if pkginfo_key in pkginfo:
-            if not isinstance(pkginfo[pkginfo_key], expected_type):
-                print(
-                    f"{filename}: pkginfo key {pkginfo_key} should be type "
-                    f"{expected_type}, not type {type(pkginfo[pkginfo_key])}"
-                )
-                passed = False
-
-    return passed
+    return _report_findings(filename, _scan_pkginfo_keys(pkginfo, (_KEY_TYPES,)))
 
 
 def validate_shebangs(
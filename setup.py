@@ -20,6 +20,7 @@ setup(
             # "check-jamf-json-manifests = pre_commit_macadmin_hooks.check_jamf_json_manifests:main",
             "check-jamf-profiles = pre_commit_macadmin_hooks.check_jamf_profiles:main",
             "check-jamf-scripts = pre_commit_macadmin_hooks.check_jamf_scripts:main",
+            "check-munki-manifests = pre_commit_macadmin_hooks.check_munki_manifests:main",
             "check-munki-pkgsinfo = pre_commit_macadmin_hooks.check_munki_pkgsinfo:main",
             "check-munkiadmin-scripts = pre_commit_macadmin_hooks.check_munkiadmin_scripts:main",
             "check-munkipkg-buildinfo = pre_commit_macadmin_hooks.check_munkipkg_buildinfo:main",
@@ -30,6 +31,9 @@ setup(
             "forbid-autopkg-trust-info = pre_commit_macadmin_hooks.forbid_autopkg_trust_info:main",
             "format-autopkg-yaml-recipes = pre_commit_macadmin_hooks.format_autopkg_yaml_recipes:main",
             "format-xml-plist = pre_commit_macadmin_hooks.format_xml_plist:main",
+            "macadmin-check = pre_commit_macadmin_hooks.macadmin_check:main",
+            "macadmin-hook = pre_commit_macadmin_hooks.hook_client:main",
+            "macadmin-hook-server = pre_commit_macadmin_hooks.hook_server:main",
             "munki-makecatalogs = pre_commit_macadmin_hooks.munki_makecatalogs:main",
         ]
     },
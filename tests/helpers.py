@@ -0,0 +1,21 @@
+"""Shared helpers for the tests."""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+
+class CacheTestCase(unittest.TestCase):
+    """Test case that points the hooks' caches at a new temporary folder for
+    each test, so that tests neither use nor change the user's cache."""
+
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.dict(
+            os.environ, {"PRE_COMMIT_MACADMIN_CACHE_DIR": cache_dir.name}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
@@ -1,12 +1,14 @@
 import os
+import plistlib
 import tempfile
 import unittest
 from unittest import mock
 
 import pre_commit_macadmin_hooks.check_autopkg_recipes as target
+from tests.helpers import CacheTestCase
 
 
-class TestCheckAutopkgRecipes(unittest.TestCase):
+class TestCheckAutopkgRecipes(CacheTestCase):
 
     def test_build_argument_parser_returns_parser(self):
         parser = target.build_argument_parser()
@@ -284,7 +286,7 @@ class TestCheckAutopkgRecipes(unittest.TestCase):
     def test_validate_proc_args_valid_arguments_passes(self):
         # Valid arguments for a core processor should pass
         # Skip if autopkglib is not available
-        if not target.HAS_AUTOPKGLIB:
+        if target.load_autopkglib() is None:
             self.skipTest("AutoPkg library not available")
 
         # Mock the AutoPkg library functions
@@ -305,7 +307,7 @@ class TestCheckAutopkgRecipes(unittest.TestCase):
 
     def test_validate_proc_args_invalid_argument_fails(self):
         # Invalid argument for a core processor should fail
-        if not target.HAS_AUTOPKGLIB:
+        if target.load_autopkglib() is None:
             self.skipTest("AutoPkg library not available")
 
         mock_proc = mock.Mock()
@@ -333,7 +335,7 @@ class TestCheckAutopkgRecipes(unittest.TestCase):
 
     def test_validate_proc_args_ignored_arguments_passes(self):
         # Ignored arguments like "note" should pass
-        if not target.HAS_AUTOPKGLIB:
+        if target.load_autopkglib() is None:
             self.skipTest("AutoPkg library not available")
 
         mock_proc = mock.Mock()
@@ -356,7 +358,7 @@ class TestCheckAutopkgRecipes(unittest.TestCase):
 
     def test_validate_proc_args_non_core_processor_passes(self):
         # Non-core processors should be skipped
-        if not target.HAS_AUTOPKGLIB:
+        if target.load_autopkglib() is None:
             self.skipTest("AutoPkg library not available")
 
         with mock.patch.object(
@@ -373,7 +375,7 @@ class TestCheckAutopkgRecipes(unittest.TestCase):
 
     def test_validate_proc_args_processor_with_no_args_fails(self):
         # Processor that doesn't accept arguments but receives one should fail
-        if not target.HAS_AUTOPKGLIB:
+        if target.load_autopkglib() is None:
             self.skipTest("AutoPkg library not available")
 
         mock_proc = mock.Mock()
@@ -397,6 +399,40 @@ class TestCheckAutopkgRecipes(unittest.TestCase):
             calls = mock_print.call_args_list
             self.assertGreater(len(calls), 0)
 
+    def test_cache_salt_reads_autopkg_version(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            args = target.build_argument_parser().parse_args([])
+            with mock.patch.object(target, "AUTOPKG_DIR", tmpdir):
+                self.assertEqual(target.cache_salt(args), "")
+                os.mkdir(os.path.join(tmpdir, "autopkglib"))
+                with open(
+                    os.path.join(tmpdir, "autopkglib", "version.plist"), "wb"
+                ) as f:
+                    plistlib.dump({"Version": "2.7.3"}, f)
+                salt = target.cache_salt(args)
+        self.assertTrue(salt.startswith("2.7.3:"))
+
+    def test_main_duplicate_identifiers_fail(self):
+        recipe = '{"Identifier": "local.test.recipe", "Input": {}}'
+        filenames = []
+        for _ in range(2):
+            with tempfile.NamedTemporaryFile(
+                "w", delete=False, suffix=".recipe.json"
+            ) as tf:
+                tf.write(recipe)
+            filenames.append(tf.name)
+        try:
+            with mock.patch("builtins.print") as mock_print:
+                result = target.main(filenames)
+            self.assertEqual(result, 1)
+            mock_print.assert_any_call(
+                f'{filenames[1]}: Identifier "local.test.recipe" is shared by '
+                "another recipe in this repo."
+            )
+        finally:
+            for filename in filenames:
+                os.unlink(filename)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,230 @@
+import os
+import plistlib
+import tempfile
+import unittest
+from unittest import mock
+
+import pre_commit_macadmin_hooks.check_munki_manifests as target
+
+
+class TestCheckMunkiManifests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.repo = os.path.join(self.tempdir.name, "repo")
+        for folder in ("pkgsinfo", "manifests/groups"):
+            os.makedirs(os.path.join(self.repo, folder))
+        patcher = mock.patch.dict(
+            os.environ,
+            {"PRE_COMMIT_MACADMIN_CACHE_DIR": os.path.join(self.tempdir.name, "cache")},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        pkginfos = [
+            {"name": "Firefox", "version": "120.0", "catalogs": ["testing"]},
+            {"name": "Firefox", "version": "119.0", "catalogs": ["production"]},
+            {"name": "Slack", "version": "4.0", "catalogs": ["production"]},
+        ]
+        for index, pkginfo in enumerate(pkginfos):
+            self.write_plist(f"pkgsinfo/{index}.plist", pkginfo)
+        self.write_plist("manifests/groups/site", {"managed_installs": ["Slack"]})
+
+    def write_plist(self, relpath, data):
+        path = os.path.join(self.repo, relpath)
+        with open(path, "wb") as f:
+            plistlib.dump(data, f)
+        return path
+
+    def run_main(self, manifest):
+        path = self.write_plist("manifests/machine", manifest)
+        with mock.patch("builtins.print") as mock_print:
+            retval = target.main(["--munki-repo", self.repo, "--jobs", "1", path])
+        return retval, [c.args[0].split(": ", 1)[1] for c in mock_print.call_args_list]
+
+    def test_valid_manifest(self):
+        manifest = {
+            "catalogs": ["production"],
+            "included_manifests": ["groups/site"],
+            "managed_installs": ["Firefox", "Slack-4.0.0"],
+            "optional_installs": ["Firefox-119.0"],
+            "conditional_items": [
+                {
+                    "condition": "machine_type == 'laptop'",
+                    "conditional_items": [{"managed_updates": ["Slack"]}],
+                }
+            ],
+        }
+        self.assertEqual(self.run_main(manifest), (0, []))
+
+    def test_items_not_in_catalogs(self):
+        manifest = {
+            "catalogs": ["production", "missing"],
+            "included_manifests": ["groups/missing"],
+            "managed_installs": ["Firefox-120.0", "Zoom"],
+            "conditional_items": [{"featured_items": ["Chrome", 1]}],
+        }
+        retval, output = self.run_main(manifest)
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output,
+            [
+                'catalog "missing" does not contain any pkginfo',
+                'included manifest "groups/missing" does not exist',
+                'managed_installs item "Firefox-120.0" was not found in catalogs: '
+                "production",
+                'managed_installs item "Zoom" was not found in catalogs: production',
+                'featured_items item "Chrome" was not found in catalogs: production',
+                "featured_items contains a non-string item: 1",
+            ],
+        )
+
+    def test_manifest_without_catalogs_is_not_resolved(self):
+        self.assertEqual(self.run_main({"managed_installs": ["Zoom"]}), (0, []))
+
+    def test_invalid_manifest(self):
+        self.assertEqual(
+            self.run_main({"catalogs": "production", "managed_installs": "Slack"}),
+            (1, ["catalogs should be an array", "managed_installs should be an array"]),
+        )
+        path = os.path.join(self.repo, "manifests", "bad")
+        with open(path, "w") as f:
+            f.write("not a plist")
+        with mock.patch("builtins.print") as mock_print:
+            self.assertEqual(target.main(["--munki-repo", self.repo, path]), 1)
+        self.assertIn("plist parsing error", mock_print.call_args.args[0])
+
+    def test_conditions(self):
+        manifest = {
+            "conditional_items": [
+                {
+                    "condition": "machine_type == 'laptop' AND has_vpn == TRUE",
+                    "conditional_items": [{"condition": "arch = "}, {"condition": 1}],
+                }
+            ]
+        }
+        self.assertEqual(
+            self.run_main(manifest),
+            (
+                1,
+                [
+                    "WARNING: conditional_items condition uses unknown condition "
+                    '"has_vpn"',
+                    "conditional_items condition is not a valid predicate: expected "
+                    "a value or attribute but found end of condition at position 7",
+                    "conditional_items condition should be a string",
+                ],
+            ),
+        )
+
+    def test_nested_includes_use_includer_catalogs(self):
+        self.write_plist(
+            "manifests/groups/department",
+            {"included_manifests": ["groups/site"], "managed_installs": ["Zoom"]},
+        )
+        self.write_plist(
+            "manifests/groups/other-site",
+            {"catalogs": ["testing"], "managed_installs": ["Zoom"]},
+        )
+        retval, output = self.run_main(
+            {
+                "catalogs": ["production"],
+                "included_manifests": ["groups/department", "groups/other-site"],
+            }
+        )
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output,
+            [
+                'managed_installs item "Zoom" in included manifest "groups/department" '
+                "was not found in catalogs: production"
+            ],
+        )
+
+    def test_include_cycles_and_missing_includes(self):
+        self.write_plist(
+            "manifests/groups/a",
+            {"included_manifests": ["groups/b", "groups/missing"]},
+        )
+        self.write_plist("manifests/groups/b", {"included_manifests": ["groups/a"]})
+        retval, output = self.run_main(
+            {"catalogs": ["production"], "included_manifests": ["groups/b"]}
+        )
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output,
+            [
+                "included manifests form a cycle: groups/a -> groups/b -> groups/a",
+                'included manifest "groups/missing" (included by "groups/a") does not '
+                "exist",
+            ],
+        )
+
+    def test_shared_includes_are_parsed_once(self):
+        paths = [
+            self.write_plist(
+                f"manifests/machine{i}",
+                {"catalogs": ["production"], "included_manifests": ["groups/site"]},
+            )
+            for i in range(3)
+        ]
+        with mock.patch.object(
+            target, "load_plist", wraps=target.load_plist
+        ) as mock_load_plist:
+            retval = target.main(
+                ["--munki-repo", self.repo, "--jobs", "1", "--no-cache", *paths]
+            )
+        self.assertEqual(retval, 0)
+        loaded = [os.path.basename(c.args[0]) for c in mock_load_plist.call_args_list]
+        self.assertEqual(loaded.count("site"), 1)
+
+    def test_cached_results_depend_on_what_manifest_uses(self):
+        path = self.write_plist(
+            "manifests/machine",
+            {
+                "catalogs": ["production"],
+                "included_manifests": ["groups/site"],
+                "managed_installs": ["Firefox"],
+            },
+        )
+
+        def run():
+            with mock.patch.object(
+                target, "check_manifest", wraps=target.check_manifest
+            ) as mock_check, mock.patch("builtins.print") as mock_print:
+                retval = target.main(["--munki-repo", self.repo, "--jobs", "1", path])
+            output = [c.args[0] for c in mock_print.call_args_list]
+            return retval, output, mock_check.called
+
+        self.assertEqual(run(), (0, [], True))
+        self.assertEqual(run(), (0, [], False))
+
+        # Changes to other manifests and catalogs don't invalidate the result.
+        self.write_plist("manifests/other", {"managed_installs": ["Zoom"]})
+        self.write_plist(
+            "pkgsinfo/3.plist",
+            {"name": "Zoom", "version": "1.0", "catalogs": ["testing"]},
+        )
+        self.assertEqual(run(), (0, [], False))
+
+        # Changes to an included manifest, or to the catalogs an item is
+        # looked up in, do.
+        self.write_plist("manifests/groups/site", {"managed_installs": ["Zoom"]})
+        retval, output, checked = run()
+        self.assertEqual((retval, checked), (1, True))
+        self.assertEqual(
+            output,
+            [
+                f'{path}: managed_installs item "Zoom" in included manifest '
+                '"groups/site" was not found in catalogs: production'
+            ],
+        )
+        self.write_plist(
+            "pkgsinfo/3.plist",
+            {"name": "Zoom", "version": "1.0", "catalogs": ["production"]},
+        )
+        self.assertEqual(run(), (0, [], True))
+
+
+if __name__ == "__main__":
+    unittest.main()
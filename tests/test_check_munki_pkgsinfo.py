@@ -1,3 +1,4 @@
+import hashlib
 import os
 import plistlib
 import tempfile
@@ -5,19 +6,17 @@ import unittest
 from unittest import mock
 
 import pre_commit_macadmin_hooks.check_munki_pkgsinfo as target
+from pre_commit_macadmin_hooks.munki_repo import RepoIndex, load_repo_index
+from tests.helpers import CacheTestCase
 
 
-class TestCheckMunkiPkgsinfo(unittest.TestCase):
+class TestCheckMunkiPkgsinfo(CacheTestCase):
     def setUp(self):
+        super().setUp()
         # Patch all util functions used in main to always return True unless otherwise specified
         patcher_list = [
             "validate_required_keys",
-            "validate_pkginfo_key_types",
-            "validate_restart_action_key",
-            "validate_uninstall_method",
-            "validate_supported_architectures",
-            "detect_deprecated_keys",
-            "detect_typoed_keys",
+            "validate_pkginfo_keys",
             "validate_shebangs",
         ]
         self.patchers = []
@@ -27,17 +26,17 @@ class TestCheckMunkiPkgsinfo(unittest.TestCase):
             p.start()
         self.addCleanup(lambda: [p.stop() for p in self.patchers])
 
-        # Patch _check_case_sensitive_path to always return True
-        self.case_path_patcher = mock.patch.object(
-            target, "_check_case_sensitive_path", return_value=True
+        # Patch the repo index so installer items always exist
+        self.pkgs_item_patcher = mock.patch.object(
+            RepoIndex, "has_pkgs_item", return_value=True
         )
-        self.case_path_patcher.start()
-        self.addCleanup(self.case_path_patcher.stop)
+        self.pkgs_item_patcher.start()
+        self.addCleanup(self.pkgs_item_patcher.stop)
 
-        # Patch os.path.isfile to always return True
-        self.isfile_patcher = mock.patch("os.path.isfile", return_value=True)
-        self.isfile_patcher.start()
-        self.addCleanup(self.isfile_patcher.stop)
+        # Patch the repo index so icons always exist
+        self.icon_patcher = mock.patch.object(RepoIndex, "has_icon", return_value=True)
+        self.icon_patcher.start()
+        self.addCleanup(self.icon_patcher.stop)
 
     def make_pkginfo_file(self, pkginfo_dict):
         tmp = tempfile.NamedTemporaryFile(delete=False)
@@ -188,8 +187,8 @@ class TestCheckMunkiPkgsinfo(unittest.TestCase):
     #         os.unlink(filename)
 
     def test_missing_icon_returns_one(self):
-        # Patch os.path.isfile to return False
-        with mock.patch("os.path.isfile", return_value=False):
+        # Patch the repo index to report the icon as missing
+        with mock.patch.object(RepoIndex, "has_icon", return_value=False):
             pkginfo = {
                 "description": "desc",
                 "name": "foo",
@@ -226,6 +225,38 @@ class TestCheckMunkiPkgsinfo(unittest.TestCase):
         finally:
             os.unlink(filename)
 
+    def test_installable_condition(self):
+        pkginfo = {
+            "description": "desc",
+            "name": "foo",
+            "version": "1.0",
+            "installer_item_location": "foo.pkg",
+            "installable_condition": "machine_type == 'laptop' AND has_vpn == TRUE",
+        }
+        filename = self.make_pkginfo_file(pkginfo)
+        self.addCleanup(os.unlink, filename)
+        with mock.patch("builtins.print") as mock_print:
+            self.assertEqual(target.main([filename]), 0)
+        mock_print.assert_called_once_with(
+            f"{filename}: WARNING: installable_condition uses unknown condition "
+            '"has_vpn"'
+        )
+        with mock.patch("builtins.print"):
+            self.assertEqual(target.main(["--fail-on-unknown-conditions", filename]), 1)
+        self.assertEqual(
+            target.main(["--valid-conditions", "has_vpn", "--", filename]), 0
+        )
+
+        pkginfo["installable_condition"] = "machine_type = laptop'"
+        filename = self.make_pkginfo_file(pkginfo)
+        self.addCleanup(os.unlink, filename)
+        with mock.patch("builtins.print") as mock_print:
+            self.assertEqual(target.main([filename]), 1)
+        mock_print.assert_called_once_with(
+            f"{filename}: installable_condition is not a valid predicate: "
+            "unterminated string at position 21"
+        )
+
     def test_duplicate_import_returns_one(self):
         pkginfo = {
             "description": "desc",
@@ -241,6 +272,10 @@ class TestCheckMunkiPkgsinfo(unittest.TestCase):
             argv = [filename]
             ret = target.main(argv)
             self.assertEqual(ret, 1)
+            # Suffixes are ignored when duplicates are found by content.
+            argv = ["--detect-duplicate-installers", filename]
+            ret = target.main(argv)
+            self.assertEqual(ret, 0)
         finally:
             os.unlink(filename)
 
@@ -284,3 +319,551 @@ class TestCheckMunkiPkgsinfo(unittest.TestCase):
                 self.assertEqual(ret, 1)
             finally:
                 os.unlink(filename)
+
+
+class TestRepoChecks(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.repo = os.path.join(self.tempdir.name, "repo")
+        os.makedirs(os.path.join(self.repo, "pkgsinfo", "apps"))
+        self.pkginfos = []
+        patcher = mock.patch.dict(
+            os.environ,
+            {"PRE_COMMIT_MACADMIN_CACHE_DIR": os.path.join(self.tempdir.name, "cache")},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_pkginfo(self, relpath, pkginfo):
+        path = os.path.join(self.repo, "pkgsinfo", relpath)
+        with open(path, "wb") as f:
+            plistlib.dump(pkginfo, f)
+        self.pkginfos.append(path)
+        return path
+
+    def check(self, *argv, checker=target.check_dependencies, filenames=None):
+        if filenames is None:
+            filenames = self.pkginfos
+        args = target.build_argument_parser().parse_args(
+            ["--munki-repo", self.repo, "--jobs", "1", *argv, *filenames]
+        )
+        with mock.patch("builtins.print") as mock_print:
+            retval = checker(target.load_repo_entries(self.repo), args)
+        return retval, [c.args[0] for c in mock_print.call_args_list]
+
+    def test_resolves_names_and_versions(self):
+        self.write_pkginfo("apps/Foo.plist", {"name": "Foo", "version": "2.0.0"})
+        self.write_pkginfo(
+            "apps/Bar.plist",
+            {
+                "name": "Bar",
+                "requires": ["Foo", "Foo-2.0"],
+                "update_for": ["Foo--2.0.0.0"],
+            },
+        )
+        self.write_pkginfo("apps/Foo-Bar.plist", {"name": "Foo-1", "requires": []})
+        self.write_pkginfo("apps/Baz.plist", {"name": "Baz", "requires": ["Foo-1"]})
+        self.assertEqual(self.check(), (0, []))
+
+    def test_missing_dependencies(self):
+        path = self.write_pkginfo(
+            "Bar.plist",
+            {"name": "Bar", "requires": ["Foo-3.0"], "update_for": ["Qux"]},
+        )
+        foo = self.write_pkginfo("Foo.plist", {"name": "Foo", "version": "2.0"})
+        retval, output = self.check()
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output,
+            [
+                f'{path}: requires item "Foo-3.0" does not match any pkginfo in the repo',
+                f'{path}: update_for item "Qux" does not match any pkginfo in the repo',
+            ],
+        )
+        retval, output = self.check("--warn-on-missing-dependencies")
+        self.assertEqual(retval, 0)
+        self.assertTrue(output[0].startswith(f"{path}: WARNING: requires item"))
+
+        # Problems in pkginfos that aren't being checked aren't reported.
+        self.assertEqual(self.check(filenames=[foo]), (0, []))
+
+    def test_cycles(self):
+        self.write_pkginfo("A.plist", {"name": "A", "requires": ["B"]})
+        self.write_pkginfo("B-1.plist", {"name": "B", "version": "1"})
+        self.write_pkginfo(
+            "B-2.plist", {"name": "B", "version": "2", "requires": ["C"]}
+        )
+        path_c = self.write_pkginfo("C.plist", {"name": "C", "requires": ["A-1"]})
+        path_a1 = self.write_pkginfo("A-1.plist", {"name": "A", "version": "1"})
+        path_d = self.write_pkginfo("D.plist", {"name": "D", "update_for": ["D"]})
+        retval, output = self.check()
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output,
+            [
+                f"{os.path.join(self.repo, 'pkgsinfo', 'A.plist')}: requires "
+                "items form a cycle: A, B, C",
+                f"{path_d}: update_for items form a cycle: D",
+            ],
+        )
+
+        # Cycles are reported for the first pkginfo being checked with a
+        # reference in them.
+        self.assertEqual(
+            self.check(filenames=[path_c, path_a1]),
+            (1, [f"{path_c}: requires items form a cycle: A, B, C"]),
+        )
+        self.assertEqual(self.check(filenames=[path_a1]), (0, []))
+
+    def test_duplicates(self):
+        other = self.write_pkginfo(
+            "apps/Foo-1.0.plist",
+            {"name": "Foo", "version": "1.0", "catalogs": ["testing", "production"]},
+        )
+        path = self.write_pkginfo(
+            "apps/Foo-1.0__1.plist",
+            {"name": "Foo", "version": "1.0.0", "catalogs": ["production"]},
+        )
+        self.write_pkginfo(
+            "apps/Foo-1.0__2.plist",
+            {"name": "Foo", "version": "1.0", "catalogs": ["development"]},
+        )
+        newer = self.write_pkginfo(
+            "apps/Foo-1.1.plist",
+            {"name": "Foo", "version": "1.1", "catalogs": ["production"]},
+        )
+        retval, output = self.check(checker=target.check_duplicates)
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output,
+            [
+                f"{path}: has the same name and version as {other}, and both are "
+                "in catalogs: production"
+            ],
+        )
+        retval, output = self.check(
+            "--warn-on-duplicate-imports", checker=target.check_duplicates
+        )
+        self.assertEqual(retval, 0)
+        self.assertTrue(output[0].startswith(f"{path}: WARNING: has the same"))
+
+        # Duplicates are reported for the pkginfo being checked, and only if
+        # there is one.
+        self.assertEqual(
+            self.check(checker=target.check_duplicates, filenames=[other]),
+            (
+                1,
+                [
+                    f"{other}: has the same name and version as {path}, and both "
+                    "are in catalogs: production"
+                ],
+            ),
+        )
+        self.assertEqual(
+            self.check(checker=target.check_duplicates, filenames=[newer]), (0, [])
+        )
+
+    def test_downgrades(self):
+        self.write_pkginfo(
+            "apps/Foo-1.10.plist",
+            {"name": "Foo", "version": "1.10", "catalogs": ["testing", "production"]},
+        )
+        path = self.write_pkginfo(
+            "apps/Foo-1.9.plist",
+            {"name": "Foo", "version": "1.9", "catalogs": ["production", "testing"]},
+        )
+        newer = self.write_pkginfo(
+            "apps/Foo-2.0.plist",
+            {"name": "Foo", "version": "2.0", "catalogs": ["testing"]},
+        )
+        with mock.patch.object(
+            target, "list_added_files", return_value={path, newer}
+        ) as mock_added:
+            retval, output = self.check(
+                checker=target.check_downgrades, filenames=[path, newer]
+            )
+        mock_added.assert_called_once_with(self.repo)
+        self.assertEqual(retval, 1)
+        other = os.path.join(self.repo, "pkgsinfo", "apps", "Foo-1.10.plist")
+        self.assertEqual(
+            output,
+            [
+                f"{path}: version 1.9 is lower than version 1.10 ({other}) in "
+                'catalog "production", so clients will ignore it',
+                f"{path}: version 1.9 is lower than version 2.0 ({newer}) in "
+                'catalog "testing", so clients will ignore it',
+            ],
+        )
+
+        # Pkginfos that aren't being added aren't checked.
+        with mock.patch.object(target, "list_added_files", return_value={newer}):
+            self.assertEqual(
+                self.check(checker=target.check_downgrades, filenames=[path, newer]),
+                (0, []),
+            )
+        with mock.patch.object(target, "list_added_files", return_value={path}):
+            retval, output = self.check(
+                "--warn-on-downgrades",
+                checker=target.check_downgrades,
+                filenames=[path],
+            )
+        self.assertEqual(retval, 0)
+        self.assertTrue(output[0].startswith(f"{path}: WARNING: version 1.9"))
+
+    def test_ownership_collisions(self):
+        receipts = [{"packageid": "com.example.foo"}]
+        installs = [{"path": "/Applications/Foo.app"}]
+        first = self.write_pkginfo(
+            "apps/Foo-1.plist",
+            {"name": "Foo", "version": "1", "receipts": receipts, "installs": installs},
+        )
+        second = self.write_pkginfo(
+            "apps/Foo-2.plist",
+            {"name": "Foo", "version": "2", "receipts": receipts, "installs": installs},
+        )
+        path = self.write_pkginfo(
+            "apps/FooBeta.plist",
+            {
+                "name": "FooBeta",
+                "receipts": [*receipts, *receipts],
+                "installs": [{"path": "/applications/foo.app/"}],
+            },
+        )
+        bar = self.write_pkginfo(
+            "apps/Bar.plist",
+            {
+                "name": "Bar",
+                "receipts": [{"packageid": "com.example.foo", "optional": True}],
+            },
+        )
+        retval, output = self.check(checker=target.check_ownership)
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output,
+            [
+                f'{path}: receipt "com.example.foo" is also claimed by "Foo" '
+                f"({first})",
+                f'{path}: installs path "/applications/foo.app/" is also claimed by '
+                f'"Foo" ({first})',
+            ],
+        )
+        retval, output = self.check(
+            "--warn-on-ownership-collisions", checker=target.check_ownership
+        )
+        self.assertEqual(retval, 0)
+        self.assertTrue(output[0].startswith(f"{path}: WARNING: receipt"))
+
+        # Collisions are reported for the pkginfo being checked, and only if
+        # there is one.
+        self.assertEqual(
+            self.check(checker=target.check_ownership, filenames=[second]),
+            (
+                1,
+                [
+                    f'{second}: receipt "com.example.foo" is also claimed by '
+                    f'"FooBeta" ({path})',
+                    f'{second}: installs path "/Applications/Foo.app" is also '
+                    f'claimed by "FooBeta" ({path})',
+                ],
+            ),
+        )
+        self.assertEqual(
+            self.check(checker=target.check_ownership, filenames=[bar]), (0, [])
+        )
+
+    def test_overlapping_copies(self):
+        def copies(*destinations):
+            return [
+                {"destination_path": path, "source_item": f"src/{item}"}
+                for path, item in destinations
+            ]
+
+        self.write_pkginfo(
+            "apps/Foo-1.plist",
+            {"name": "Foo", "items_to_copy": copies(("/Applications", "Foo.app"))},
+        )
+        second = self.write_pkginfo(
+            "apps/Foo-2.plist",
+            {"name": "Foo", "items_to_copy": copies(("/Applications/", "Foo.app"))},
+        )
+        path = self.write_pkginfo(
+            "apps/Plugin.plist",
+            {
+                "name": "Plugin",
+                "items_to_copy": copies(
+                    ("/Applications/Foo.app/Contents/PlugIns", "Plugin.bundle"),
+                    ("/Applications", "Foo.app"),
+                    ("/Library/Plugin", "Plugin.bundle"),
+                ),
+            },
+        )
+        retval, output = self.check(checker=target.check_copy_destinations)
+        self.assertEqual(retval, 1)
+        other = os.path.join(self.repo, "pkgsinfo", "apps", "Foo-1.plist")
+        self.assertEqual(
+            output,
+            [
+                f'{path}: items_to_copy destination "/Applications/Foo.app" is '
+                f'also copied to by "Foo" ({other})',
+                f'{path}: items_to_copy destination "/Applications/Foo.app/Contents/'
+                'PlugIns/Plugin.bundle" is inside "/Applications/Foo.app", which is '
+                f'copied by "Foo" ({other})',
+            ],
+        )
+        retval, output = self.check(
+            "--warn-on-overlapping-copies", checker=target.check_copy_destinations
+        )
+        self.assertEqual(retval, 0)
+        self.assertTrue(output[0].startswith(f"{path}: WARNING: items_to_copy"))
+
+        # Overlaps are reported for the pkginfo being checked, and only if
+        # there is one.
+        self.assertEqual(
+            self.check(checker=target.check_copy_destinations, filenames=[second]),
+            (
+                1,
+                [
+                    f'{second}: items_to_copy destination "/Applications/Foo.app" '
+                    'contains "/Applications/Foo.app/Contents/PlugIns/'
+                    f'Plugin.bundle", which is copied by "Plugin" ({path})',
+                    f'{second}: items_to_copy destination "/Applications/Foo.app" '
+                    f'is also copied to by "Plugin" ({path})',
+                ],
+            ),
+        )
+        self.assertEqual(
+            self.check(checker=target.check_copy_destinations, filenames=[]), (0, [])
+        )
+
+    def test_duplicate_installers(self):
+        pkgs = {
+            "apps/Foo-1.0.dmg": b"foo",
+            "apps/Foo-1.0__1.dmg": b"new",
+            "apps/FooCopy.dmg": b"foo",
+            "apps/Bar.dmg": b"bar",
+            "apps/Empty.dmg": b"",
+            "apps/Empty2.dmg": b"",
+            "apps/Unused.dmg": b"foo",
+        }
+        for location, data in pkgs.items():
+            os.makedirs(os.path.join(self.repo, "pkgs", "apps"), exist_ok=True)
+            with open(os.path.join(self.repo, "pkgs", location), "wb") as f:
+                f.write(data)
+        oid = hashlib.sha256(b"big" * 1000).hexdigest()
+        for location in ("apps/Big.dmg", "apps/BigCopy.dmg"):
+            with open(os.path.join(self.repo, "pkgs", location), "w") as f:
+                f.write(
+                    "version https://git-lfs.github.com/spec/v1\n"
+                    f"oid sha256:{oid}\nsize 3000\n"
+                )
+        first = self.write_pkginfo(
+            "apps/Foo-1.0.plist",
+            {"name": "Foo", "installer_item_location": "apps/Foo-1.0.dmg"},
+        )
+        self.write_pkginfo(
+            "apps/Foo-1.0__1.plist",
+            {"name": "Foo", "installer_item_location": "apps/Foo-1.0__1.dmg"},
+        )
+        path = self.write_pkginfo(
+            "apps/FooCopy.plist",
+            {
+                "name": "FooCopy",
+                "installer_item_location": "apps/FooCopy.dmg",
+                "uninstaller_item_location": "apps/Foo-1.0.dmg",
+            },
+        )
+        self.write_pkginfo(
+            "apps/Bar.plist", {"name": "Bar", "installer_item_location": "apps/Bar.dmg"}
+        )
+        for name in ("Empty", "Empty2", "Big", "BigCopy"):
+            self.write_pkginfo(
+                f"apps/{name}.plist",
+                {"name": name, "installer_item_location": f"apps/{name}.dmg"},
+            )
+        load_repo_index(self.repo, refresh=True)
+        with mock.patch.object(
+            target, "hash_files", wraps=target.hash_files
+        ) as mock_hash:
+            retval, output = self.check(
+                "--detect-duplicate-installers",
+                checker=target.check_duplicate_installers,
+            )
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output,
+            [
+                f"{os.path.join(self.repo, 'pkgsinfo', 'apps', 'BigCopy.plist')}: "
+                'installer item "apps/BigCopy.dmg" is identical to "apps/Big.dmg" '
+                f"(used by {os.path.join(self.repo, 'pkgsinfo', 'apps', 'Big.plist')})",
+                f'{path}: installer item "apps/FooCopy.dmg" is identical to '
+                f'"apps/Foo-1.0.dmg" (used by {first})',
+            ],
+        )
+        # Only the items of the same size as another are hashed.
+        hashed = sorted(os.path.basename(p) for p in mock_hash.call_args.args[0])
+        self.assertEqual(
+            hashed, ["Bar.dmg", "Foo-1.0.dmg", "Foo-1.0__1.dmg", "FooCopy.dmg"]
+        )
+
+        # Duplicates that don't include an item used by a pkginfo being checked
+        # aren't reported. Items of the same size as one that is used are still
+        # hashed.
+        bar = os.path.join(self.repo, "pkgsinfo", "apps", "Bar.plist")
+        big = os.path.join(self.repo, "pkgsinfo", "apps", "Big.plist")
+        with mock.patch.object(
+            target, "hash_files", wraps=target.hash_files
+        ) as mock_hash:
+            self.assertEqual(
+                self.check(
+                    "--detect-duplicate-installers",
+                    checker=target.check_duplicate_installers,
+                    filenames=[bar],
+                ),
+                (0, []),
+            )
+        hashed = sorted(os.path.basename(p) for p in mock_hash.call_args.args[0])
+        self.assertEqual(
+            hashed, ["Bar.dmg", "Foo-1.0.dmg", "Foo-1.0__1.dmg", "FooCopy.dmg"]
+        )
+        retval, output = self.check(
+            "--detect-duplicate-installers",
+            checker=target.check_duplicate_installers,
+            filenames=[big],
+        )
+        self.assertEqual(retval, 1)
+        self.assertEqual(len(output), 1)
+        self.assertTrue(output[0].endswith(f"(used by {big})"))
+
+    def test_main_checks_dependencies(self):
+        path = self.write_pkginfo("Bar.plist", {"name": "Bar", "requires": ["Foo"]})
+        with mock.patch.object(target, "check_pkginfo", return_value=0), mock.patch(
+            "builtins.print"
+        ) as mock_print:
+            retval = target.main(["--munki-repo", self.repo, path])
+        self.assertEqual(retval, 1)
+        mock_print.assert_called_once_with(
+            f'{path}: requires item "Foo" does not match any pkginfo in the repo'
+        )
+
+    def test_cached_results_depend_on_referenced_items(self):
+        for folder in ("pkgs/apps", "icons"):
+            os.makedirs(os.path.join(self.repo, folder))
+        for relpath in ("pkgs/apps/Foo.dmg", "icons/Foo.png", "pkgs/apps/Bar.dmg"):
+            with open(os.path.join(self.repo, relpath), "wb"):
+                pass
+        path = self.write_pkginfo(
+            "Foo.plist",
+            {
+                "name": "Foo",
+                "version": "1.0",
+                "description": "Foo",
+                "installer_item_location": "apps/Foo.dmg",
+            },
+        )
+        argv = ["--munki-repo", self.repo, "--jobs", "1", path]
+
+        def run_main():
+            with mock.patch.object(
+                target, "check_pkginfo", wraps=target.check_pkginfo
+            ) as mock_check, mock.patch("builtins.print") as mock_print:
+                retval = target.main(argv)
+            output = [c.args[0].split(": ", 1)[1] for c in mock_print.call_args_list]
+            return retval, output, mock_check.call_count
+
+        self.assertEqual(run_main(), (0, [], 1))
+        # Items the pkginfo doesn't refer to don't invalidate its result.
+        os.unlink(os.path.join(self.repo, "pkgs/apps/Bar.dmg"))
+        self.assertEqual(run_main(), (0, [], 0))
+        os.unlink(os.path.join(self.repo, "pkgs/apps/Foo.dmg"))
+        self.assertEqual(
+            run_main(),
+            (1, ["installer item does not exist or path is not case sensitive"], 1),
+        )
+        os.unlink(os.path.join(self.repo, "icons/Foo.png"))
+        self.assertEqual(run_main()[1][-1], "missing icon")
+
+
+class TestCheckInstallerHashes(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.repo = self.tempdir.name
+        os.makedirs(os.path.join(self.repo, "pkgs"))
+        os.makedirs(os.path.join(self.repo, "pkgsinfo"))
+        patcher = mock.patch.dict(
+            os.environ,
+            {"PRE_COMMIT_MACADMIN_CACHE_DIR": os.path.join(self.repo, "cache")},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.data = b"x" * 4096
+        with open(os.path.join(self.repo, "pkgs", "Foo.dmg"), "wb") as f:
+            f.write(self.data)
+
+    def check(self, pkginfo):
+        path = os.path.join(self.repo, "pkgsinfo", "Foo.plist")
+        with open(path, "wb") as f:
+            plistlib.dump({"name": "Foo", **pkginfo}, f)
+        args = target.build_argument_parser().parse_args(
+            ["--munki-repo", self.repo, "--verify-installer-hashes", path]
+        )
+        load_repo_index(self.repo, refresh=True)
+        with mock.patch("builtins.print") as mock_print:
+            retval = target.check_installer_hashes(args)
+        return retval, [c.args[0].split(": ", 1)[1] for c in mock_print.call_args_list]
+
+    def test_matching_hash_and_size(self):
+        pkginfo = {
+            "installer_item_location": "Foo.dmg",
+            "installer_item_hash": hashlib.sha256(self.data).hexdigest(),
+            "installer_item_size": 4,
+        }
+        self.assertEqual(self.check(pkginfo), (0, []))
+
+    def test_size_mismatch_is_not_hashed(self):
+        pkginfo = {
+            "installer_item_location": "Foo.dmg",
+            "installer_item_hash": "0" * 64,
+            "installer_item_size": 5,
+        }
+        with mock.patch.object(target, "hash_files", return_value={}) as mock_hash:
+            retval, output = self.check(pkginfo)
+        self.assertEqual(retval, 1)
+        self.assertEqual(output, ["installer_item_size is 5 KB, but Foo.dmg is 4 KB"])
+        mock_hash.assert_called_once_with([], jobs=mock.ANY, use_cache=True)
+
+    def test_hash_mismatch(self):
+        pkginfo = {
+            "uninstaller_item_location": "Foo.dmg",
+            "uninstaller_item_hash": "0" * 64,
+        }
+        self.assertEqual(
+            self.check(pkginfo), (1, ["uninstaller_item_hash does not match Foo.dmg"])
+        )
+
+    def test_lfs_pointer(self):
+        oid = hashlib.sha256(b"y" * 10240).hexdigest()
+        with open(os.path.join(self.repo, "pkgs", "Foo.dmg"), "w") as f:
+            f.write(
+                "version https://git-lfs.github.com/spec/v1\n"
+                f"oid sha256:{oid}\nsize 10240\n"
+            )
+        pkginfo = {
+            "installer_item_location": "Foo.dmg",
+            "installer_item_hash": oid,
+            "installer_item_size": 10,
+        }
+        with mock.patch.object(target, "hash_files", return_value={}) as mock_hash:
+            self.assertEqual(self.check(pkginfo), (0, []))
+            pkginfo["installer_item_hash"] = "0" * 64
+            self.assertEqual(
+                self.check(pkginfo), (1, ["installer_item_hash does not match Foo.dmg"])
+            )
+            pkginfo["installer_item_size"] = 4
+            self.assertEqual(
+                self.check(pkginfo),
+                (1, ["installer_item_size is 4 KB, but Foo.dmg is 10 KB"]),
+            )
+        for call in mock_hash.call_args_list:
+            self.assertEqual(call.args[0], [])
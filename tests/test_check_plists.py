@@ -1,13 +1,13 @@
 import os
 import plistlib
 import tempfile
-import unittest
 from unittest import mock
 
 import pre_commit_macadmin_hooks.check_plists as target
+from tests.helpers import CacheTestCase
 
 
-class TestCheckPlists(unittest.TestCase):
+class TestCheckPlists(CacheTestCase):
 
     def test_build_argument_parser(self):
         parser = target.build_argument_parser()
@@ -2,13 +2,13 @@ import argparse
 import os
 import plistlib
 import tempfile
-import unittest
 from unittest import mock
 
 import pre_commit_macadmin_hooks.check_preference_manifests as target
+from tests.helpers import CacheTestCase
 
 
-class TestCheckPreferenceManifests(unittest.TestCase):
+class TestCheckPreferenceManifests(CacheTestCase):
     def test_build_argument_parser_returns_parser(self):
         parser = target.build_argument_parser()
         self.assertIsInstance(parser, argparse.ArgumentParser)
@@ -1,13 +1,13 @@
 import os
 import plistlib
 import tempfile
-import unittest
 from unittest import mock
 
 import pre_commit_macadmin_hooks.forbid_autopkg_overrides as target
+from tests.helpers import CacheTestCase
 
 
-class TestForbidAutoPkgOverrides(unittest.TestCase):
+class TestForbidAutoPkgOverrides(CacheTestCase):
 
     def test_build_argument_parser_no_args(self):
         parser = target.build_argument_parser()
@@ -1,10 +1,10 @@
-import unittest
 from unittest import mock
 
 import pre_commit_macadmin_hooks.forbid_autopkg_trust_info as target
+from tests.helpers import CacheTestCase
 
 
-class TestForbidAutoPkgTrustInfo(unittest.TestCase):
+class TestForbidAutoPkgTrustInfo(CacheTestCase):
     def test_build_argument_parser(self):
         parser = target.build_argument_parser()
         args = parser.parse_args(["file1", "file2"])
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pre_commit_macadmin_hooks.hook_client as target
+
+
+class TestHookClient(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.socket_path = os.path.join(self.tempdir.name, "missing.sock")
+        patcher = mock.patch.dict(
+            os.environ, {"PRE_COMMIT_MACADMIN_SOCKET": self.socket_path}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_build_argument_parser(self):
+        parser = target.build_argument_parser()
+        args = parser.parse_args(["check-plists", "--no-cache", "--", "a.plist"])
+        self.assertEqual(args.hook, "check-plists")
+        self.assertEqual(args.hook_args, ["--no-cache", "--", "a.plist"])
+
+    def test_get_socket_path(self):
+        self.assertEqual(target.get_socket_path(), self.socket_path)
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": "/run/user/501"}):
+            del os.environ["PRE_COMMIT_MACADMIN_SOCKET"]
+            self.assertEqual(
+                target.get_socket_path(),
+                f"/run/user/501/pre-commit-macadmin-{os.getuid()}/hooks.sock",
+            )
+
+    def test_is_private_dir(self):
+        self.assertTrue(target.is_private_dir(self.tempdir.name))
+        os.chmod(self.tempdir.name, 0o755)
+        self.assertFalse(target.is_private_dir(self.tempdir.name))
+        self.assertFalse(target.is_private_dir(self.socket_path))
+        with mock.patch("os.getuid", return_value=os.getuid() + 1):
+            os.chmod(self.tempdir.name, 0o700)
+            self.assertFalse(target.is_private_dir(self.tempdir.name))
+
+    def test_is_hook_env(self):
+        for name in ("PATH", "GIT_INDEX_FILE", "LC_ALL", "PRE_COMMIT_FROM_REF"):
+            with self.subTest(name=name):
+                self.assertTrue(target.is_hook_env(name))
+        for name in ("GITHUB_TOKEN", "AWS_SECRET_ACCESS_KEY", "SSH_AUTH_SOCK"):
+            with self.subTest(name=name):
+                self.assertFalse(target.is_hook_env(name))
+
+    def test_no_server(self):
+        self.assertIsNone(target.run_remote("check-plists", []))
+
+    @mock.patch("pre_commit_macadmin_hooks.check_plists.main", return_value=1)
+    def test_runs_locally_without_server(self, mock_main):
+        self.assertEqual(target.main(["check-plists", "a.plist"]), 1)
+        mock_main.assert_called_once_with(["a.plist"])
+
+    def test_unknown_hook(self):
+        for hook in ("check-nothing", "util", "hook-client", "../util"):
+            with self.subTest(hook=hook):
+                with mock.patch("sys.stderr"):
+                    with self.assertRaises(SystemExit):
+                        target.main([hook])
+
+
+if __name__ == "__main__":
+    unittest.main()
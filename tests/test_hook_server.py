@@ -0,0 +1,180 @@
+import io
+import os
+import plistlib
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pre_commit_macadmin_hooks.hook_server as target
+from pre_commit_macadmin_hooks import hook_client
+
+
+class TestHookServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.socket_path = os.path.join(self.tempdir.name, "hooks.sock")
+        patcher = mock.patch.dict(
+            os.environ,
+            {
+                "PRE_COMMIT_MACADMIN_SOCKET": self.socket_path,
+                "PRE_COMMIT_MACADMIN_CACHE_DIR": self.tempdir.name,
+            },
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.server = target.HookServer(
+            self.socket_path,
+            {
+                "check-plists": "pre_commit_macadmin_hooks.check_plists",
+                "forbid-autopkg-trust-info": (
+                    "pre_commit_macadmin_hooks.forbid_autopkg_trust_info"
+                ),
+            },
+        )
+        self.server.timeout = 0.1
+        self.addCleanup(self.server.server_close)
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.start()
+        self.addCleanup(self.stop)
+
+    def serve(self):
+        while not self.server.done:
+            self.server.handle_request()
+
+    def stop(self):
+        self.server.done = True
+        self.thread.join()
+
+    def run_client(self, hook, argv):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch("sys.stdout", stdout), mock.patch("sys.stderr", stderr):
+            retval = hook_client.run_remote(hook, argv)
+        return retval, stdout.getvalue(), stderr.getvalue()
+
+    def test_get_hooks(self):
+        hooks = target.get_hooks()
+        if not hooks:
+            self.skipTest("package entry points are not installed")
+        self.assertEqual(
+            hooks["check-plists"], "pre_commit_macadmin_hooks.check_plists"
+        )
+        self.assertNotIn("macadmin-hook", hooks)
+        self.assertNotIn("macadmin-hook-server", hooks)
+
+    def test_socket_permissions(self):
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o077, 0)
+
+    def test_runs_hook_in_client_cwd(self):
+        with open(os.path.join(self.tempdir.name, "good.plist"), "wb") as f:
+            plistlib.dump({"foo": "bar"}, f)
+        with open(os.path.join(self.tempdir.name, "bad.plist"), "w") as f:
+            f.write("not a plist")
+        cwd = os.getcwd()
+        os.chdir(self.tempdir.name)
+        try:
+            retval, stdout, _ = self.run_client(
+                "check-plists", ["--no-cache", "good.plist", "bad.plist"]
+            )
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(retval, 1)
+        self.assertIn("bad.plist: plist parsing error", stdout)
+        self.assertNotIn("good.plist", stdout)
+        self.assertEqual(os.getcwd(), cwd)
+
+    def test_argument_errors(self):
+        retval, _, stderr = self.run_client("check-plists", ["--bogus"])
+        self.assertEqual(retval, 2)
+        self.assertIn("check-plists: error: unrecognized arguments: --bogus", stderr)
+
+    def test_client_environment(self):
+        with mock.patch.dict(os.environ, {"PRE_COMMIT_EXAMPLE": "1"}):
+            with mock.patch(
+                "pre_commit_macadmin_hooks.check_plists.main",
+                side_effect=lambda argv: int(os.environ.get("PRE_COMMIT_EXAMPLE", 0)),
+            ):
+                retval, _, _ = self.run_client("check-plists", [])
+        self.assertEqual(retval, 1)
+        self.assertNotIn("PRE_COMMIT_EXAMPLE", os.environ)
+
+    def test_only_hook_environment_sent(self):
+        client_env = {"PRE_COMMIT_FROM_REF": "HEAD", "EXAMPLE_TOKEN": "secret"}
+        with mock.patch.dict(os.environ, client_env):
+            with mock.patch.object(
+                target.HookRequestHandler, "run_hook", return_value=0
+            ) as mock_run_hook:
+                retval, _, _ = self.run_client("check-plists", [])
+        self.assertEqual(retval, 0)
+        env = mock_run_hook.call_args.args[3]
+        self.assertEqual(env["PRE_COMMIT_FROM_REF"], "HEAD")
+        self.assertNotIn("EXAMPLE_TOKEN", env)
+
+    def test_shared_socket_dir(self):
+        os.chmod(self.tempdir.name, 0o755)
+        with mock.patch.object(
+            self.server.RequestHandlerClass, "handle"
+        ) as mock_handle:
+            retval, stdout, stderr = self.run_client("check-plists", [])
+        self.assertIsNone(retval)
+        self.assertEqual(stdout + stderr, "")
+        mock_handle.assert_not_called()
+        with mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                target.main(["--socket", os.path.join(self.tempdir.name, "new.sock")])
+
+    def test_unknown_hook(self):
+        retval, stdout, stderr = self.run_client("check-jamf-scripts", [])
+        self.assertIsNone(retval)
+        self.assertEqual(stdout + stderr, "")
+
+    def test_out_of_date(self):
+        with mock.patch.object(target, "source_digest", return_value="new"):
+            retval, _, _ = self.run_client("check-plists", [])
+        self.assertIsNone(retval)
+        self.thread.join()
+        self.assertTrue(self.server.done)
+
+    def test_different_install(self):
+        with mock.patch.object(hook_client, "PACKAGE_DIR", self.tempdir.name):
+            retval, _, _ = self.run_client("check-plists", [])
+        self.assertIsNone(retval)
+        self.assertFalse(self.server.done)
+
+    def test_source_digest(self):
+        digest = target.source_digest(hook_client.PACKAGE_DIR)
+        self.assertTrue(digest)
+        copy = os.path.join(self.tempdir.name, "copy")
+        os.mkdir(copy)
+        for name in os.listdir(hook_client.PACKAGE_DIR):
+            if name.endswith(".py"):
+                with open(os.path.join(hook_client.PACKAGE_DIR, name), "rb") as f:
+                    data = f.read()
+                with open(os.path.join(copy, name), "wb") as f:
+                    f.write(data)
+        self.assertEqual(target.source_digest(copy), digest)
+        with open(os.path.join(copy, "util.py"), "ab") as f:
+            f.write(b"\n")
+        self.assertNotEqual(target.source_digest(copy), digest)
+
+    @mock.patch("pre_commit_macadmin_hooks.util.load_yaml")
+    @mock.patch("pre_commit_macadmin_hooks.check_autopkg_recipes.load_autopkglib")
+    def test_preload_dependencies(self, mock_load_autopkglib, mock_load_yaml):
+        target.preload_dependencies()
+        mock_load_autopkglib.assert_called_once_with()
+        mock_load_yaml.assert_called_once()
+
+        mock_load_yaml.side_effect = ImportError
+        target.preload_dependencies()
+
+    def test_already_running(self):
+        with mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                target.main(["--socket", self.socket_path])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,225 @@
+import os
+import plistlib
+import re
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pre_commit_macadmin_hooks.macadmin_check as target
+
+
+class TestMacadminCheck(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        patcher = mock.patch.dict(
+            os.environ, {"PRE_COMMIT_MACADMIN_CACHE_DIR": self.tmpdir}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def write_plist(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            plistlib.dump(data, f)
+        return path
+
+    def recipe(self, **extra):
+        recipe = {
+            "Identifier": "com.github.example.download.Foo",
+            "Input": {"NAME": "Foo"},
+            "Process": [],
+        }
+        recipe.update(extra)
+        return recipe
+
+    def test_build_argument_parser(self):
+        parser = target.build_argument_parser()
+        args = parser.parse_args(
+            ["--hooks", "check-plists", "--hook-args", "check-plists=", "--", "a"]
+        )
+        self.assertEqual(args.hooks, ["check-plists"])
+        self.assertEqual(args.hook_args, ["check-plists="])
+        self.assertEqual(args.filenames, ["a"])
+
+    def test_hooks_required(self):
+        with mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                target.main(["file.plist"])
+
+    def test_unknown_hook_args(self):
+        with mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                target.main(
+                    ["--hooks", "check-plists", "--hook-args", "check-munki-pkgsinfo="]
+                )
+
+    def test_parse_hook_args(self):
+        parser = target.build_argument_parser()
+        args = parser.parse_args(
+            [
+                "--hooks",
+                "check-plists",
+                "check-autopkg-recipes",
+                "--hook-args",
+                "check-autopkg-recipes=--strict --recipe-prefix com.example. --",
+                "--",
+                "a.plist",
+                "b.recipe",
+                "c.txt",
+            ]
+        )
+        hook_args = target.parse_hook_args(parser, args)
+        self.assertEqual(hook_args["check-plists"].filenames, ["a.plist", "b.recipe"])
+        recipe_args = hook_args["check-autopkg-recipes"]
+        self.assertEqual(recipe_args.filenames, ["b.recipe"])
+        self.assertEqual(recipe_args.recipe_prefix, ["com.example."])
+        self.assertTrue(recipe_args.strict)
+
+    def test_performance_args_apply_to_hooks(self):
+        parser = target.build_argument_parser()
+        args = parser.parse_args(
+            [
+                "--hooks",
+                "check-plists",
+                "check-munki-pkgsinfo",
+                "--hook-args",
+                "check-munki-pkgsinfo=--jobs 2",
+                "--no-cache",
+                "--jobs",
+                "1",
+            ]
+        )
+        hook_args = target.parse_hook_args(parser, args)
+        self.assertEqual(hook_args["check-plists"].jobs, 1)
+        self.assertTrue(hook_args["check-plists"].no_cache)
+        self.assertEqual(hook_args["check-munki-pkgsinfo"].jobs, 2)
+        self.assertTrue(hook_args["check-munki-pkgsinfo"].no_cache)
+
+    def test_each_file_parsed_once(self):
+        path = self.write_plist("Foo.download.recipe", self.recipe())
+        with mock.patch(
+            "pre_commit_macadmin_hooks.util.plistlib.load", wraps=plistlib.load
+        ) as mock_load:
+            retval = target.main(
+                [
+                    "--no-cache",
+                    "--hooks",
+                    "check-plists",
+                    "forbid-autopkg-overrides",
+                    "forbid-autopkg-trust-info",
+                    "--",
+                    path,
+                ]
+            )
+        self.assertEqual(retval, 0)
+        self.assertEqual(mock_load.call_count, 1)
+
+    def test_failures_reported(self):
+        override = self.write_plist(
+            "Foo.override.recipe", {"Identifier": "local.Foo", "Input": {}}
+        )
+        trusted = self.write_plist(
+            "Bar.download.recipe", self.recipe(ParentRecipeTrustInfo={})
+        )
+        with mock.patch("builtins.print") as mock_print:
+            retval = target.main(
+                [
+                    "--no-cache",
+                    "--hooks",
+                    "forbid-autopkg-overrides",
+                    "forbid-autopkg-trust-info",
+                    "--",
+                    override,
+                    trusted,
+                ]
+            )
+        self.assertEqual(retval, 1)
+        output = "".join(str(call) for call in mock_print.call_args_list)
+        self.assertIn(f"{override}: possible AutoPkg recipe override", output)
+        self.assertIn(f"{trusted}: trust info in recipe", output)
+
+    def test_invalid_plist_reported_by_each_hook(self):
+        path = os.path.join(self.tmpdir, "Foo.download.recipe")
+        with open(path, "w") as f:
+            f.write("not a plist")
+        with mock.patch("builtins.print") as mock_print:
+            retval = target.main(
+                [
+                    "--no-cache",
+                    "--hooks",
+                    "check-plists",
+                    "forbid-autopkg-trust-info",
+                    "--",
+                    path,
+                ]
+            )
+        self.assertEqual(retval, 1)
+        output = "".join(str(call) for call in mock_print.call_args_list)
+        self.assertEqual(output.count(f"{path}: plist parsing error"), 2)
+
+    def test_summarize_results(self):
+        first = self.write_plist("One.download.recipe", self.recipe())
+        second = self.write_plist("Two.download.recipe", self.recipe())
+        with mock.patch("builtins.print") as mock_print:
+            retval = target.main(
+                ["--no-cache", "--hooks", "check-autopkg-recipes", "--", first, second]
+            )
+        self.assertEqual(retval, 1)
+        output = "".join(str(call) for call in mock_print.call_args_list)
+        self.assertIn(f"{second}: Identifier", output)
+        self.assertNotIn(f"{first}: Identifier", output)
+
+    def test_manifest_checked(self):
+        hooks_file = os.path.join(
+            os.path.dirname(os.path.dirname(__file__)), ".pre-commit-hooks.yaml"
+        )
+        with open(hooks_file) as f:
+            files = re.search(
+                r"- id: macadmin-check\n(?:  .*\n)*?  files: '(.*)'", f.read()
+            ).group(1)
+        self.assertRegex("manifests/site_default", files)
+
+        repo = os.path.join(self.tmpdir, "repo")
+        os.makedirs(os.path.join(repo, "pkgsinfo"))
+        path = self.write_plist(
+            "repo/manifests/site_default",
+            {"catalogs": ["production"], "managed_installs": ["Foo"]},
+        )
+        with mock.patch("builtins.print") as mock_print:
+            retval = target.main(
+                [
+                    "--no-cache",
+                    "--hooks",
+                    "check-munki-manifests",
+                    "--hook-args",
+                    f"check-munki-manifests=--munki-repo {repo}",
+                    "--",
+                    path,
+                ]
+            )
+        self.assertEqual(retval, 1)
+        output = "".join(str(call) for call in mock_print.call_args_list)
+        self.assertIn(f'{path}: catalog "production" does not contain', output)
+
+    def test_unmatched_files_ignored(self):
+        path = os.path.join(self.tmpdir, "notes.txt")
+        with open(path, "w") as f:
+            f.write("not a plist")
+        retval = target.main(["--no-cache", "--hooks", "check-plists", "--", path])
+        self.assertEqual(retval, 0)
+
+    def test_cached_results(self):
+        path = self.write_plist("Foo.download.recipe", self.recipe())
+        argv = ["--hooks", "check-plists", "check-autopkg-recipes", "--", path]
+        self.assertEqual(target.main(argv), 0)
+        with mock.patch("pre_commit_macadmin_hooks.util.plistlib.load") as mock_load:
+            self.assertEqual(target.main(argv), 0)
+        mock_load.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
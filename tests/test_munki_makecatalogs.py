@@ -1,12 +1,17 @@
+import hashlib
+import os
+import plistlib
 import tempfile
 import unittest
 from unittest import mock
 
 import pre_commit_macadmin_hooks.munki_makecatalogs as target
+from tests.helpers import CacheTestCase
 
 
-class TestMunkiMakecatalogs(unittest.TestCase):
+class TestMunkiMakecatalogs(CacheTestCase):
     def setUp(self):
+        super().setUp()
         # Create a temporary directory to act as a fake munki repo
         self.tempdir = tempfile.TemporaryDirectory()
         self.repo_path = self.tempdir.name
@@ -22,10 +27,12 @@ class TestMunkiMakecatalogs(unittest.TestCase):
         mock_isfile.return_value = True
         mock_call.return_value = 0
 
-        ret = target.main(["--munki-repo", self.repo_path])
+        ret = target.main(
+            ["--munki-repo", self.repo_path, "--use-munki-makecatalogs", "--force"]
+        )
         self.assertEqual(ret, 0)
         mock_call.assert_called_once_with(
-            ["/usr/local/munki/makecatalogs", self.repo_path]
+            ["/usr/local/munki/makecatalogs", self.repo_path, "--force"]
         )
 
     @mock.patch("os.path.isdir")
@@ -42,7 +49,9 @@ class TestMunkiMakecatalogs(unittest.TestCase):
         mock_isdir.return_value = True
         mock_isfile.return_value = False
         with mock.patch("builtins.print") as mock_print:
-            ret = target.main(["--munki-repo", self.repo_path])
+            ret = target.main(
+                ["--munki-repo", self.repo_path, "--use-munki-makecatalogs"]
+            )
             self.assertEqual(ret, 1)
             mock_print.assert_any_call("/usr/local/munki/makecatalogs does not exist.")
 
@@ -55,3 +64,335 @@ class TestMunkiMakecatalogs(unittest.TestCase):
         parser = target.build_argument_parser()
         args = parser.parse_args(["--munki-repo", "/foo/bar"])
         self.assertEqual(args.munki_repo, "/foo/bar")
+
+
+class TestBuiltinMakecatalogs(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.repo = os.path.join(self.tempdir.name, "repo")
+        for folder in ("pkgsinfo/apps", "pkgs/apps", "icons"):
+            os.makedirs(os.path.join(self.repo, folder))
+        patcher = mock.patch.dict(
+            os.environ,
+            {"PRE_COMMIT_MACADMIN_CACHE_DIR": os.path.join(self.tempdir.name, "cache")},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_file(self, relpath, data=b""):
+        with open(os.path.join(self.repo, relpath), "wb") as f:
+            f.write(data)
+
+    def write_pkginfo(self, relpath, pkginfo):
+        self.write_file(os.path.join("pkgsinfo", relpath), plistlib.dumps(pkginfo))
+
+    def read_catalog(self, name):
+        with open(os.path.join(self.repo, "catalogs", name), "rb") as f:
+            return plistlib.load(f)
+
+    def run_main(self, *args):
+        with mock.patch("builtins.print") as mock_print:
+            retval = target.main(["--munki-repo", self.repo, "--jobs", "1", *args])
+        return retval, [c.args[0] for c in mock_print.call_args_list]
+
+    def test_builds_catalogs(self):
+        self.write_file("pkgs/apps/Foo-1.0.dmg")
+        self.write_pkginfo(
+            "apps/Foo-1.0.plist",
+            {
+                "name": "Foo",
+                "version": "1.0",
+                "catalogs": ["testing", "production"],
+                "installer_item_location": "apps/Foo-1.0.dmg",
+                "notes": "Admin notes",
+                "_metadata": {"created_by": "admin"},
+            },
+        )
+        self.write_pkginfo(
+            "Bar.plist",
+            {"name": "Bar", "catalogs": ["testing"], "installer_type": "nopkg"},
+        )
+        self.write_pkginfo(".hidden.plist", {"name": "Hidden"})
+        retval, output = self.run_main()
+        self.assertEqual((retval, output), (0, []))
+
+        foo = {
+            "name": "Foo",
+            "version": "1.0",
+            "catalogs": ["testing", "production"],
+            "installer_item_location": "apps/Foo-1.0.dmg",
+        }
+        bar = {"name": "Bar", "catalogs": ["testing"], "installer_type": "nopkg"}
+        self.assertEqual(self.read_catalog("all"), [bar, foo])
+        self.assertEqual(self.read_catalog("testing"), [bar, foo])
+        self.assertEqual(self.read_catalog("production"), [foo])
+
+    def test_missing_installer_item(self):
+        self.write_pkginfo(
+            "apps/Foo.plist",
+            {
+                "name": "Foo",
+                "catalogs": ["testing"],
+                "installer_item_location": "apps/Foo.dmg",
+            },
+        )
+        retval, output = self.run_main()
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output,
+            [
+                "WARNING: Info file apps/Foo.plist refers to missing installer "
+                "item: apps/Foo.dmg"
+            ],
+        )
+        self.assertEqual(self.read_catalog("all"), [])
+        self.assertFalse(os.path.exists(os.path.join(self.repo, "catalogs", "testing")))
+
+        retval, _ = self.run_main("--force")
+        self.assertEqual(retval, 1)
+        self.assertEqual(len(self.read_catalog("testing")), 1)
+
+        retval, output = self.run_main("--skip-pkg-check")
+        self.assertEqual((retval, output), (0, []))
+
+    def test_installer_item_with_different_case(self):
+        self.write_file("pkgs/apps/Foo.dmg")
+        self.write_pkginfo(
+            "apps/Foo.plist",
+            {
+                "name": "Foo",
+                "catalogs": ["testing"],
+                "installer_item_location": "Apps/foo.DMG",
+            },
+        )
+        retval, output = self.run_main()
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output,
+            [
+                "WARNING: apps/Foo.plist refers to installer item: Apps/foo.DMG. "
+                "The pathname of the item in the repo has different case: "
+                "pkgs/apps/Foo.dmg. This may cause issues depending on the "
+                "case-sensitivity of the underlying filesystem."
+            ],
+        )
+        # As with Munki's makecatalogs, the pkginfo is still included.
+        self.assertEqual(len(self.read_catalog("all")), 1)
+        self.assertEqual(len(self.read_catalog("testing")), 1)
+
+    def test_adobe_ccp_uninstaller_item_required(self):
+        self.write_file("pkgs/apps/Foo.pkg")
+        self.write_pkginfo(
+            "apps/Foo.plist",
+            {
+                "name": "Foo",
+                "catalogs": ["testing"],
+                "installer_item_location": "apps/Foo.pkg",
+                "uninstall_method": "AdobeCCPUninstaller",
+            },
+        )
+        self.assertEqual(
+            self.run_main(),
+            (1, ["WARNING: file apps/Foo.plist is missing uninstaller_item_location"]),
+        )
+        self.assertEqual(self.read_catalog("all"), [])
+
+    def test_unreadable_and_nameless_pkginfos(self):
+        self.write_file("pkgsinfo/bad.plist", b"not a plist")
+        self.write_pkginfo("noname.plist", {"version": "1.0"})
+        retval, output = self.run_main()
+        self.assertEqual(retval, 1)
+        self.assertTrue(output[0].startswith("WARNING: file bad.plist could not"))
+        self.assertEqual(output[1], "WARNING: file noname.plist is missing name")
+
+    def test_removes_stale_catalogs_and_keeps_unchanged(self):
+        self.write_pkginfo(
+            "Bar.plist",
+            {"name": "Bar", "catalogs": ["testing"], "installer_type": "nopkg"},
+        )
+        os.makedirs(os.path.join(self.repo, "catalogs"))
+        self.write_file("catalogs/old")
+        self.run_main()
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.repo, "catalogs"))),
+            ["all", "testing"],
+        )
+        path = os.path.join(self.repo, "catalogs", "testing")
+        os.utime(path, ns=(0, 0))
+        self.run_main()
+        self.assertEqual(os.stat(path).st_mtime_ns, 0)
+
+    def test_catalog_entries_match_plistlib(self):
+        pkginfos = [
+            {"name": "Foo", "data": b"\x00\x01", "nested": [{"a": 1.5}, {}]},
+            {"name": "Bar", "catalogs": []},
+        ]
+        paths = []
+        for pkginfo in pkginfos:
+            self.write_pkginfo(f"{pkginfo['name']}.plist", pkginfo)
+            paths.append(
+                os.path.join(self.repo, "pkgsinfo", f"{pkginfo['name']}.plist")
+            )
+        entries = [target.read_catalog_entry(path) for path in paths]
+        self.assertEqual(target.catalog_data(entries), plistlib.dumps(pkginfos))
+        self.assertEqual(target.catalog_data([]), plistlib.dumps([]))
+
+    def test_incremental_rebuild(self):
+        for name in ("Foo", "Bar", "Baz"):
+            self.write_pkginfo(
+                f"apps/{name}.plist",
+                {
+                    "name": name,
+                    "catalogs": ["testing", name.lower()],
+                    "installer_type": "nopkg",
+                },
+            )
+        self.assertEqual(self.run_main(), (0, []))
+
+        self.write_pkginfo(
+            "apps/Foo.plist",
+            {"name": "Foo", "version": "2.0", "catalogs": ["testing", "foo"]},
+        )
+        os.remove(os.path.join(self.repo, "pkgsinfo", "apps", "Baz.plist"))
+        self.write_file("pkgs/apps/Foo.dmg")
+        self.write_pkginfo(
+            "apps/Qux.plist",
+            {
+                "name": "Qux",
+                "installer_item_location": "apps/Foo.dmg",
+                "catalogs": ["testing"],
+            },
+        )
+        with mock.patch.object(
+            target, "read_catalog_entry", wraps=target.read_catalog_entry
+        ) as mock_read, mock.patch.object(
+            target, "write_if_changed", wraps=target.write_if_changed
+        ) as mock_write:
+            retval, output = self.run_main()
+        self.assertEqual(retval, 1)
+        self.assertIn("apps/Foo.plist is missing installer_item_location", output[0])
+        self.assertEqual(
+            sorted(os.path.basename(c.args[0]) for c in mock_read.call_args_list),
+            ["Foo.plist", "Qux.plist"],
+        )
+        self.assertEqual(
+            sorted(os.path.basename(c.args[0]) for c in mock_write.call_args_list),
+            ["all", "testing"],
+        )
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.repo, "catalogs"))),
+            ["all", "bar", "testing"],
+        )
+
+        incremental = {
+            name: self.read_catalog(name) for name in ("all", "bar", "testing")
+        }
+        self.run_main("--no-cache")
+        for name, catalog in incremental.items():
+            self.assertEqual(self.read_catalog(name), catalog)
+        self.assertEqual([p["name"] for p in incremental["all"]], ["Bar", "Qux"])
+
+    def test_unchanged_repo_reads_nothing(self):
+        self.write_pkginfo("Bar.plist", {"name": "Bar", "installer_type": "nopkg"})
+        self.run_main()
+        # A checkout changes modification times, but not content.
+        os.utime(os.path.join(self.repo, "pkgsinfo", "Bar.plist"), ns=(0, 0))
+        with mock.patch.object(target, "read_catalog_entry") as mock_read:
+            self.assertEqual(self.run_main(), (0, []))
+        mock_read.assert_not_called()
+
+    def test_catalog_changed_on_disk_is_rewritten(self):
+        self.write_pkginfo("Bar.plist", {"name": "Bar", "installer_type": "nopkg"})
+        self.run_main()
+        all_catalog = self.read_catalog("all")
+        self.write_file("catalogs/all", b"edited")
+        self.run_main()
+        self.assertEqual(self.read_catalog("all"), all_catalog)
+
+    def test_verify_reports_differences(self):
+        for name in ("Foo", "Bar", "Baz"):
+            self.write_pkginfo(
+                f"{name}.plist",
+                {"name": name, "version": "1.0", "installer_type": "nopkg"},
+            )
+        self.run_main()
+        self.write_pkginfo(
+            "Foo.plist",
+            {"name": "Foo", "version": "1.0", "installer_type": "nopkg", "x": 1},
+        )
+        os.remove(os.path.join(self.repo, "pkgsinfo", "Bar.plist"))
+        self.write_pkginfo(
+            "Qux.plist",
+            {"name": "Qux", "catalogs": ["testing"], "installer_type": "nopkg"},
+        )
+        with open(os.path.join(self.repo, "catalogs", "all"), "rb") as f:
+            all_catalog = f.read()
+
+        with mock.patch.object(target, "write_if_changed") as mock_write:
+            retval, output = self.run_main("--verify")
+        mock_write.assert_not_called()
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output,
+            [
+                "catalogs/all: stale entry for pkgsinfo/Foo.plist",
+                "catalogs/all: missing pkgsinfo/Qux.plist",
+                "catalogs/all: extra item Bar-1.0 isn't in any pkginfo",
+                "catalogs/testing: catalog is missing",
+                "Catalogs are out of date. Run makecatalogs to rebuild them.",
+            ],
+        )
+        with open(os.path.join(self.repo, "catalogs", "all"), "rb") as f:
+            self.assertEqual(f.read(), all_catalog)
+
+        self.run_main()
+        self.assertEqual(self.run_main("--verify", "--no-cache"), (0, []))
+
+    def test_verify_reports_order_and_extra_catalogs(self):
+        for name in ("Bar", "Foo"):
+            self.write_pkginfo(
+                f"{name}.plist", {"name": name, "installer_type": "nopkg"}
+            )
+        self.run_main()
+        catalog = self.read_catalog("all")
+        self.write_file("catalogs/all", plistlib.dumps(catalog[::-1]))
+        self.write_file("catalogs/old", plistlib.dumps([]))
+        retval, output = self.run_main("--verify")
+        self.assertEqual(retval, 1)
+        self.assertEqual(
+            output[:2],
+            [
+                "catalogs/old: no pkginfo lists this catalog",
+                "catalogs/all: items are out of order",
+            ],
+        )
+
+    def test_verify_parses_catalogs_in_other_formats(self):
+        self.write_pkginfo("Bar.plist", {"name": "Bar", "installer_type": "nopkg"})
+        self.run_main()
+        catalog = self.read_catalog("all")
+        self.write_file(
+            "catalogs/all", plistlib.dumps(catalog, fmt=plistlib.FMT_BINARY)
+        )
+        self.assertEqual(self.run_main("--verify"), (0, []))
+        self.write_file("catalogs/all", b"not a plist")
+        retval, output = self.run_main("--verify")
+        self.assertEqual(retval, 1)
+        self.assertTrue(output[0].startswith("catalogs/all: could not be read"))
+
+    def test_verify_skips_catalogs_known_to_be_current(self):
+        self.write_pkginfo("Bar.plist", {"name": "Bar", "installer_type": "nopkg"})
+        self.run_main()
+        with mock.patch.object(target, "split_catalog") as mock_split:
+            self.assertEqual(self.run_main("--verify"), (0, []))
+        mock_split.assert_not_called()
+
+    def test_icon_hashes(self):
+        self.write_pkginfo("Bar.plist", {"name": "Bar", "installer_type": "nopkg"})
+        self.write_file("icons/Bar.png", b"icon")
+        self.run_main()
+        with open(os.path.join(self.repo, "icons", "_icon_hashes.plist"), "rb") as f:
+            self.assertEqual(
+                plistlib.load(f), {"Bar.png": hashlib.sha256(b"icon").hexdigest()}
+            )
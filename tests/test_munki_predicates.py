@@ -0,0 +1,109 @@
+import unittest
+from unittest import mock
+
+import pre_commit_macadmin_hooks.munki_predicates as target
+
+
+class TestParsePredicate(unittest.TestCase):
+    def test_valid_conditions(self):
+        conditions = {
+            "machine_type == 'laptop'": {"machine_type"},
+            'os_vers BEGINSWITH "14." AND arch == "arm64"': {"os_vers", "arch"},
+            "ANY catalogs ==[c] 'testing'": {"catalogs"},
+            'date > CAST("2024-01-01T00:00:00Z", "NSDate")': {"date"},
+            "NOT (hostname LIKE 'lab-*' OR x86_64_capable == TRUE)": {
+                "hostname",
+                "x86_64_capable",
+            },
+            "(os_vers_major + 1) >= 15": {"os_vers_major"},
+            "machine_model IN {'MacBookPro18,1', 'Mac14,2'}": {"machine_model"},
+            "catalogs.@count > 0 && #in != nil": {"catalogs", "in"},
+            "SUBQUERY(catalogs, $c, $c == 'x').@count > 0": {"catalogs"},
+            "TRUEPREDICATE": set(),
+        }
+        for condition, attributes in conditions.items():
+            with self.subTest(condition=condition):
+                self.assertEqual(
+                    target.parse_predicate(condition),
+                    (frozenset(attributes), None),
+                )
+
+    def test_syntax_errors(self):
+        conditions = {
+            "": "condition is empty",
+            "machine_type == 'laptop": "unterminated string at position 16",
+            "machine_type 'laptop'": "expected a comparison operator but found "
+            "\"'laptop'\" at position 13",
+            "arch == 'arm64' AND": "expected a value or attribute but found end "
+            "of condition at position 19",
+            "(arch == 'arm64'": "expected ')' but found end of condition at "
+            "position 16",
+            "os_vers == 14.2.1": "unexpected '.1' at position 15",
+            "arch LIKEE 'x'": "expected a comparison operator but found 'LIKEE' "
+            "at position 5",
+            "in == 1": "unexpected 'in' at position 0",
+            "arch ==[q] 'x'": "unknown comparison option 'q' at position 8",
+            "arch == ~": "unexpected character '~' at position 8",
+        }
+        for condition, error in conditions.items():
+            with self.subTest(condition=condition):
+                self.assertEqual(
+                    target.parse_predicate(condition), (frozenset(), error)
+                )
+
+    def test_parsed_once(self):
+        target.parse_predicate.cache_clear()
+        with mock.patch.object(
+            target, "_tokenize", wraps=target._tokenize
+        ) as mock_tokenize:
+            for _ in range(3):
+                target.parse_predicate("arch == 'arm64'")
+        mock_tokenize.assert_called_once()
+
+
+class TestValidateCondition(unittest.TestCase):
+    def validate(self, condition, *args, **kwargs):
+        with mock.patch("builtins.print") as mock_print:
+            result = target.validate_condition(condition, "f", "cond", *args, **kwargs)
+        return result, [c.args[0] for c in mock_print.call_args_list]
+
+    def test_valid(self):
+        self.assertEqual(self.validate("arch == 'arm64'"), (True, []))
+
+    def test_syntax_error(self):
+        self.assertEqual(
+            self.validate("arch =="),
+            (
+                False,
+                [
+                    "f: cond is not a valid predicate: expected a value or "
+                    "attribute but found end of condition at position 7"
+                ],
+            ),
+        )
+
+    def test_unknown_conditions(self):
+        condition = "machine_typ == 'laptop' AND has_vpn == TRUE"
+        self.assertEqual(
+            self.validate(condition),
+            (
+                True,
+                [
+                    'f: WARNING: cond uses unknown condition "has_vpn"',
+                    'f: WARNING: cond uses unknown condition "machine_typ"',
+                ],
+            ),
+        )
+        self.assertEqual(
+            self.validate(condition, ["has_vpn"], fail_on_unknown=True),
+            (False, ['f: cond uses unknown condition "machine_typ"']),
+        )
+
+    def test_ibridge_model_name(self):
+        self.assertEqual(
+            self.validate("ibridge_model_name BEGINSWITH 'Apple T2'"), (True, [])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,336 @@
+import hashlib
+import os
+import plistlib
+import tempfile
+import unittest
+from unittest import mock
+
+import pre_commit_macadmin_hooks.munki_repo as target
+
+
+class TestItemReferences(unittest.TestCase):
+    def test_split_name_and_version(self):
+        self.assertEqual(target.split_name_and_version("Foo-1.0"), ("Foo", "1.0"))
+        self.assertEqual(target.split_name_and_version("Foo--1.0"), ("Foo", "1.0"))
+        self.assertEqual(target.split_name_and_version("Foo-Bar-2"), ("Foo-Bar", "2"))
+        self.assertEqual(target.split_name_and_version("Foo-Bar"), ("Foo-Bar", ""))
+        self.assertEqual(target.split_name_and_version("Foo-"), ("Foo-", ""))
+
+    def test_trim_version(self):
+        self.assertEqual(target.trim_version("1.0.0"), "1.0")
+        self.assertEqual(target.trim_version("10.0.0.0"), "10.0")
+        self.assertEqual(target.trim_version("1.0"), "1.0")
+        self.assertEqual(target.trim_version("1.0.1"), "1.0.1")
+        self.assertEqual(target.trim_version("0"), "0")
+
+
+class TestVersions(unittest.TestCase):
+    def test_version_key(self):
+        versions = ["1.0b1", "1", "1.0.1", "1.0a", "1.10", "1.9.9", "1.0.0.1", "10"]
+        self.assertEqual(
+            sorted(versions, key=target.version_key),
+            ["1", "1.0.0.1", "1.0.1", "1.0a", "1.0b1", "1.9.9", "1.10", "10"],
+        )
+        self.assertEqual(target.version_key("1.0.0"), target.version_key("1"))
+
+    def test_version_index(self):
+        entries = [
+            target.RepoEntry("a", "Foo", "1.10", ("testing",)),
+            target.RepoEntry("b", "Foo", "1.9", ("testing", "prod")),
+            target.RepoEntry("c", "Foo", None, ("prod",)),
+            target.RepoEntry("d", "Bar", "3", ("prod",)),
+        ]
+        index = target.VersionIndex(entries)
+        self.assertEqual(index.highest_above("Foo", "testing", "1.9"), ("1.10", "a"))
+        self.assertIsNone(index.highest_above("Foo", "testing", "1.10.0"))
+        self.assertIsNone(index.highest_above("Foo", "prod", "1.9"))
+        self.assertIsNone(index.highest_above("Foo", "missing", "1"))
+
+
+class TestPathTrie(unittest.TestCase):
+    def test_overlaps(self):
+        trie = target.PathTrie()
+        trie.insert("/Applications/Foo.app", "Foo", 1)
+        trie.insert("/Applications/Foo.app/Contents/Helper", "Foo", 2)
+        trie.insert("/applications/foo.app/", "FooBeta", 3)
+        trie.insert("/Applications/Foo.app/Contents/Plugin", "Plugin", 4)
+        trie.insert("/Applications/Bar.app", "Bar", 5)
+        trie.insert("/Applications", "Apps", 6)
+        overlaps = sorted(
+            (claim[2], other[2], same) for claim, other, same in trie.overlaps()
+        )
+        self.assertEqual(
+            overlaps,
+            [
+                (1, 6, False),
+                (2, 3, False),
+                (3, 1, True),
+                (4, 3, False),
+                (5, 6, False),
+            ],
+        )
+
+
+class TestCheckCaseSensitivePath(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        os.makedirs(os.path.join(self.tempdir.name, "pkgs", "apps"))
+        with open(os.path.join(self.tempdir.name, "pkgs", "apps", "Foo.pkg"), "w"):
+            pass
+        target._list_dir.cache_clear()
+        self.addCleanup(target._list_dir.cache_clear)
+
+    def test_existing_path_returns_true(self):
+        path = os.path.join(self.tempdir.name, "pkgs", "apps", "Foo.pkg")
+        self.assertTrue(target._check_case_sensitive_path(path))
+
+    def test_missing_path_returns_false(self):
+        path = os.path.join(self.tempdir.name, "pkgs", "apps", "Bar.pkg")
+        self.assertFalse(target._check_case_sensitive_path(path))
+
+    def test_case_conflict_returns_false(self):
+        path = os.path.join(self.tempdir.name, "pkgs", "apps", "foo.pkg")
+        # Only a case-insensitive filesystem will report the path as existing.
+        with mock.patch("os.path.exists", return_value=True):
+            self.assertFalse(target._check_case_sensitive_path(path))
+
+    def test_directory_listings_are_cached(self):
+        path = os.path.join(self.tempdir.name, "pkgs", "apps", "Foo.pkg")
+        with mock.patch("os.scandir", wraps=os.scandir) as mock_scandir:
+            self.assertTrue(target._check_case_sensitive_path(path))
+            first_count = mock_scandir.call_count
+            self.assertTrue(target._check_case_sensitive_path(path))
+            self.assertEqual(mock_scandir.call_count, first_count)
+
+
+class TestRepoIndex(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.repo = self.tempdir.name
+        os.makedirs(os.path.join(self.repo, "pkgs", "apps"))
+        os.makedirs(os.path.join(self.repo, "icons"))
+        for relpath in ("pkgs/apps/Foo-1.0.pkg", "icons/Foo.png"):
+            with open(os.path.join(self.repo, relpath), "w"):
+                pass
+
+    def test_has_pkgs_item(self):
+        index = target.RepoIndex(self.repo)
+        self.assertTrue(index.has_pkgs_item("apps/Foo-1.0.pkg"))
+        self.assertTrue(index.has_pkgs_item("apps//./Foo-1.0.pkg"))
+        self.assertTrue(index.has_pkgs_item("apps/"))
+        self.assertFalse(index.has_pkgs_item("apps/Bar-1.0.pkg"))
+        self.assertFalse(index.has_pkgs_item("Apps/Foo-1.0.pkg"))
+        self.assertFalse(index.has_pkgs_item("apps/Foo-1.0.pkg/"))
+        self.assertFalse(index.has_pkgs_item("apps/../apps/Foo-1.0.pkg"))
+
+    def test_match_pkgs_item(self):
+        index = target.RepoIndex(self.repo)
+        self.assertEqual(index.match_pkgs_item("APPS/foo-1.0.PKG"), "apps/Foo-1.0.pkg")
+        self.assertEqual(index.match_pkgs_item("apps/Foo-1.0.pkg"), "apps/Foo-1.0.pkg")
+        self.assertEqual(index.match_pkgs_item("apps/Bar-1.0.pkg"), "")
+        self.assertEqual(index.match_pkgs_item("apps/Foo-1.0.pkg/x"), "")
+
+    def test_missing_location_matches_pkgs_folder(self):
+        index = target.RepoIndex(self.repo)
+        self.assertTrue(index.has_pkgs_item(""))
+        empty_repo = tempfile.TemporaryDirectory()
+        self.addCleanup(empty_repo.cleanup)
+        self.assertFalse(target.RepoIndex(empty_repo.name).has_pkgs_item(""))
+
+    def test_has_pkgs_item_does_not_stat(self):
+        index = target.RepoIndex(self.repo)
+        with mock.patch("os.stat") as mock_stat, mock.patch(
+            "os.scandir"
+        ) as mock_scandir:
+            self.assertTrue(index.has_pkgs_item("apps/Foo-1.0.pkg"))
+            self.assertTrue(index.has_icon("Foo"))
+        mock_stat.assert_not_called()
+        mock_scandir.assert_not_called()
+
+    def test_broken_symlink_does_not_exist(self):
+        os.symlink(
+            os.path.join(self.repo, "nowhere.pkg"),
+            os.path.join(self.repo, "pkgs", "apps", "Broken.pkg"),
+        )
+        index = target.RepoIndex(self.repo)
+        self.assertFalse(index.has_pkgs_item("apps/Broken.pkg"))
+
+    def test_has_icon(self):
+        index = target.RepoIndex(self.repo)
+        self.assertTrue(index.has_icon("Foo"))
+        self.assertFalse(index.has_icon("Bar"))
+
+    def test_has_icon_ignores_case_on_case_insensitive_filesystem(self):
+        with mock.patch.object(target, "_is_case_insensitive", return_value=True):
+            index = target.RepoIndex(self.repo)
+        self.assertTrue(index.has_icon("foo"))
+        self.assertFalse(index.has_icon("bar"))
+
+    def test_has_icon_respects_case_on_case_sensitive_filesystem(self):
+        with mock.patch.object(target, "_is_case_insensitive", return_value=False):
+            index = target.RepoIndex(self.repo)
+        self.assertFalse(index.has_icon("foo"))
+
+    def test_load_repo_index_refresh(self):
+        index = target.load_repo_index(self.repo)
+        self.addCleanup(target._repo_indexes.clear)
+        self.assertIs(target.load_repo_index(self.repo), index)
+
+        # Refreshing rebuilds the index even if no folder's mtime changed.
+        path = os.path.join(self.repo, "pkgs", "apps", "Bar-1.0.pkg")
+        mtime = os.stat(os.path.dirname(path)).st_mtime_ns
+        with open(path, "w"):
+            pass
+        os.utime(os.path.dirname(path), ns=(mtime, mtime))
+        self.assertFalse(
+            target.load_repo_index(self.repo).has_pkgs_item("apps/Bar-1.0.pkg")
+        )
+        refreshed = target.load_repo_index(self.repo, refresh=True)
+        self.assertIsNot(refreshed, index)
+        self.assertTrue(refreshed.has_pkgs_item("apps/Bar-1.0.pkg"))
+
+
+class TestHashFiles(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        patcher = mock.patch.dict(
+            os.environ,
+            {"PRE_COMMIT_MACADMIN_CACHE_DIR": os.path.join(self.tempdir.name, "cache")},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.path = os.path.join(self.tempdir.name, "Foo.dmg")
+        with open(self.path, "wb") as f:
+            f.write(b"x" * (target.HASH_CHUNK_SIZE + 1))
+
+    def test_hash_files(self):
+        missing = os.path.join(self.tempdir.name, "Bar.dmg")
+        expected = hashlib.sha256(b"x" * (target.HASH_CHUNK_SIZE + 1)).hexdigest()
+        self.assertEqual(
+            target.hash_files([self.path, missing], jobs=2),
+            {self.path: expected, missing: None},
+        )
+
+    def test_hashes_are_cached_by_stat(self):
+        first = target.hash_files([self.path])
+        with mock.patch.object(target, "_hash_file") as mock_hash:
+            self.assertEqual(target.hash_files([self.path]), first)
+            mock_hash.assert_not_called()
+            target.hash_files([self.path], use_cache=False)
+            mock_hash.assert_called_once()
+
+        # Same size, but modified.
+        with open(self.path, "r+b") as f:
+            f.write(b"y")
+        os.utime(self.path, ns=(0, 0))
+        self.assertNotEqual(target.hash_files([self.path]), first)
+
+    def test_read_lfs_pointer(self):
+        self.assertIsNone(target.read_lfs_pointer(self.path))
+        pointer = os.path.join(self.tempdir.name, "Bar.dmg")
+        oid = "a" * 64
+        with open(pointer, "w") as f:
+            f.write(
+                f"version https://git-lfs.github.com/spec/v1\noid sha256:{oid}\n"
+                "size 12345\n"
+            )
+        self.assertEqual(target.read_lfs_pointer(pointer), (oid, 12345))
+        with open(pointer, "w") as f:
+            f.write(f"version https://example.com\noid sha256:{oid}\nsize 1\n")
+        self.assertIsNone(target.read_lfs_pointer(pointer))
+
+
+class TestRepoEntries(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.repo = os.path.join(self.tempdir.name, "repo")
+        os.makedirs(os.path.join(self.repo, "pkgsinfo"))
+        patcher = mock.patch.dict(
+            os.environ,
+            {"PRE_COMMIT_MACADMIN_CACHE_DIR": os.path.join(self.tempdir.name, "cache")},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_pkginfo(self, relpath, pkginfo):
+        with open(os.path.join(self.repo, "pkgsinfo", relpath), "wb") as f:
+            plistlib.dump(pkginfo, f)
+
+    def test_load_repo_entries_uses_cache(self):
+        self.write_pkginfo(
+            "Foo.plist",
+            {
+                "name": "Foo",
+                "catalogs": ["testing", 1],
+                "receipts": [{"packageid": "com.example.foo"}, {"name": "x"}],
+                "installs": [{"path": "/Applications/Foo.app"}, "bad"],
+                "items_to_copy": [
+                    {"destination_path": "/Applications/", "source_item": "a/Foo.app"},
+                    {
+                        "destination_path": "/Library/Bar",
+                        "destination_item": "baz",
+                        "source_item": "qux",
+                    },
+                    {"destination_path": "/Library"},
+                ],
+            },
+        )
+        self.write_pkginfo("bad.plist", {"version": "1.0"})
+        expected = [
+            target.RepoEntry(
+                path=os.path.join(self.repo, "pkgsinfo", "Foo.plist"),
+                name="Foo",
+                version=None,
+                catalogs=("testing",),
+                requires=(),
+                update_for=(),
+                receipts=("com.example.foo",),
+                installs=("/Applications/Foo.app",),
+                items_to_copy=("/Applications/Foo.app", "/Library/Bar/baz"),
+            )
+        ]
+        self.assertEqual(target.load_repo_entries(self.repo), expected)
+        with mock.patch.object(target, "load_plist") as mock_load:
+            self.assertEqual(target.load_repo_entries(self.repo), expected)
+        mock_load.assert_not_called()
+
+    def test_repo_entries_share_strings(self):
+        for version in ("1.0", "2.0"):
+            self.write_pkginfo(
+                f"Foo-{version}.plist",
+                {
+                    "name": "".join(["Fo", "o"]),
+                    "version": version,
+                    "catalogs": ["testing", "production"],
+                },
+            )
+        first, second = target.load_repo_entries(self.repo)
+        self.assertIs(first.name, second.name)
+        self.assertIs(first.catalogs, second.catalogs)
+
+    def test_catalog_index(self):
+        self.write_pkginfo(
+            "Foo.plist", {"name": "Foo", "version": "1.0", "catalogs": ["testing"]}
+        )
+        self.write_pkginfo(
+            "Foo-2.plist",
+            {"name": "Foo", "version": "2.0", "catalogs": ["production"]},
+        )
+        index = target.load_catalog_index(self.repo, refresh=True)
+        self.addCleanup(target._catalog_indexes.clear)
+        self.assertTrue(index.resolve("Foo", ["testing"]))
+        self.assertTrue(index.resolve("Foo-1.0.0", ["production", "testing"]))
+        self.assertFalse(index.resolve("Foo-1", ["testing"]))
+        self.assertFalse(index.resolve("Foo-2.0", ["testing"]))
+        self.assertFalse(index.resolve("Bar", ["testing", "missing"]))
+        self.assertIs(target.load_catalog_index(self.repo), index)
+
+        self.write_pkginfo(
+            "Bar.plist", {"name": "Bar", "version": "1.0", "catalogs": ["testing"]}
+        )
+        refreshed = target.load_catalog_index(self.repo, refresh=True)
+        self.assertTrue(refreshed.resolve("Bar", ["testing"]))
@@ -0,0 +1,98 @@
+import json
+import os
+import plistlib
+import tempfile
+import unittest
+from unittest import mock
+
+import pre_commit_macadmin_hooks.check_preference_manifests as manifests
+import pre_commit_macadmin_hooks.profiling as target
+from pre_commit_macadmin_hooks import util
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def write_manifest(self, name, manifest):
+        path = os.path.join(self.tempdir.name, name)
+        with open(path, "wb") as f:
+            plistlib.dump(manifest, f)
+        return path
+
+    def test_nested_validators(self):
+        profiler = target.Profiler("test")
+
+        def inner():
+            pass
+
+        timed_inner = profiler._time_validator("inner", inner)
+
+        def outer():
+            timed_inner()
+            timed_inner()
+
+        profiler._time_validator("outer", outer)()
+        calls, seconds, self_seconds = profiler.validators["outer"]
+        self.assertEqual(calls, 1)
+        self.assertEqual(profiler.validators["inner"][0], 2)
+        self.assertAlmostEqual(
+            seconds - self_seconds, profiler.validators["inner"][1], places=6
+        )
+
+    def test_instrument_restores_functions(self):
+        original_validator = manifests.validate_required_keys
+        original_parse = util._parse_document
+        profiler = target.Profiler("test")
+        with profiler.instrument("pre_commit_macadmin_hooks"):
+            self.assertIsNot(manifests.validate_required_keys, original_validator)
+            self.assertIsNot(util._parse_document, original_parse)
+        self.assertIs(manifests.validate_required_keys, original_validator)
+        self.assertIs(util._parse_document, original_parse)
+
+    def test_profile_report(self):
+        good = self.write_manifest(
+            "good.plist",
+            {
+                "pfm_title": "Title",
+                "pfm_domain": "com.example",
+                "pfm_description": "desc",
+                "pfm_format_version": 1,
+                "pfm_subkeys": [{"pfm_type": "string", "pfm_name": "foo"}],
+            },
+        )
+        bad = self.write_manifest("bad.plist", {"pfm_title": "Title"})
+        report_path = os.path.join(self.tempdir.name, "profile.json")
+        with mock.patch("builtins.print"):
+            retval = manifests.main(
+                ["--profile", report_path, "--profile-top", "1", good, bad]
+            )
+        self.assertEqual(retval, 1)
+
+        with open(report_path, encoding="utf-8") as f:
+            report = json.load(f)
+        self.assertEqual(report["hook"], "check-preference-manifests")
+        self.assertEqual(report["files_checked"], 2)
+        self.assertGreater(report["parse_seconds"], 0)
+        self.assertEqual(len(report["slowest_files"]), 1)
+        self.assertIn(report["slowest_files"][0]["filename"], (good, bad))
+        self.assertEqual(len(report["slowest_validators"]), 1)
+        self.assertTrue(
+            report["slowest_validators"][0]["name"].startswith(
+                ("check_preference_manifests.", "util.")
+            )
+        )
+
+    def test_profile_bypasses_cache(self):
+        path = self.write_manifest("bad.plist", {"pfm_title": "Title"})
+        report_path = os.path.join(self.tempdir.name, "profile.json")
+        with mock.patch.object(util, "open_result_cache") as mock_cache:
+            with mock.patch("builtins.print"):
+                manifests.main(["--profile", report_path, path])
+        mock_cache.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
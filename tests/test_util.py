@@ -3,23 +3,37 @@
 Unit tests for the shared/utility functions in pre_commit_macadmin_hooks.util module.
 """
 
+import argparse
+import io
 import json
 import os
 import plistlib
+import sqlite3
+import subprocess
+import sys
 import tempfile
 import unittest
+from contextlib import closing, redirect_stdout
+from unittest import mock
 
+from pre_commit_macadmin_hooks import util
+from pre_commit_macadmin_hooks.check_plists import check_plist
 from pre_commit_macadmin_hooks.util import (
+    add_performance_arguments,
+    check_files,
     detect_deprecated_keys,
     detect_typoed_keys,
     load_autopkg_recipe,
+    open_result_cache,
     validate_pkginfo_key_types,
+    validate_pkginfo_keys,
     validate_required_keys,
     validate_restart_action_key,
     validate_shebangs,
     validate_supported_architectures,
     validate_uninstall_method,
 )
+from tests.helpers import CacheTestCase
 
 try:
     import ruamel.yaml
@@ -153,6 +167,58 @@ class TestUtil(unittest.TestCase):
         }
         self.assertFalse(validate_pkginfo_key_types(d, "file"))
 
+    def test_validate_pkginfo_keys_matches_individual_checks(self):
+        pkginfo = {
+            "min_os": "10.15",
+            "version": 1,
+            "supported_architectures": ["foo", "%ARCH%", "arm64", "bar"],
+            "forced_install": True,
+            "forced_uninstall": False,
+            "RestartAction": "Reboot",
+            "catalogs": "testing",
+            "uninstall_method": "uninstall_script",
+            "blocking_apps": [],
+            "suppress_bundle_relocation": "yes",
+        }
+        for recipe_mode in (False, True):
+            with self.subTest(recipe_mode=recipe_mode):
+                expected = io.StringIO()
+                with redirect_stdout(expected):
+                    validate_pkginfo_key_types(pkginfo, "file")
+                    validate_restart_action_key(pkginfo, "file")
+                    validate_uninstall_method(pkginfo, "file")
+                    validate_supported_architectures(pkginfo, "file", recipe_mode)
+                    detect_deprecated_keys(pkginfo, "file")
+                    detect_typoed_keys(pkginfo, "file")
+                output = io.StringIO()
+                with redirect_stdout(output):
+                    result = validate_pkginfo_keys(pkginfo, "file", recipe_mode)
+                self.assertFalse(result)
+                self.assertEqual(output.getvalue(), expected.getvalue())
+                self.assertEqual(
+                    output.getvalue().splitlines()[:3],
+                    [
+                        "file: pkginfo key catalogs should be type "
+                        "<class 'list'>, not type <class 'str'>",
+                        "file: pkginfo key suppress_bundle_relocation should be "
+                        "type <class 'bool'>, not type <class 'str'>",
+                        "file: pkginfo key version should be type "
+                        "<class 'str'>, not type <class 'int'>",
+                    ],
+                )
+
+    def test_validate_pkginfo_keys_passes(self):
+        pkginfo = {
+            "name": "Foo",
+            "RestartAction": "None",
+            "supported_architectures": ["arm64"],
+            "uninstall_method": "uninstall_script",
+            "uninstall_script": "#!/bin/sh",
+        }
+        with mock.patch("builtins.print") as mock_print:
+            self.assertTrue(validate_pkginfo_keys(pkginfo, "file"))
+        mock_print.assert_not_called()
+
     def test_validate_shebangs(self):
         valid_script = "#!/bin/bash\nsomething"
         invalid_script = "#!/usr/bin/env python\nsomething"
@@ -188,6 +254,304 @@ class TestUtil(unittest.TestCase):
         # Only one required key, not present
         self.assertFalse(validate_required_keys({}, "file", ["foo"]))
 
+    def test_find_cycles(self):
+        graph = {"a": ["b"], "b": ["c", "e"], "c": ["a"], "d": ["d"], "e": ["f"]}
+        self.assertEqual(util.find_cycles(graph), [["a", "b", "c"], ["d"]])
+        self.assertEqual(util.find_cycles({"a": ["b"], "b": []}), [])
+
+    def test_find_cycles_long_chain(self):
+        graph = {str(i): [str(i + 1)] for i in range(20000)}
+        graph["20000"] = ["0"]
+        self.assertEqual(len(util.find_cycles(graph)[0]), 20001)
+
+
+class TestListAddedFiles(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.repo = os.path.realpath(self.tempdir.name)
+        self.git("init", "-q")
+        self.git("config", "user.email", "test@example.com")
+        self.git("config", "user.name", "Test")
+        self.write("old.plist")
+        self.git("add", "old.plist")
+        self.git("commit", "-q", "-m", "first")
+        patcher = mock.patch.dict(os.environ)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.environ.pop("PRE_COMMIT_FROM_REF", None)
+        os.environ.pop("PRE_COMMIT_TO_REF", None)
+
+    def git(self, *args):
+        subprocess.run(["git", *args], cwd=self.repo, check=True)
+
+    def write(self, name):
+        with open(os.path.join(self.repo, name), "w") as f:
+            f.write(name)
+
+    def test_staged_files(self):
+        self.write("old.plist")
+        self.write("new.plist")
+        self.git("add", "old.plist", "new.plist")
+        self.assertEqual(
+            util.list_added_files(self.repo), {os.path.join(self.repo, "new.plist")}
+        )
+
+    def test_ref_range(self):
+        self.write("new.plist")
+        self.git("add", "new.plist")
+        self.git("commit", "-q", "-m", "second")
+        os.environ["PRE_COMMIT_FROM_REF"] = "HEAD~1"
+        os.environ["PRE_COMMIT_TO_REF"] = "HEAD"
+        self.assertEqual(
+            util.list_added_files(self.repo), {os.path.join(self.repo, "new.plist")}
+        )
+
+    def test_outside_git_repo(self):
+        with tempfile.TemporaryDirectory() as other:
+            self.assertEqual(util.list_added_files(other), set())
+
+
+class TestCheckFiles(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def make_plists(self, count):
+        """Create plists, every third of which is invalid."""
+        filenames = []
+        for idx in range(count):
+            filename = os.path.join(self.tempdir.name, f"{idx:03}.plist")
+            with open(filename, "wb") as openfile:
+                if idx % 3:
+                    plistlib.dump({"idx": idx}, openfile)
+                else:
+                    openfile.write(b"not a plist")
+            filenames.append(filename)
+        return filenames
+
+    def test_jobs_argument(self):
+        parser = argparse.ArgumentParser()
+        add_performance_arguments(parser)
+        self.assertEqual(parser.parse_args([]).jobs, os.cpu_count() or 1)
+        self.assertEqual(parser.parse_args(["--jobs", "3"]).jobs, 3)
+        with mock.patch("sys.stderr"), self.assertRaises(SystemExit):
+            parser.parse_args(["--jobs", "0"])
+
+    def test_few_files_checked_in_process(self):
+        filenames = self.make_plists(3)
+        with mock.patch("concurrent.futures.ProcessPoolExecutor") as mock_pool:
+            with mock.patch("builtins.print"):
+                results = check_files(check_plist, filenames, jobs=8)
+        mock_pool.assert_not_called()
+        self.assertEqual(results, [1, 0, 0])
+
+    def test_parallel_results_and_output_keep_file_order(self):
+        filenames = self.make_plists(2 * util.MIN_FILES_PER_JOB)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            results = check_files(check_plist, filenames, jobs=2)
+        self.assertEqual(
+            results, [0 if idx % 3 else 1 for idx in range(len(filenames))]
+        )
+        reported = [line.split(":")[0] for line in output.getvalue().splitlines()]
+        self.assertEqual(reported, filenames[::3])
+
+    def test_cached_results_looked_up_in_batches(self):
+        filenames = self.make_plists(7)
+        args = argparse.Namespace(no_cache=False)
+        with mock.patch.object(util, "CHECK_BATCH_SIZE", 3):
+            with redirect_stdout(io.StringIO()):
+                check_files(
+                    check_plist, filenames[:5], cache=open_result_cache("h", args)
+                )
+            cache = open_result_cache("h", args)
+            output = io.StringIO()
+            with mock.patch.object(
+                cache, "lookup", wraps=cache.lookup
+            ) as mock_lookup, redirect_stdout(output):
+                results = list(
+                    util.iter_check_files(check_plist, filenames, cache=cache)
+                )
+        self.assertEqual(
+            [c.args[0] for c in mock_lookup.call_args_list],
+            [filenames[:3], filenames[3:6], filenames[6:]],
+        )
+        self.assertEqual(results, [1, 0, 0, 1, 0, 0, 1])
+        reported = [line.split(":")[0] for line in output.getvalue().splitlines()]
+        self.assertEqual(reported, filenames[::3])
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        env_patcher = mock.patch.dict(
+            os.environ, {"PRE_COMMIT_MACADMIN_CACHE_DIR": self.tempdir.name}
+        )
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+        self.filename = os.path.join(self.tempdir.name, "foo.plist")
+        with open(self.filename, "w", encoding="utf-8") as openfile:
+            openfile.write("not a plist")
+
+    def make_args(self, *argv):
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--strict", action="store_true")
+        add_performance_arguments(parser)
+        return parser.parse_args(list(argv))
+
+    def run_check(self, args, check_file=None, hook="check-foo", salt=""):
+        check_file = check_file or mock.Mock(
+            side_effect=lambda f: print(f"{f}: problem") or 1
+        )
+        output = io.StringIO()
+        with redirect_stdout(output):
+            cache = open_result_cache(hook, args, salt=salt)
+            results = check_files(check_file, [self.filename], cache=cache)
+        return check_file, results, output.getvalue()
+
+    def test_unchanged_file_is_not_checked_again(self):
+        args = self.make_args()
+        first, results, output = self.run_check(args)
+        first.assert_called_once_with(self.filename)
+        second, cached_results, cached_output = self.run_check(args)
+        second.assert_not_called()
+        self.assertEqual(cached_results, results)
+        self.assertEqual(cached_output, output)
+        self.assertEqual(output, f"{self.filename}: problem\n")
+
+    def test_changed_file_is_checked_again(self):
+        args = self.make_args()
+        self.run_check(args)
+        with open(self.filename, "w", encoding="utf-8") as openfile:
+            openfile.write("still not a plist")
+        check_file, _, _ = self.run_check(args)
+        check_file.assert_called_once_with(self.filename)
+
+    def test_cache_is_keyed_by_hook_arguments_and_salt(self):
+        self.run_check(self.make_args())
+        for args, hook, salt in (
+            (self.make_args("--strict"), "check-foo", ""),
+            (self.make_args(), "check-bar", ""),
+            (self.make_args(), "check-foo", "repo changed"),
+        ):
+            check_file, _, _ = self.run_check(args, hook=hook, salt=salt)
+            check_file.assert_called_once_with(self.filename)
+
+    def test_cached_result_depends_on_recorded_answers(self):
+        exists = {"Foo.pkg": True, "Bar.pkg": True}
+
+        def check_file(filename):
+            return int(
+                not util.record_dependency("exists", "Foo.pkg", exists["Foo.pkg"])
+            )
+
+        check_file = mock.Mock(side_effect=check_file)
+        args = self.make_args()
+        dependencies = {"exists": exists.get}
+        for expected_calls in (1, 1):
+            cache = open_result_cache("check-foo", args, dependencies=dependencies)
+            self.assertEqual(check_files(check_file, [self.filename], cache=cache), [0])
+            self.assertEqual(check_file.call_count, expected_calls)
+        exists["Bar.pkg"] = False
+        cache = open_result_cache("check-foo", args, dependencies=dependencies)
+        check_files(check_file, [self.filename], cache=cache)
+        self.assertEqual(check_file.call_count, 1)
+        exists["Foo.pkg"] = False
+        cache = open_result_cache("check-foo", args, dependencies=dependencies)
+        self.assertEqual(check_files(check_file, [self.filename], cache=cache), [1])
+        self.assertEqual(check_file.call_count, 2)
+
+    def test_jobs_argument_does_not_affect_cache(self):
+        self.run_check(self.make_args("--jobs", "1"))
+        check_file, _, _ = self.run_check(self.make_args("--jobs", "2"))
+        check_file.assert_not_called()
+
+    def test_no_cache_argument(self):
+        args = self.make_args("--no-cache")
+        self.assertIsNone(open_result_cache("check-foo", args))
+        self.run_check(args)
+        check_file, _, _ = self.run_check(args)
+        check_file.assert_called_once_with(self.filename)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        args = self.make_args()
+        with mock.patch.object(util, "RESULT_CACHE_MAX_SIZE", 200):
+            for idx in range(5):
+                with open(self.filename, "w", encoding="utf-8") as openfile:
+                    openfile.write(f"version {idx}")
+                self.run_check(args)
+            db_path = os.path.join(self.tempdir.name, "results.sqlite3")
+            with closing(sqlite3.connect(db_path)) as db:
+                total = db.execute("SELECT SUM(size) FROM results").fetchone()[0]
+            self.assertLessEqual(total, 200)
+            # The most recent result is still cached.
+            check_file, _, _ = self.run_check(args)
+            check_file.assert_not_called()
+
+
+class TestSharedDocuments(unittest.TestCase):
+
+    def test_load_plist_shared(self):
+        with tempfile.NamedTemporaryFile("wb", suffix=".plist", delete=False) as tf:
+            plistlib.dump({"foo": "bar"}, tf)
+        self.addCleanup(os.remove, tf.name)
+        with mock.patch(
+            "pre_commit_macadmin_hooks.util.plistlib.load", wraps=plistlib.load
+        ) as mock_load:
+            with util.share_parsed_documents():
+                first = util.load_plist(tf.name)
+                second = util.load_plist(tf.name)
+            self.assertIs(first, second)
+            self.assertEqual(mock_load.call_count, 1)
+            util.load_plist(tf.name)
+            self.assertEqual(mock_load.call_count, 2)
+
+    def test_errors_shared(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".plist", delete=False) as tf:
+            tf.write("not a plist")
+        self.addCleanup(os.remove, tf.name)
+        with util.share_parsed_documents():
+            for _ in range(2):
+                with self.assertRaises(Exception):
+                    util.load_plist(tf.name)
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def imported_modules(self, module):
+        """Return the modules loaded by importing module in a new interpreter."""
+        proc = subprocess.run(
+            [sys.executable, "-c", f"import sys, {module}; print(*sys.modules)"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return set(proc.stdout.split())
+
+    def test_plist_hooks_skip_slow_imports(self):
+        for module in (
+            "pre_commit_macadmin_hooks.check_munki_pkgsinfo",
+            "pre_commit_macadmin_hooks.check_autopkg_recipes",
+        ):
+            with self.subTest(module=module):
+                imported = self.imported_modules(module)
+                self.assertIn(module, imported)
+                for slow in (
+                    "ruamel.yaml",
+                    "packaging.version",
+                    "importlib.metadata",
+                    "concurrent.futures.process",
+                ):
+                    self.assertNotIn(slow, imported)
+
+    def test_load_yaml(self):
+        if ruamel is None:
+            self.skipTest("ruamel.yaml not installed")
+        self.assertEqual(util.load_yaml(io.StringIO("foo: [1, 2]")), {"foo": [1, 2]})
+
 
 if __name__ == "__main__":
     unittest.main()